@@ -0,0 +1,119 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core import signing
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils.crypto import salted_hmac
+
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+
+from applications.accounts.models import User
+
+SIGNED_TOKEN_SALT = 'applications.accounts.signed-token'
+
+
+def token_version(password):
+    """
+    Version of the tokens of a user, changes with the password hash so a new
+    password revokes the tokens issued before
+    @:param password: str password hash
+    """
+    return salted_hmac(SIGNED_TOKEN_SALT, password).hexdigest()[:16]
+
+
+def issue_signed_token(user):
+    """
+    Sign the claims of a user, valid for `SIGNED_TOKEN_MAX_AGE` seconds
+    @:param user: User instance
+    @:return: str token
+    """
+    claims = {'uid': user.pk, 'username': user.username, 'ver': token_version(user.password)}
+    return signing.dumps(claims, salt=SIGNED_TOKEN_SALT)
+
+
+class RevocationCache:
+    """
+    Per-process LRU of the current token version of recently seen users.
+    Entries are read again after `SIGNED_TOKEN_REVOCATION_CACHE_TIMEOUT` seconds,
+    so a revocation is seen by every process within that delay.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get_version(self, user_id):
+        """
+        @:return: str token version, None for unknown or inactive users
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(user_id)
+                return entry[0]
+        password = User.objects.filter(pk=user_id, is_active=True).values_list('password', flat=True).first()
+        version = token_version(password) if password is not None else None
+        with self._lock:
+            self._entries[user_id] = (version, now + settings.SIGNED_TOKEN_REVOCATION_CACHE_TIMEOUT)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > settings.SIGNED_TOKEN_REVOCATION_CACHE_SIZE:
+                self._entries.popitem(last=False)
+        return version
+
+    def discard(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+revocation_cache = RevocationCache()
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """
+    Stateless token authentication: `Authorization: Bearer <signed token>`.
+    The user is built from the signed claims without a query, its other
+    fields are deferred and only loaded when a view reads them. With
+    `SIGNED_TOKEN_REVOCATION_CHECK` on, tokens issued before a password change
+    or to a deactivated user are refused, at the cost of one cached lookup.
+    """
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed('Invalid token header.')
+        try:
+            claims = signing.loads(auth[1].decode(), salt=SIGNED_TOKEN_SALT, max_age=settings.SIGNED_TOKEN_MAX_AGE)
+        except signing.SignatureExpired:
+            raise exceptions.AuthenticationFailed('Token has expired.')
+        except (signing.BadSignature, UnicodeError):
+            raise exceptions.AuthenticationFailed('Invalid token.')
+
+        if settings.SIGNED_TOKEN_REVOCATION_CHECK and revocation_cache.get_version(claims['uid']) != claims['ver']:
+            raise exceptions.AuthenticationFailed('Token has been revoked.')
+        return self.get_user(claims), claims
+
+    def get_user(self, claims):
+        values = {'id': claims['uid'], 'username': claims['username'], 'is_active': True}
+        field_names = [field.attname for field in User._meta.concrete_fields if field.attname in values]
+        return User.from_db(DEFAULT_DB_ALIAS, field_names, [values[name] for name in field_names])
+
+    def authenticate_header(self, request):
+        return self.keyword
+
+
+@receiver(post_save, sender=User, dispatch_uid="user_signed_token_revocation")
+def user_post_save(sender, instance, **kwargs):
+    revocation_cache.discard(instance.pk)
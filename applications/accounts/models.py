@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import connections, models, router
 
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.validators import UnicodeUsernameValidator
@@ -29,3 +29,10 @@ class User(AbstractUser):
         else:
             return u'%s %s' % (self.first_name, self.last_name)
 
+    def lock(self):
+        """
+        Lock the row of the user until the current transaction ends, on the backends supporting
+        SELECT ... FOR UPDATE. SQLite serializes the writing transactions instead.
+        """
+        if connections[router.db_for_write(User)].features.has_select_for_update:
+            list(User.objects.select_for_update().filter(pk=self.pk).values_list('pk', flat=True))
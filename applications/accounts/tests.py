@@ -1,3 +1,58 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 
-# Create your tests here.
+from rest_framework.reverse import reverse
+from rest_framework.test import APIClient
+
+from applications.accounts.authentication import revocation_cache
+from applications.accounts.models import User
+from applications.images.models import Image
+
+client = APIClient()
+
+
+class SignedTokenAuthenticationTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        revocation_cache.clear()
+        self.user = User.objects.create(username="token@test.com")
+        self.user.set_password("1234")
+        self.user.save()
+        self.signed_token = client.post(reverse("login"), {"username": "token@test.com", "password": "1234"}) \
+            .data['signed_token']
+
+    def tearDown(self):
+        client.credentials()
+
+    def test_signed_token_skips_token_query(self):
+        client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.signed_token)
+        with self.assertNumQueries(2):
+            response = client.get(reverse("users-list"))
+        self.assertEqual(response.status_code, 200)
+
+    def test_signed_token_user_can_write(self):
+        image = Image.objects.create(image="images/test.png", image_caption="Lorem", user=self.user)
+        client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.signed_token)
+        response = client.post(reverse("like-list"), {"image": image.id})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["liked_user_details"]["username"], self.user.username)
+
+    def test_tampered_token(self):
+        client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.signed_token[:-1] + 'x')
+        self.assertEqual(client.get(reverse("users-list")).status_code, 401)
+
+    @override_settings(SIGNED_TOKEN_MAX_AGE=-1)
+    def test_expired_token(self):
+        client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.signed_token)
+        self.assertEqual(client.get(reverse("users-list")).status_code, 401)
+
+    @override_settings(SIGNED_TOKEN_REVOCATION_CHECK=True)
+    def test_password_change_revokes_token(self):
+        client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.signed_token)
+        self.assertEqual(client.get(reverse("users-list")).status_code, 200)
+        with self.assertNumQueries(2):
+            client.get(reverse("users-list"))
+        self.user.set_password("5678")
+        self.user.save()
+        self.assertEqual(client.get(reverse("users-list")).status_code, 401)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'applications.api'
+
+    def ready(self):
+        # Time the queries of every connection for the request metrics and the slow query log
+        from applications.api import metrics, slow_queries  # noqa: F401
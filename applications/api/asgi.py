@@ -0,0 +1,121 @@
+import asyncio
+import mimetypes
+import os
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.handlers.asgi import ASGIHandler
+from django.utils._os import safe_join
+from django.utils.http import http_date
+
+
+class AsyncReadASGIHandler(ASGIHandler):
+    """
+    ASGI handler resolving requests with `ASGI_URLCONF`, which maps the
+    read endpoints to their async views
+    """
+
+    def create_request(self, scope, body_file):
+        request, error_response = super().create_request(scope, body_file)
+        if request is not None:
+            request.urlconf = settings.ASGI_URLCONF
+        return request, error_response
+
+
+class MediaFilesApplication:
+    """
+    Serve `MEDIA_URL` straight from `MEDIA_ROOT` in front of Django when
+    `ASGI_SERVE_MEDIA` is on. Files are read in chunks off the event loop, so
+    a slow client only costs a pending send, not a thread.
+    """
+    chunk_size = 2 ** 16
+
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not settings.ASGI_SERVE_MEDIA \
+                or not scope['path'].startswith(settings.MEDIA_URL):
+            return await self.application(scope, receive, send)
+        if scope['method'] not in ('GET', 'HEAD'):
+            return await self.send_empty(send, 405)
+        try:
+            path = safe_join(settings.MEDIA_ROOT, scope['path'][len(settings.MEDIA_URL):])
+        except SuspiciousFileOperation:
+            return await self.send_empty(send, 404)
+
+        loop = asyncio.get_running_loop()
+        try:
+            stat = await loop.run_in_executor(None, os.stat, path)
+        except OSError:
+            return await self.send_empty(send, 404)
+        if not os.path.isfile(path):
+            return await self.send_empty(send, 404)
+
+        etag = f'"{int(stat.st_mtime):x}-{stat.st_size:x}"'
+        headers = [
+            (b'ETag', etag.encode()),
+            (b'Last-Modified', http_date(stat.st_mtime).encode()),
+            (b'Cache-Control', f'public, max-age={settings.ASGI_MEDIA_MAX_AGE}'.encode()),
+        ]
+        if etag.encode() in dict(scope['headers']).get(b'if-none-match', b''):
+            return await self.send_empty(send, 304, headers)
+
+        content_type, encoding = mimetypes.guess_type(path)
+        headers += [
+            (b'Content-Type', (content_type or 'application/octet-stream').encode()),
+            (b'Content-Length', str(stat.st_size).encode()),
+        ]
+        await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+        if scope['method'] == 'HEAD':
+            return await send({'type': 'http.response.body'})
+        media_file = await loop.run_in_executor(None, open, path, 'rb')
+        try:
+            while True:
+                chunk = await loop.run_in_executor(None, media_file.read, self.chunk_size)
+                more_body = len(chunk) == self.chunk_size
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': more_body})
+                if not more_body:
+                    break
+        finally:
+            media_file.close()
+
+    async def send_empty(self, send, status, headers=()):
+        await send({'type': 'http.response.start', 'status': status, 'headers': list(headers)})
+        await send({'type': 'http.response.body'})
+
+
+def get_application():
+    """
+    ASGI application of the project: media files, then Django with async read views
+    """
+    return MediaFilesApplication(AsyncReadASGIHandler())
+
+
+async def call_asgi(application, path, method='GET', headers=None, host='localhost'):
+    """
+    Run one bodiless request through an ASGI application in-process
+    @:param path: str path with an optional query string
+    @:param headers: dict of extra request headers
+    @:return: tuple: (status:int, headers:dict, body:bytes)
+    """
+    path, _, query = path.partition('?')
+    request_headers = [(b'host', host.encode())]
+    request_headers += [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()]
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'scheme': 'http',
+        'method': method, 'path': path, 'raw_path': path.encode(), 'query_string': query.encode(),
+        'root_path': '', 'headers': request_headers, 'client': ('127.0.0.1', 0), 'server': (host, 80),
+    }
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    await application(scope, receive, send)
+    start = messages[0]
+    body = b''.join(message.get('body', b'') for message in messages[1:])
+    return start['status'], {name.decode().lower(): value.decode() for name, value in start['headers']}, body
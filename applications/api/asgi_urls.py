@@ -0,0 +1,17 @@
+"""
+URL configuration of the ASGI application: the read endpoints are served
+by async views, everything else by the regular `hedgehog.urls`.
+They keep the names of the routes they replace, eg. for the metric labels.
+"""
+from django.urls import path
+
+from applications.api import async_views
+from hedgehog import urls
+
+urlpatterns = [
+    path('api/v1/users/', async_views.user_list, name='users-list'),
+    path('api/v1/users/<pk>/', async_views.user_detail, name='users-detail'),
+    path('api/v1/image-list/', async_views.image_list, name='image-list'),
+    path('api/v1/image-list/<pk>/', async_views.image_detail, name='image-detail'),
+    path('api/v1/images-for-user-feed/', async_views.image_feed, name='image-feed-for-user-list'),
+] + urls.urlpatterns
@@ -0,0 +1,72 @@
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from applications.api.metrics import measure
+from applications.api.views import ImageViewSet, UserImageViewSet, UserViewSet
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_orm_executor():
+    """
+    Process wide pool running the ORM work of the async views. Its size bounds
+    the database connections of an ASGI process, however many requests are open.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.ASYNC_ORM_THREADS, thread_name_prefix='orm')
+    return _executor
+
+
+async def run_orm(func, *args, **kwargs):
+    """
+    Await `func` on the ORM pool, with the connection housekeeping Django does around a request.
+    It runs in a copy of the caller's context, so request metrics reach it.
+    """
+    def call():
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(get_orm_executor(), context.run, call)
+
+
+def _render(view, request, kwargs):
+    response = view(request, **kwargs)
+    if hasattr(response, 'render'):
+        with measure('render'):
+            response.render()
+    return response
+
+
+def async_read_view(viewset, actions):
+    """
+    Async view serving `viewset` actions with the ORM pool, so the event loop
+    keeps the connection while the query runs and no thread is held per client.
+    Authentication, pagination, caching and serialization stay the viewset's.
+    """
+    view = viewset.as_view(actions)
+
+    async def async_view(request, **kwargs):
+        return await run_orm(_render, view, request, kwargs)
+
+    async_view.csrf_exempt = True
+    async_view.__name__ = f"async_{view.__name__}"
+    return async_view
+
+
+user_list = async_read_view(UserViewSet, {'get': 'list'})
+user_detail = async_read_view(UserViewSet, {'get': 'retrieve'})
+image_list = async_read_view(ImageViewSet, {'get': 'list'})
+image_detail = async_read_view(ImageViewSet, {'get': 'retrieve'})
+image_feed = async_read_view(UserImageViewSet, {'get': 'list'})
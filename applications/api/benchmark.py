@@ -0,0 +1,153 @@
+import statistics
+import time
+from io import BytesIO, StringIO
+from itertools import accumulate
+from random import Random
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+
+from PIL import Image as StdImage
+
+from applications.accounts.models import User
+from applications.followers.models import Follow
+from applications.images.cache import invalidate_image_list
+from applications.images.models import Image, MediaBlob
+from applications.images.search import rebuild_index
+from applications.likes.models import Like
+
+
+def call_wsgi(application, path, headers=None, host='localhost', method='GET', body=b'', content_type=''):
+    """
+    Run one request through a WSGI application in-process
+    @:return: int: status code
+    """
+    path, _, query = path.partition('?')
+    environ = {
+        'REQUEST_METHOD': method, 'PATH_INFO': path, 'QUERY_STRING': query, 'SCRIPT_NAME': '',
+        'SERVER_NAME': host, 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1', 'HTTP_HOST': host,
+        'CONTENT_TYPE': content_type, 'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': BytesIO(body), 'wsgi.errors': BytesIO(), 'wsgi.url_scheme': 'http',
+        'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False, 'wsgi.version': (1, 0),
+    }
+    for name, value in (headers or {}).items():
+        environ['HTTP_' + name.upper().replace('-', '_')] = value
+    status = []
+    result = application(environ, lambda status_line, response_headers: status.append(status_line))
+    try:
+        b''.join(result)
+    finally:
+        result.close()
+    return int(status[0].split()[0])
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    status = func(*args, **kwargs)
+    return time.perf_counter() - start, status
+
+
+async def timed_async(func, *args):
+    start = time.perf_counter()
+    status, headers, body = await func(*args)
+    return time.perf_counter() - start, status
+
+
+def percentile(values, p):
+    """
+    Nearest-rank percentile of sorted `values`, `p` between 0 and 1
+    """
+    return values[min(int(len(values) * p), len(values) - 1)]
+
+
+def summarize(latencies):
+    """
+    Latency statistics in milliseconds
+    @:param latencies: list of float seconds
+    @:return: dict
+    """
+    latencies = sorted(latency * 1000 for latency in latencies)
+    return {
+        'mean': round(statistics.mean(latencies), 3),
+        'p50': round(percentile(latencies, 0.5), 3),
+        'p95': round(percentile(latencies, 0.95), 3),
+        'p99': round(percentile(latencies, 0.99), 3),
+        'max': round(latencies[-1], 3),
+    }
+
+
+SEED_PREFIX = 'loadtest-'
+SEED_PASSWORD = 'loadtest'
+SEED_IMAGE = 'images/loadtest.png'
+CAPTION_WORDS = ('sunset', 'beach', 'mountain', 'city', 'night', 'coffee', 'cat', 'dog', 'forest', 'river',
+                 'street', 'portrait', 'summer', 'winter', 'snow', 'friends', 'food', 'travel', 'sky', 'garden')
+
+
+def zipf_cum_weights(count, skew):
+    """
+    Cumulative weights of `count` items by rank, the first ones are picked most
+    often, eg. celebrity accounts or viral images
+    """
+    return list(accumulate(1 / (rank + 1) ** skew for rank in range(count)))
+
+
+def sample_pairs(rng, left, right, cum_weights, count, distinct=False):
+    """
+    Up to `count` unique (left, right) pairs, `right` drawn with `cum_weights`
+    """
+    pairs = set()
+    attempts = 0
+    while len(pairs) < count and attempts < count * 10:
+        missing = count - len(pairs)
+        attempts += missing
+        for a, b in zip(rng.choices(left, k=missing), rng.choices(right, cum_weights=cum_weights, k=missing)):
+            if not (distinct and a == b):
+                pairs.add((a, b))
+    return pairs
+
+
+def seed_data(users, images, follows, likes, skew=1.1, seed=0, batch_size=1000):
+    """
+    Replace the seeded users, and everything they own, by a new data set.
+    Follows and likes are skewed: a few accounts get most of the followers
+    and a few images most of the likes. Rows are bulk-created, the counters,
+    timelines, suggestions and search index are then rebuilt by their commands.
+    @:return: dict: rows created per table
+    """
+    rng = Random(seed)
+    User.objects.filter(username__startswith=SEED_PREFIX).delete()
+
+    password = make_password(SEED_PASSWORD)
+    User.objects.bulk_create([User(username=f"{SEED_PREFIX}{index}@example.com", first_name=f"Seed{index}",
+                                   password=password) for index in range(users)], batch_size=batch_size)
+    user_ids = list(User.objects.filter(username__startswith=SEED_PREFIX).order_by('id').values_list('id', flat=True))
+    user_weights = zipf_cum_weights(len(user_ids), skew)
+
+    storage = Image._meta.get_field('image').storage
+    if images and not storage.exists(SEED_IMAGE):
+        data = BytesIO()
+        StdImage.new('RGB', (64, 64)).save(data, 'PNG')
+        storage.save(SEED_IMAGE, ContentFile(data.getvalue()))
+    authors = rng.choices(user_ids, cum_weights=user_weights, k=images)
+    Image.objects.bulk_create([
+        Image(user_id=author, image=SEED_IMAGE, width=64, height=64, image_format='PNG', published=True,
+              image_caption=' '.join(rng.sample(CAPTION_WORDS, rng.randint(2, 5))))
+        for author in authors], batch_size=batch_size)
+    MediaBlob.objects.acquire([SEED_IMAGE] * images)
+    image_ids = list(Image.objects.filter(user_id__in=user_ids).values_list('id', flat=True))
+    rng.shuffle(image_ids)
+
+    follow_pairs = sample_pairs(rng, user_ids, user_ids, user_weights, follows, distinct=True)
+    Follow.objects.bulk_create([Follow(follower_id=follower, following_id=following)
+                                for follower, following in follow_pairs], batch_size=batch_size)
+    like_pairs = sample_pairs(rng, user_ids, image_ids, zipf_cum_weights(len(image_ids), skew), likes) \
+        if image_ids else set()
+    Like.objects.bulk_create([Like(user_id=user, image_id=image) for user, image in like_pairs],
+                             batch_size=batch_size)
+
+    for command in ('reconcile_counters', 'refresh_trending', 'backfill_timelines', 'compute_follow_suggestions'):
+        call_command(command, stdout=StringIO())
+    rebuild_index()
+    invalidate_image_list()
+    return {'users': len(user_ids), 'images': len(image_ids), 'follows': len(follow_pairs), 'likes': len(like_pairs)}
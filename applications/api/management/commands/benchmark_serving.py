@@ -0,0 +1,62 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+
+from rest_framework.authtoken.models import Token
+
+from applications.accounts.models import User
+from applications.api.asgi import call_asgi, get_application
+from applications.api.benchmark import call_wsgi, summarize, timed, timed_async
+
+DEFAULT_PATHS = ('/api/v1/image-list/', '/api/v1/users/', '/api/v1/images-for-user-feed/')
+
+
+class Command(BaseCommand):
+    help = 'Compare the ASGI and WSGI serving of the read endpoints in-process, under concurrent load'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', action='append', dest='paths',
+                            help='Path to request (repeatable), defaults to the image list, users and feed')
+        parser.add_argument('--requests', type=int, default=500, help='Requests per path and mode')
+        parser.add_argument('--concurrency', type=int, default=50, help='Requests in flight at once')
+        parser.add_argument('--user', type=int, help='Authenticate as this user id, defaults to the first user')
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(pk=options['user']) if options['user'] else User.objects.order_by('id')
+        user = user.first()
+        if user is None:
+            raise CommandError('No user to authenticate the requests with')
+        headers = {'Authorization': f"Token {Token.objects.get_or_create(user=user)[0].key}"}
+
+        wsgi_application = get_wsgi_application()
+        asgi_application = get_application()
+        self.stdout.write(f"{'path':<40} {'mode':<5} {'req/s':>9} {'mean ms':>9} {'p50 ms':>9} "
+                          f"{'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+        for path in options['paths'] or DEFAULT_PATHS:
+            count, concurrency = options['requests'], options['concurrency']
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                start = time.perf_counter()
+                results = list(executor.map(lambda i: timed(call_wsgi, wsgi_application, path, headers),
+                                            range(count)))
+                self.report(path, 'wsgi', results, time.perf_counter() - start)
+
+            start = time.perf_counter()
+            results = asyncio.run(self.run_asgi(asgi_application, path, headers, count, concurrency))
+            self.report(path, 'asgi', results, time.perf_counter() - start)
+
+    async def run_asgi(self, application, path, headers, count, concurrency):
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def request():
+            async with semaphore:
+                return await timed_async(call_asgi, application, path, 'GET', headers)
+        return await asyncio.gather(*(request() for i in range(count)))
+
+    def report(self, path, mode, results, elapsed):
+        latency = summarize([latency for latency, status in results])
+        errors = sum(1 for latency, status in results if status >= 400)
+        self.stdout.write(f"{path:<40} {mode:<5} {len(results) / elapsed:>9.1f} {latency['mean']:>9.2f} "
+                          f"{latency['p50']:>9.2f} {latency['p95']:>9.2f} {latency['p99']:>9.2f} {errors:>7}")
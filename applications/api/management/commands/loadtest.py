@@ -0,0 +1,306 @@
+import json
+import platform
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from io import BytesIO
+from random import Random
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connection, connections
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.urls import reverse
+
+from PIL import Image as StdImage
+
+from rest_framework.authtoken.models import Token
+
+from applications.accounts.models import User
+from applications.api import urls
+from applications.api.benchmark import CAPTION_WORDS, SEED_PASSWORD, SEED_PREFIX, call_wsgi, seed_data,\
+    summarize, timed, zipf_cum_weights
+from applications.feeds.models import TimelineEntry
+from applications.followers.models import Follow
+from applications.images.models import Image
+from applications.likes.models import Like
+from applications.suggestions.models import FollowSuggestion
+
+METHOD_ORDER = ('get', 'post', 'delete')
+
+
+def api_routes(patterns=urls.urlpatterns):
+    """
+    Every (url name, method) the API answers, read from the url patterns and their views
+    """
+    routes = set()
+    for pattern in patterns:
+        if hasattr(pattern, 'url_patterns'):
+            routes |= api_routes(pattern.url_patterns)
+            continue
+        view = pattern.callback
+        view_class = getattr(view, 'cls', None)
+        if view_class is None or pattern.name is None:
+            continue
+        methods = getattr(view, 'actions', None) or {method: method for method in METHOD_ORDER
+                                                     if hasattr(view_class, method)}
+        routes |= {(pattern.name, method) for method in methods if method in view_class.http_method_names}
+    return routes
+
+
+class Scenario:
+    """
+    Builds the requests of every route from the seeded data: readers and
+    writers are drawn from the seeded users, the images and users they target
+    with the same skew as the seeded follows and likes
+    """
+
+    def __init__(self, rng, actors, skew):
+        self.rng = rng
+        self.actors = actors
+        self.user_ids = list(User.objects.filter(username__startswith=SEED_PREFIX).order_by('id')
+                             .values_list('id', flat=True))
+        self.image_ids = list(Image.objects.filter(user__in=self.user_ids).order_by('-likes', 'id')
+                              .values_list('id', flat=True))
+        self.user_weights = zipf_cum_weights(len(self.user_ids), skew)
+        self.image_weights = zipf_cum_weights(len(self.image_ids), skew)
+        self.upload = self.encode_upload()
+
+    def encode_upload(self):
+        data = BytesIO()
+        StdImage.new('RGB', (64, 64)).save(data, 'PNG')
+        return data.getvalue()
+
+    def actor(self):
+        return self.rng.choice(self.actors)
+
+    def user_id(self):
+        return self.rng.choices(self.user_ids, cum_weights=self.user_weights)[0]
+
+    def image_id(self):
+        return self.rng.choices(self.image_ids, cum_weights=self.image_weights)[0]
+
+    def owned(self, queryset, field, count, value='id'):
+        """
+        `value` of up to `count` rows owned by the actors, each used once, with its owner
+        """
+        actors = {actor.pk: actor for actor in self.actors}
+        rows = list(queryset.filter(**{f'{field}__in': actors}).order_by('id').values_list(field, value))
+        return [(actors[owner], pk) for owner, pk in self.rng.sample(rows, min(count, len(rows)))]
+
+    def build(self, name, method, count):
+        """
+        @:return: list of (actor or None, method, path, data) tuples
+        """
+        builder = getattr(self, f"{method}_{name.replace('-', '_')}", None)
+        if builder is None:
+            raise CommandError(f"No load scenario for {method.upper()} {name}, add one to the loadtest command")
+        return [(actor, method, path, data) for actor, path, data in builder(count)]
+
+    def repeat(self, count, func):
+        return [func() for _ in range(count)]
+
+    def fresh_pairs(self, existing, draw, count):
+        """
+        Up to `count` (actor, target id) pairs not in `existing`, so writes are not refused as duplicates
+        """
+        pairs = []
+        for _ in range(count * 10):
+            actor, target = self.actor(), draw()
+            if (actor.pk, target) not in existing and actor.pk != target:
+                existing.add((actor.pk, target))
+                pairs.append((actor, target))
+                if len(pairs) == count:
+                    break
+        return pairs
+
+    def get_api_root(self, count):
+        return self.repeat(count, lambda: (self.actor(), reverse('api-root'), None))
+
+    def post_login(self, count):
+        return self.repeat(count, lambda: (None, reverse('login'), {
+            'username': self.actor().username, 'password': SEED_PASSWORD}))
+
+    def post_register_list(self, count):
+        return self.repeat(count, lambda: (None, reverse('register-list'), {
+            'username': f"{SEED_PREFIX}{uuid.uuid4().hex}@example.com", 'password': SEED_PASSWORD}))
+
+    def get_users_list(self, count):
+        return self.repeat(count, lambda: (self.actor(), reverse('users-list'), None))
+
+    def get_users_detail(self, count):
+        return self.repeat(count, lambda: (self.actor(), reverse('users-detail', args=[self.user_id()]), None))
+
+    def post_follow_list(self, count):
+        existing = set(Follow.objects.filter(follower__in=self.actors).values_list('follower', 'following'))
+        return [(actor, reverse('follow-list'), {'following': user_id})
+                for actor, user_id in self.fresh_pairs(existing, self.user_id, count)]
+
+    def post_follow_bulk(self, count):
+        return self.repeat(count, lambda: (self.actor(), reverse('follow-bulk'), {
+            'following': list({self.user_id() for _ in range(10)})}))
+
+    def delete_follow_detail(self, count):
+        return [(actor, reverse('follow-detail', args=[pk]), None)
+                for actor, pk in self.owned(Follow.objects.all(), 'follower', count)]
+
+    def get_follow_suggestions_list(self, count):
+        return self.repeat(count, lambda: (self.actor(), reverse('follow-suggestions-list'), None))
+
+    def get_follow_suggestions_detail(self, count):
+        owned = self.owned(FollowSuggestion.objects.all(), 'user', count)
+        return [(actor, reverse('follow-suggestions-detail', args=[pk]), None) for actor, pk in owned]
+
+    def get_image_list(self, count):
+        return self.repeat(count, lambda: (None, reverse('image-list'), None))
+
+    def get_image_detail(self, count):
+        return self.repeat(count, lambda: (None, reverse('image-detail', args=[self.image_id()]), None))
+
+    def get_image_search_list(self, count):
+        return self.repeat(count, lambda: (self.actor(), reverse('image-search-list') + '?q=' + ' '.join(
+            self.rng.sample(CAPTION_WORDS, self.rng.randint(1, 2))), None))
+
+    def get_image_search_detail(self, count):
+        captions = dict(Image.objects.filter(id__in=self.image_ids).values_list('id', 'image_caption'))
+
+        def request():
+            image_id = self.image_id()
+            word = self.rng.choice(captions[image_id].split())
+            return self.actor(), reverse('image-search-detail', args=[image_id]) + '?q=' + word, None
+        return self.repeat(count, request)
+
+    def get_image_feed_for_user_list(self, count):
+        return self.repeat(count, lambda: (self.actor(), reverse('image-feed-for-user-list'), None))
+
+    def get_image_feed_for_user_detail(self, count):
+        entries = self.owned(TimelineEntry.objects.all(), 'user', count, 'image')
+        return [(actor, reverse('image-feed-for-user-detail', args=[image_id]), None) for actor, image_id in entries]
+
+    def post_image_upload_list(self, count):
+        return self.repeat(count, lambda: (self.actor(), reverse('image-upload-list'), {
+            'image': self.upload, 'image_caption': ' '.join(self.rng.sample(CAPTION_WORDS, 3))}))
+
+    def delete_image_upload_detail(self, count):
+        return [(actor, reverse('image-upload-detail', args=[pk]), None)
+                for actor, pk in self.owned(Image.objects.all(), 'user', count)]
+
+    def post_like_list(self, count):
+        existing = set(Like.objects.filter(user__in=self.actors).values_list('user', 'image'))
+        return [(actor, reverse('like-list'), {'image': image_id})
+                for actor, image_id in self.fresh_pairs(existing, self.image_id, count)]
+
+    def post_like_bulk(self, count):
+        return self.repeat(count, lambda: (self.actor(), reverse('like-bulk'), {
+            'images': list({self.image_id() for _ in range(10)})}))
+
+    def delete_like_detail(self, count):
+        return [(actor, reverse('like-detail', args=[pk]), None)
+                for actor, pk in self.owned(Like.objects.all(), 'user', count)]
+
+
+def encode_body(data):
+    """
+    @:return: (bytes body, content type)
+    """
+    if data is None:
+        return b'', ''
+    if isinstance(data.get('image'), bytes):
+        upload = BytesIO(data['image'])
+        upload.name = 'loadtest.png'
+        return encode_multipart(BOUNDARY, {**data, 'image': upload}), MULTIPART_CONTENT
+    return json.dumps(data).encode(), 'application/json'
+
+
+class Command(BaseCommand):
+    help = 'Seed a skewed data set, drive every API route concurrently and report latency, ' \
+           'throughput and queries per request as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='Seeded users')
+        parser.add_argument('--images', type=int, default=5000, help='Seeded images')
+        parser.add_argument('--follows', type=int, default=20000, help='Seeded follows')
+        parser.add_argument('--likes', type=int, default=50000, help='Seeded likes')
+        parser.add_argument('--skew', type=float, default=1.1,
+                            help='Zipf exponent of the followed users and liked images, 0 for uniform')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed, same seed same data and requests')
+        parser.add_argument('--no-seed', action='store_true', help='Reuse the data seeded by a previous run')
+        parser.add_argument('--actors', type=int, default=50, help='Seeded users sending the requests')
+        parser.add_argument('--requests', type=int, default=200, help='Requests per route')
+        parser.add_argument('--concurrency', type=int, default=8, help='Requests in flight at once')
+        parser.add_argument('--route', action='append', dest='routes', help='Only run this url name (repeatable)')
+        parser.add_argument('--host', default='localhost', help='Host header of the requests')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        report = {
+            'environment': {'python': platform.python_version(), 'django': django.get_version(),
+                            'database': connection.vendor},
+            'options': {name: options[name] for name in ('users', 'images', 'follows', 'likes', 'skew', 'seed',
+                                                          'actors', 'requests', 'concurrency')},
+        }
+        if not options['no_seed']:
+            start = time.perf_counter()
+            report['seed'] = seed_data(options['users'], options['images'], options['follows'], options['likes'],
+                                       skew=options['skew'], seed=options['seed'])
+            report['seed']['seconds'] = round(time.perf_counter() - start, 3)
+
+        actors = list(User.objects.filter(username__startswith=SEED_PREFIX).order_by('id')[:options['actors']])
+        if not actors:
+            raise CommandError('No seeded users, run without --no-seed first')
+        for actor in actors:
+            actor.token = Token.objects.get_or_create(user=actor)[0].key
+        scenario = Scenario(Random(options['seed']), actors, options['skew'])
+
+        routes = sorted(api_routes(), key=lambda route: (METHOD_ORDER.index(route[1]), route[0]))
+        if options['routes']:
+            routes = [route for route in routes if route[0] in options['routes']]
+        application = get_wsgi_application()
+        report['routes'] = {}
+        for name, method in routes:
+            requests = scenario.build(name, method, options['requests'])
+            report['routes'][f"{method.upper()} {name}"] = self.run_route(application, requests,
+                                                                          options['concurrency'], options['host'])
+            if options['verbosity'] > 1:
+                self.stderr.write(f"{method.upper()} {name}: done")
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as report_file:
+                report_file.write(output)
+            self.stderr.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+    def run_route(self, application, requests, concurrency, host):
+        def run(request):
+            actor, method, path, data = request
+            headers = {'Authorization': f"Token {actor.token}"} if actor is not None else {}
+            body, content_type = encode_body(data)
+            queries = []
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(
+                        lambda execute, *args: queries.append(1) or execute(*args)))
+                latency, status = timed(call_wsgi, application, path, headers, host, method=method.upper(),
+                                        body=body, content_type=content_type)
+            return latency, status, len(queries)
+
+        if not requests:
+            return {'requests': 0}
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            start = time.perf_counter()
+            results = list(executor.map(run, requests))
+            elapsed = time.perf_counter() - start
+        queries = [count for latency, status, count in results]
+        return {
+            'requests': len(results),
+            'seconds': round(elapsed, 3),
+            'throughput': round(len(results) / elapsed, 1),
+            'latency_ms': summarize([latency for latency, status, count in results]),
+            'queries': {'mean': round(sum(queries) / len(queries), 2), 'max': max(queries)},
+            'status': dict(sorted(Counter(str(status) for latency, status, count in results).items())),
+        }
@@ -0,0 +1,78 @@
+import json
+import os
+import platform
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from applications.api.microbenchmarks import BENCHMARKS, Fixtures, compare, measure
+
+
+class Command(BaseCommand):
+    help = 'Time the serializers, validators and signal receivers on the request path and compare them ' \
+           'with a stored baseline, failing on regressions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--only', action='append', choices=sorted(BENCHMARKS), help='Benchmark to run')
+        parser.add_argument('--rounds', type=int, default=15, help='Timed rounds per benchmark')
+        parser.add_argument('--min-time', type=float, default=0.02, help='Seconds each round lasts at least')
+        parser.add_argument('--warmup', type=float, default=0.1, help='Seconds of untimed calls before timing')
+        parser.add_argument('--baseline', default=os.path.join(settings.BASE_DIR, 'microbench-baseline.json'),
+                            help='Baseline file to compare with')
+        parser.add_argument('--save-baseline', action='store_true', help='Store the results as the new baseline')
+        parser.add_argument('--require-baseline', action='store_true',
+                            help='Fail when the baseline is missing or lacks a benchmark run, eg. in CI')
+        parser.add_argument('--threshold', type=float, default=0.25,
+                            help='Fail when a median is slower than the baseline by more than this fraction')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+
+    def handle(self, *args, **options):
+        names = options['only'] or sorted(BENCHMARKS)
+        results = {}
+        # Fixtures and the writes of the signal benchmarks are rolled back
+        with transaction.atomic():
+            fixtures = Fixtures()
+            for name in names:
+                results[name] = measure(BENCHMARKS[name](fixtures), rounds=options['rounds'],
+                                        min_time=options['min_time'], warmup=options['warmup'])
+            transaction.set_rollback(True)
+
+        environment = {'python': platform.python_version(), 'django': django.get_version(),
+                       'machine': platform.machine(), 'node': platform.node()}
+        baseline = self.load_baseline(options['baseline'], environment)
+        missing = [name for name in results if name not in baseline]
+        if options['require_baseline'] and missing and not options['save_baseline']:
+            raise CommandError(f"No baseline in {options['baseline']} for: {', '.join(missing)}, "
+                               f"record one with --save-baseline")
+        regressions = compare(results, baseline, options['threshold'])
+
+        if options['json']:
+            self.stdout.write(json.dumps({'environment': environment, 'benchmarks': results}, indent=2))
+        else:
+            self.stdout.write(f"{'benchmark':<26} {'median us':>11} {'min us':>11} {'stdev':>9} "
+                              f"{'queries':>8} {'vs baseline':>12}")
+            for name, result in results.items():
+                change = f"{result['change']:+.1%}" if 'change' in result else '-'
+                self.stdout.write(f"{name:<26} {result['median']:>11.2f} {result['min']:>11.2f} "
+                                  f"{result['stdev']:>9.2f} {result['queries']:>8} {change:>12}")
+
+        if options['save_baseline']:
+            with open(options['baseline'], 'w') as baseline_file:
+                json.dump({'environment': environment, 'benchmarks': {**baseline, **results}}, baseline_file,
+                          indent=2)
+            self.stderr.write(self.style.SUCCESS(f"Baseline written to {options['baseline']}"))
+        elif regressions:
+            raise CommandError('Regressed past {:.0%}: {}'.format(options['threshold'], ', '.join(
+                f"{name} {change:+.1%}" for name, change in regressions.items())))
+
+    def load_baseline(self, path, environment):
+        if not os.path.exists(path):
+            return {}
+        with open(path) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline['environment'] != environment:
+            self.stderr.write(self.style.WARNING(
+                f"The baseline was recorded on {baseline['environment']}, timings may not be comparable"))
+        return baseline['benchmarks']
@@ -0,0 +1,38 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from applications.api.slow_queries import rank, read_log
+
+
+class Command(BaseCommand):
+    help = 'Rank the statements of the slow query log by total time, with the routes issuing them, ' \
+           'their worst EXPLAIN plan and the tables they read without an index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--log', default=settings.SLOW_QUERY_LOG, help='Slow query log to read')
+        parser.add_argument('--limit', type=int, default=20, help='Number of statements to report')
+        parser.add_argument('--plans', action='store_true', help='Print the EXPLAIN plan of each statement')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        if not os.path.exists(options['log']):
+            raise CommandError(f"No slow query log at {options['log']}, set SLOW_QUERY_THRESHOLD to record one")
+        ranked = rank(read_log(options['log']))[:options['limit']]
+
+        if options['json']:
+            self.stdout.write(json.dumps(ranked, indent=2))
+            return
+        self.stdout.write(f"{'fingerprint':<12} {'count':>7} {'total ms':>11} {'mean ms':>9} {'max ms':>9}  "
+                          f"{'full scans':<30} top view")
+        for group in ranked:
+            view = next(iter(group['views']))
+            self.stdout.write(f"{group['fingerprint']:<12} {group['count']:>7} {group['total_ms']:>11.1f} "
+                              f"{group['mean_ms']:>9.1f} {group['max_ms']:>9.1f}  "
+                              f"{', '.join(group['full_scans']) or '-':<30} {view}")
+            self.stdout.write(f"    {group['sql']}")
+            if options['plans'] and group['plan']:
+                for line in group['plan']:
+                    self.stdout.write(f"      {line}")
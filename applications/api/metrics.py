@@ -0,0 +1,271 @@
+"""
+In-process request metrics, exported in the Prometheus text format at /metrics.
+
+Every request is counted. A `METRICS_SAMPLE_RATE` share of them is also
+measured: total time, query count, time spent in SQL, and the time of the
+auth, serialize and render phases, SQL excluded, plus the response size.
+Unsampled requests only pay a random() call and a counter increment.
+Each process keeps its own metrics, scrape every worker.
+"""
+import asyncio
+import random
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse
+
+_sample = ContextVar('metrics_sample', default=None)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+PHASES = ('sql', 'auth', 'serialize', 'render')
+
+
+def format_labels(names, values):
+    pairs = ','.join('{}="{}"'.format(name, str(value).replace('\\', r'\\').replace('"', r'\"'))
+                     for name, value in zip(names, values))
+    return '{' + pairs + '}' if pairs else ''
+
+
+class Counter:
+
+    def __init__(self, name, documentation, labels):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._lock = threading.Lock()
+        self._values = defaultdict(int)
+
+    def inc(self, *labels):
+        with self._lock:
+            self._values[labels] += 1
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        lines.extend(f"{self.name}{format_labels(self.labels, labels)} {value}" for labels, value in values)
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram(Counter):
+
+    def __init__(self, name, documentation, labels, buckets):
+        super().__init__(name, documentation, labels)
+        self.buckets = buckets
+        self._values = {}
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                # per bucket counts, then sum and count
+                series = self._values[labels] = [0] * len(self.buckets) + [0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            values = sorted((labels, list(series)) for labels, series in self._values.items())
+        names = self.labels + ('le', )
+        for labels, series in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{format_labels(names, labels + (bound, ))} {cumulative}")
+            lines.append(f"{self.name}_bucket{format_labels(names, labels + ('+Inf', ))} {series[-1]}")
+            lines.append(f"{self.name}_sum{format_labels(self.labels, labels)} {series[-2]}")
+            lines.append(f"{self.name}_count{format_labels(self.labels, labels)} {series[-1]}")
+        return lines
+
+
+REQUESTS = Counter('hedgehog_http_requests_total', 'Requests, sampled or not.', ('route', 'method', 'status'))
+DURATION = Histogram('hedgehog_http_request_duration_seconds', 'Time to respond, sampled requests.',
+                     ('route', 'method'), DURATION_BUCKETS)
+PHASE_DURATION = Histogram('hedgehog_http_request_phase_seconds',
+                           'Time spent in SQL, and in the auth, serialize and render phases without their SQL, '
+                           'sampled requests.', ('route', 'method', 'phase'), DURATION_BUCKETS)
+QUERIES = Histogram('hedgehog_http_request_queries', 'Database queries per sampled request.',
+                    ('route', 'method'), QUERY_BUCKETS)
+RESPONSE_SIZE = Histogram('hedgehog_http_response_size_bytes', 'Response body size, sampled requests.',
+                          ('route', 'method'), SIZE_BUCKETS)
+METRICS = (REQUESTS, DURATION, PHASE_DURATION, QUERIES, RESPONSE_SIZE)
+
+
+class RequestSample:
+    """
+    Measurements of one sampled request, shared with the threads running its ORM work
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self._active = set()
+
+    def record_query(self, duration):
+        self.queries += 1
+        self.phases['sql'] += duration
+
+
+class PhaseTimer:
+    """
+    Add the time spent in the block, SQL excluded, to a phase of the sampled request.
+    Nested blocks of the same phase count once, eg. nested serializers.
+    """
+
+    def __init__(self, phase):
+        self.phase = phase
+
+    def __enter__(self):
+        self.sample = _sample.get()
+        if self.sample is None or self.phase in self.sample._active:
+            self.sample = None
+            return
+        self.sample._active.add(self.phase)
+        self.start = time.perf_counter()
+        self.sql = self.sample.phases['sql']
+
+    def __exit__(self, *exc_info):
+        if self.sample is not None:
+            self.sample._active.discard(self.phase)
+            elapsed = time.perf_counter() - self.start - (self.sample.phases['sql'] - self.sql)
+            self.sample.phases[self.phase] += elapsed
+
+
+def measure(phase):
+    """
+    @:param phase: str one of PHASES
+    @:return: context manager timing its block
+    """
+    return PhaseTimer(phase)
+
+
+def record_query(execute, sql, params, many, context):
+    sample = _sample.get()
+    if sample is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        sample.record_query(time.perf_counter() - start)
+
+
+@receiver(connection_created, dispatch_uid="metrics_record_queries")
+def install_query_recorder(sender, connection, **kwargs):
+    # First in the list: execute_wrapper() blocks pop the last one on exit
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+class MeasuredSerializerMixin:
+    """
+    Count the representation of a serializer in the serialize phase
+    """
+
+    def to_representation(self, instance):
+        if _sample.get() is None:
+            return super().to_representation(instance)
+        with measure('serialize'):
+            return super().to_representation(instance)
+
+
+class MeasuredViewMixin:
+    """
+    Count the authentication of an API view in the auth phase
+    """
+
+    def perform_authentication(self, request):
+        with measure('auth'):
+            super().perform_authentication(request)
+
+
+class MetricsMiddleware:
+    """
+    Count every request and measure a `METRICS_SAMPLE_RATE` share of them.
+    Runs natively in both sync and async stacks, so the sample reaches the view.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Mark the instance as a coroutine function for the handler, as MiddlewareMixin does
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        sample = RequestSample() if random.random() < settings.METRICS_SAMPLE_RATE else None
+        token = _sample.set(sample)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _sample.reset(token)
+        self.record(request, response, sample, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        sample = RequestSample() if random.random() < settings.METRICS_SAMPLE_RATE else None
+        token = _sample.set(sample)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _sample.reset(token)
+        self.record(request, response, sample, time.perf_counter() - start)
+        return response
+
+    def process_template_response(self, request, response):
+        """
+        Render DRF responses here to time it, the handler then finds them rendered
+        """
+        with measure('render'):
+            response.render()
+        return response
+
+    def record(self, request, response, sample, duration):
+        match = getattr(request, 'resolver_match', None)
+        route = (match.url_name or match.view_name) if match is not None else 'unmatched'
+        REQUESTS.inc(route, request.method, response.status_code)
+        if sample is None:
+            return
+        DURATION.observe(duration, route, request.method)
+        for phase, value in sample.phases.items():
+            PHASE_DURATION.observe(value, route, request.method, phase)
+        QUERIES.observe(sample.queries, route, request.method)
+        size = 0 if response.streaming else len(response.content)
+        RESPONSE_SIZE.observe(size, route, request.method)
+
+
+def expose():
+    """
+    @:return: str: every metric in the Prometheus text format
+    """
+    lines = ["# HELP hedgehog_metrics_sample_rate Share of the requests measured.",
+             "# TYPE hedgehog_metrics_sample_rate gauge",
+             f"hedgehog_metrics_sample_rate {settings.METRICS_SAMPLE_RATE}"]
+    for metric in METRICS:
+        lines.extend(metric.expose())
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    return HttpResponse(expose(), content_type='text/plain; version=0.0.4; charset=utf-8')
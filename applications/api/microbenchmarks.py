@@ -0,0 +1,203 @@
+import gc
+import statistics
+import time
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connections, transaction
+from django.db.models.signals import post_save
+from django.test import RequestFactory
+
+from PIL import Image as StdImage
+
+from rest_framework.request import Request
+
+from applications.accounts.models import User
+from applications.api.fast_serializers import FastImageSerializer
+from applications.api.serializers import ImageSerializer, LikeSerializer
+from applications.followers.models import Follow
+from applications.images.models import Image
+from applications.likes.models import Like
+from applications.tasks.models import Job
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """
+    Register a micro-benchmark: a function taking the `Fixtures` and returning the
+    callable to time, called once per iteration
+    """
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+class Fixtures:
+    """
+    Rows shared by the benchmarks, a page of images by different authors with their likes
+    """
+
+    def __init__(self, page_size=20):
+        self.users = [User.objects.create(username=f"microbench{index}@example.com", first_name=f"Bench{index}")
+                      for index in range(page_size)]
+        self.viewer = self.users[0]
+        self.images = [Image.objects.create(user=user, image='images/microbench.png', image_caption='Benchmark',
+                                            width=1024, height=768, image_format='PNG',
+                                            variants={'thumbnail': 'variants/thumbnail/images/microbench.jpg'})
+                       for user in self.users]
+        self.likes = [Like.objects.create(user=self.viewer, image=image) for image in self.images]
+        self.follow = Follow.objects.create(follower=self.viewer, following=self.users[1])
+
+    def request(self, user=None):
+        host = next((host for host in settings.ALLOWED_HOSTS if host[0] not in '*.'), 'localhost')
+        request = Request(RequestFactory(HTTP_HOST=host).get('/api/v1/image-list/'))
+        if user is not None:
+            request.user = user
+        return request
+
+
+@benchmark('image_serializer')
+def image_serializer(fixtures):
+    images = list(Image.objects.filter(pk__in=[image.pk for image in fixtures.images])
+                  .select_related('user').order_by('id'))
+    context = {'request': fixtures.request()}
+    return lambda: ImageSerializer(images, many=True, context=context).data
+
+
+@benchmark('image_serializer_viewer')
+def image_serializer_viewer(fixtures):
+    images = list(Image.objects.filter(pk__in=[image.pk for image in fixtures.images])
+                  .select_related('user').order_by('id'))
+    context = {'request': fixtures.request(fixtures.viewer)}
+    return lambda: ImageSerializer(images, many=True, context=context).data
+
+
+@benchmark('fast_image_serializer')
+def fast_image_serializer(fixtures):
+    serializer = FastImageSerializer(context={'request': fixtures.request()})
+    rows = list(Image.objects.filter(pk__in=[image.pk for image in fixtures.images]).order_by('id')
+                .values(*serializer.value_fields))
+    return lambda: serializer.serialize(rows)
+
+
+@benchmark('like_serializer')
+def like_serializer(fixtures):
+    likes = list(Like.objects.filter(pk__in=[like.pk for like in fixtures.likes])
+                 .select_related('user', 'image__user').order_by('id'))
+    context = {'request': fixtures.request()}
+    return lambda: LikeSerializer(likes, many=True, context=context).data
+
+
+def rolled_back(func):
+    """
+    Wrap `func` in a savepoint rolled back after every call, so each iteration starts from
+    the same rows and the on_commit callbacks it registers are dropped instead of piling up
+    """
+    def call():
+        with transaction.atomic():
+            func()
+            transaction.set_rollback(True)
+    return call
+
+
+@benchmark('validate_image')
+def validate_image(fixtures):
+    data = BytesIO()
+    StdImage.new('RGB', (1024, 768)).save(data, 'PNG')
+    upload = SimpleUploadedFile('microbench.png', data.getvalue(), content_type='image/png')
+    return lambda: ImageSerializer(data={'image': upload}).is_valid(raise_exception=True)
+
+
+@benchmark('like_post_save')
+def like_post_save(fixtures):
+    like = fixtures.likes[0]
+    return rolled_back(lambda: post_save.send(sender=Like, instance=like, created=True, update_fields=None,
+                                              raw=False, using='default'))
+
+
+@benchmark('follow_post_save')
+def follow_post_save(fixtures):
+    follow = fixtures.follow
+    # Drop the job enqueued when the fixture was created, so the receiver enqueues a new one every time
+    Job.objects.filter(idempotency_key=f"timeline-follow:{follow.pk}").delete()
+    return rolled_back(lambda: post_save.send(sender=Follow, instance=follow, created=True, update_fields=None,
+                                              raw=False, using='default'))
+
+
+def count_queries(func):
+    queries = []
+
+    def wrapper(execute, *args):
+        queries.append(1)
+        return execute(*args)
+    with connections['default'].execute_wrapper(wrapper):
+        func()
+    return len(queries)
+
+
+def autorange(func, min_time):
+    """
+    Number of calls of `func` taking at least `min_time` seconds, like timeit
+    """
+    iterations = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        if time.perf_counter() - start >= min_time:
+            return iterations
+        iterations *= 2
+
+
+def measure(func, rounds=15, min_time=0.02, warmup=0.1):
+    """
+    Time `func` over `rounds` rounds after `warmup` seconds of calls. Each round
+    runs enough iterations to last `min_time`, with the garbage collector off.
+    @:return: dict: statistics of the time per call, in microseconds
+    """
+    deadline = time.perf_counter() + warmup
+    while time.perf_counter() < deadline:
+        func()
+    iterations = autorange(func, min_time)
+    timings = []
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(rounds):
+            start = time.perf_counter()
+            for _ in range(iterations):
+                func()
+            timings.append((time.perf_counter() - start) / iterations * 1e6)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return {
+        'rounds': rounds,
+        'iterations': iterations,
+        'min': round(min(timings), 3),
+        'median': round(statistics.median(timings), 3),
+        'mean': round(statistics.mean(timings), 3),
+        'stdev': round(statistics.stdev(timings), 3) if rounds > 1 else 0.0,
+        'queries': count_queries(func),
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Benchmarks whose median got slower than the baseline by more than `threshold`
+    @:param threshold: float, eg. 0.25 for 25%
+    @:return: dict: name to relative change of the median, eg. 0.4 for 40% slower
+    """
+    regressions = {}
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        change = result['median'] / expected['median'] - 1
+        result['change'] = round(change, 3)
+        if change > threshold:
+            regressions[name] = change
+    return regressions
@@ -0,0 +1,123 @@
+import json
+from datetime import date
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+
+
+def _invert(order):
+    return order[1:] if order.startswith('-') else '-' + order
+
+
+def _position_value(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Cursor pagination over a compound, unique ordering such as ('-likes', '-id').
+
+    The cursor stores the values of every ordering column of the boundary row,
+    so each page is a single range scan `WHERE (likes, id) < (x, y) LIMIT n + 1`
+    without an OFFSET or a COUNT(*), whatever the size of the table.
+
+    The ordering is taken from the queryset's `order_by()`. A primary key
+    tie-breaker is appended when missing so that positions are always unique.
+    Double underscore lookups are not supported, annotate them instead.
+    """
+    page_size_query_param = 'limit'
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        position = self.cursor.position if self.cursor is not None else None
+
+        ordering = tuple(_invert(order) for order in self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            try:
+                queryset = queryset.filter(self.get_keyset_filter(ordering, self.decode_position(position)))
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_more = len(results) > self.page_size
+
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        self.next_position = self.previous_position = position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def get_ordering(self, request, queryset, view):
+        ordering = tuple(queryset.query.order_by) or tuple(getattr(view, 'ordering', None) or ())
+        assert ordering and all(isinstance(order, str) for order in ordering), (
+            'Keyset pagination needs the queryset to be ordered by field names.'
+        )
+        assert all('__' not in order for order in ordering), (
+            'Keyset pagination does not support double underscore lookups, annotate the value instead.'
+        )
+        if ordering[-1].lstrip('-') not in ('id', 'pk'):
+            ordering += ('-id' if ordering[-1].startswith('-') else 'id', )
+        return ordering
+
+    def get_keyset_filter(self, ordering, values):
+        """
+        Build the row comparison `(a, b, c) > (x, y, z)` for a mixed asc/desc ordering.
+        """
+        if len(values) != len(ordering):
+            raise NotFound(self.invalid_cursor_message)
+        keyset_filter = Q()
+        for index, order in enumerate(ordering):
+            clause = Q(**{order.lstrip('-') + ('__lt' if order.startswith('-') else '__gt'): values[index]})
+            for previous, value in zip(ordering[:index], values):
+                clause &= Q(**{previous.lstrip('-'): value})
+            keyset_filter |= clause
+        return keyset_filter
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        position = self.encode_position(self.page[-1]) if self.page else self.next_position
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        position = self.encode_position(self.page[0]) if self.page else self.previous_position
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
+
+    def encode_position(self, instance):
+        values = []
+        for order in self.ordering:
+            field_name = 'id' if order.lstrip('-') == 'pk' else order.lstrip('-')
+            value = instance[field_name] if isinstance(instance, dict) else getattr(instance, field_name)
+            values.append(_position_value(value))
+        return json.dumps(values, separators=(',', ':'))
+
+    def decode_position(self, position):
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list):
+            raise NotFound(self.invalid_cursor_message)
+        return values
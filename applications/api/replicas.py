@@ -0,0 +1,94 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.deprecation import MiddlewareMixin
+
+from rest_framework.permissions import SAFE_METHODS
+
+# Alias the reads of the current request go to, None for the primary
+_read_alias = ContextVar('read_alias', default=None)
+
+
+def pin_key(user_id):
+    return f"db-primary-pin:{user_id}"
+
+
+def pin_to_primary(user):
+    """
+    Send the reads of a user to the primary for `DATABASE_REPLICA_PIN_SECONDS`,
+    so they see their own writes while the replicas catch up
+    """
+    cache.set(pin_key(user.pk), True, settings.DATABASE_REPLICA_PIN_SECONDS)
+
+
+def is_pinned(user):
+    return user.is_authenticated and cache.get(pin_key(user.pk), False)
+
+
+class ReplicaRouter:
+    """
+    Reads go to the replica chosen for the current request by `ReplicaReadMixin`,
+    everything else goes to the primary. Replicas are never migrated, they get
+    their schema and rows from the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaReadMixin:
+    """
+    Run the safe methods of a viewset against one of `DATABASE_REPLICAS`, for anonymous
+    and authenticated users alike, unless the user was pinned to the primary by a recent
+    write. The replica is chosen after authentication, which the pin check needs.
+    """
+    _read_alias_token = None
+
+    def read_from_replica(self, request):
+        """
+        Hook for the safe requests that must read the primary anyway
+        """
+        return True
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if (settings.DATABASE_REPLICAS and request.method in SAFE_METHODS and not is_pinned(request.user)
+                and self.read_from_replica(request)):
+            self._read_alias_token = _read_alias.set(random.choice(settings.DATABASE_REPLICAS))
+
+    def dispatch(self, request, *args, **kwargs):
+        # Reset in finally: DRF skips finalize_response when an unexpected exception is raised,
+        # and a WSGI thread would otherwise send every later request to the replica
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            if self._read_alias_token is not None:
+                _read_alias.reset(self._read_alias_token)
+                self._read_alias_token = None
+
+
+class PrimaryPinMiddleware(MiddlewareMixin):
+    """
+    Pin the user of every successful write request to the primary
+    """
+
+    def process_response(self, request, response):
+        user = getattr(request, 'user', None)
+        if (settings.DATABASE_REPLICAS and request.method not in SAFE_METHODS and response.status_code < 400
+                and user is not None and user.is_authenticated):
+            pin_to_primary(user)
+        return response
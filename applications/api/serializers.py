@@ -1,13 +1,18 @@
+from django.conf import settings
+from django.db import models
+
 from rest_framework import serializers
 from rest_framework.serializers import ValidationError
 
-from PIL import Image as StdImage
 from drf_yasg import openapi
 
 from applications.accounts.models import User
+from applications.api.metrics import MeasuredSerializerMixin
 from applications.images.models import Image
+from applications.images.validators import read_image_header
 from applications.followers.models import Follow
 from applications.likes.models import Like
+from applications.suggestions.models import FollowSuggestion
 
 
 class LoginSerializer(serializers.Serializer):
@@ -18,15 +23,68 @@ class LoginSerializer(serializers.Serializer):
     password = serializers.CharField()
 
 
-class UserSerializer(serializers.ModelSerializer):
+def get_viewer(context):
+    """
+    Authenticated user of the request in a serializer context, None for anonymous requests
+    """
+    user = getattr(context.get('request'), 'user', None)
+    if user is None or not user.is_authenticated:
+        return None
+    return user
+
+
+def liked_image_ids(viewer, image_ids):
+    """
+    The ids among `image_ids` liked by `viewer`, in one query
+    """
+    return set(Like.objects.filter(user=viewer, image__in=list(image_ids)).values_list('image', flat=True))
+
+
+def followed_user_ids(viewer, user_ids):
+    """
+    The ids among `user_ids` followed by `viewer`, in one query
+    """
+    return set(Follow.objects.filter(follower=viewer, following__in=list(user_ids)).values_list('following', flat=True))
+
+
+class ViewerFlagsListSerializer(MeasuredSerializerMixin, serializers.ListSerializer):
+    """
+    Looks up the viewer-relative flags of a whole page at once through the child's
+    `prefetch_viewer_flags(items)`, instead of one query per row
+    """
+
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, models.Manager) else data)
+        if get_viewer(self.context) is not None:
+            self.child.prefetch_viewer_flags(items)
+        return super().to_representation(items)
+
+
+class UserSerializer(MeasuredSerializerMixin, serializers.ModelSerializer):
     """
     Basic user serializer, it will serialize basic user information
+    and whether the current user follows them
     """
+    is_followed_by_me = serializers.SerializerMethodField()
 
     class Meta:
         model = User
-        fields = ('id', 'username', 'first_name', 'last_name', 'followers_count', 'following_count')
+        fields = ('id', 'username', 'first_name', 'last_name', 'followers_count', 'following_count',
+                  'is_followed_by_me')
         read_only_fields = ('followers_count', 'following_count')
+        list_serializer_class = ViewerFlagsListSerializer
+
+    def prefetch_viewer_flags(self, users):
+        self.context['followed_user_ids'] = followed_user_ids(get_viewer(self.context), [user.pk for user in users])
+
+    def get_is_followed_by_me(self, obj):
+        viewer = get_viewer(self.context)
+        if viewer is None:
+            return False
+        followed = self.context.get('followed_user_ids')
+        if followed is None:
+            return Follow.objects.filter(follower=viewer, following=obj.pk).exists()
+        return obj.pk in followed
 
 
 class CreateUserSerializer(UserSerializer):
@@ -36,21 +94,43 @@ class CreateUserSerializer(UserSerializer):
 
     class Meta:
         model = User
-        fields = UserSerializer.Meta.fields + ('password', 'home_town', 'phone_number', 'profile_description')
+        fields = ('id', 'username', 'first_name', 'last_name', 'followers_count', 'following_count', 'password',
+                  'home_town', 'phone_number', 'profile_description')
         read_only_fields = UserSerializer.Meta.read_only_fields + ('id', )
         extra_kwargs = {'password': {'write_only': True, 'min_length': 4}}
 
 
-class ImageSerializer(serializers.ModelSerializer):
+class HeaderImageField(serializers.FileField):
+    """
+    Image upload field validated from the image header, see `read_image_header`.
+    Unlike `serializers.ImageField`, the file is opened once and never read or verified in full.
+    The header read is kept on the file as `header`.
+    """
+
+    def to_internal_value(self, data):
+        upload = super().to_internal_value(data)
+        upload.header = read_image_header(upload)
+        return upload
+
+
+class ImageSerializer(MeasuredSerializerMixin, serializers.ModelSerializer):
     """
     Image serializer, it will serialize image model data
+    and whether the current user liked it
     """
+    serializer_field_mapping = {**serializers.ModelSerializer.serializer_field_mapping,
+                                models.ImageField: HeaderImageField}
+
     user = UserSerializer(read_only=True)
+    likes = serializers.IntegerField(source='like_count', read_only=True)
+    variants = serializers.SerializerMethodField()
+    is_liked_by_me = serializers.SerializerMethodField()
 
     class Meta:
         model = Image
-        fields = ['id', 'image', 'image_caption', 'created', 'user', 'likes']
-        read_only_fields = ['id', 'created', 'image_caption', 'likes']
+        fields = ['id', 'image', 'image_caption', 'created', 'user', 'likes', 'variants', 'is_liked_by_me']
+        read_only_fields = ['id', 'created', 'image_caption', 'likes', 'variants']
+        list_serializer_class = ViewerFlagsListSerializer
         swagger_schema_fields = {
             "properties": {
                 "image": openapi.Schema(
@@ -65,15 +145,42 @@ class ImageSerializer(serializers.ModelSerializer):
             "required": ["image", "image_caption"],
         }
 
-    def validate_image(self, value):
-        try:
-            StdImage.open(value).verify()
-        except:
-            raise ValidationError("Unsupported image file")
-        return value
+    def get_variants(self, obj):
+        """
+        srcset map of the generated variants: name -> url
+        """
+        request = self.context.get('request')
+        storage = obj.image.storage
+        variants = {}
+        for variant, name in obj.variants.items():
+            url = storage.url(name)
+            variants[variant] = request.build_absolute_uri(url) if request is not None else url
+        return variants
+
+    def prefetch_viewer_flags(self, images):
+        viewer = get_viewer(self.context)
+        self.context['liked_image_ids'] = liked_image_ids(viewer, [image.pk for image in images])
+        self.context['followed_user_ids'] = followed_user_ids(viewer, {image.user_id for image in images})
+
+    def get_is_liked_by_me(self, obj):
+        viewer = get_viewer(self.context)
+        if viewer is None:
+            return False
+        liked = self.context.get('liked_image_ids')
+        if liked is None:
+            return Like.objects.filter(user=viewer, image=obj.pk).exists()
+        return obj.pk in liked
+
+    def validate(self, attrs):
+        """
+        Record the dimensions and format read while validating the upload
+        """
+        if 'image' in attrs:
+            attrs.update(attrs['image'].header)
+        return attrs
 
 
-class FollowSerializer(serializers.ModelSerializer):
+class FollowSerializer(MeasuredSerializerMixin, serializers.ModelSerializer):
     """
     Serializer to follow and Un follow a user
     """
@@ -92,7 +199,23 @@ class FollowSerializer(serializers.ModelSerializer):
         return value
 
 
-class LikeSerializer(serializers.ModelSerializer):
+class FollowSuggestionSerializer(MeasuredSerializerMixin, serializers.ModelSerializer):
+    """
+    Serializer of a user suggested to follow
+    """
+    user = UserSerializer(source='suggested', read_only=True)
+
+    class Meta:
+        model = FollowSuggestion
+        fields = ['user', 'score', 'mutual_count']
+        list_serializer_class = ViewerFlagsListSerializer
+
+    def prefetch_viewer_flags(self, suggestions):
+        viewer = get_viewer(self.context)
+        self.context['followed_user_ids'] = followed_user_ids(viewer, [row.suggested_id for row in suggestions])
+
+
+class LikeSerializer(MeasuredSerializerMixin, serializers.ModelSerializer):
     """
     Serializer to like and un-like an image feed
     """
@@ -103,9 +226,39 @@ class LikeSerializer(serializers.ModelSerializer):
         model = Like
         fields = ['id', 'user', 'image', 'created', 'liked_user_details', 'image_details']
         read_only_fields = ['id', 'user', 'created', 'liked_user_details', 'image_details']
+        extra_kwargs = {'image': {'queryset': Image.objects.select_related('user')}}
 
     def validate_image(self, value):
         follow_count = Like.objects.filter(user=self.context['request'].user, image=value).count()
         if follow_count > 0:
             raise ValidationError("User already liked")
         return value
+
+
+def validate_bulk_size(value):
+    """
+    Read `BULK_MAX_ITEMS` on every request rather than at import time, so it can be changed at runtime
+    """
+    if len(value) > settings.BULK_MAX_ITEMS:
+        raise ValidationError(f"Ensure this field has no more than {settings.BULK_MAX_ITEMS} elements.")
+    return value
+
+
+class BulkFollowSerializer(serializers.Serializer):
+    """
+    Serializer to follow many users at once
+    """
+    following = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False)
+
+    def validate_following(self, value):
+        return validate_bulk_size(value)
+
+
+class BulkLikeSerializer(serializers.Serializer):
+    """
+    Serializer to like many image feeds at once
+    """
+    images = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False)
+
+    def validate_images(self, value):
+        return validate_bulk_size(value)
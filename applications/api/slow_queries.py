@@ -0,0 +1,222 @@
+"""
+Opt-in slow query log.
+
+With `SLOW_QUERY_THRESHOLD` set, every statement slower than that many
+milliseconds is appended to `SLOW_QUERY_LOG` as a JSON line, with the
+route that issued it and a fingerprint shared by the runs of the same
+statement. The slowest run of each SELECT seen by a process also gets
+its EXPLAIN plan. `manage.py slow_queries` ranks the fingerprints.
+Parameters are never written, only the normalized statement.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+_request = ContextVar('slow_queries_request', default=None)
+_lock = threading.Lock()
+# Duration of the slowest explained run of each fingerprint, in this process
+_explained = {}
+
+STRING = re.compile(r"'(?:[^']|'')*'")
+NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+SPACES = re.compile(r"\s+")
+EXPLAINABLE = re.compile(r"\s*(SELECT|WITH)\b", re.IGNORECASE)
+# Tables read in full: SQLite SCAN without an index, PostgreSQL Seq Scan
+FULL_SCAN = re.compile(r"\bSCAN (?:TABLE )?(\w+)(?!.*\bUSING (?:COVERING )?INDEX)|\bSeq Scan on (\w+)")
+
+
+def normalize(sql):
+    """
+    Replace the literals and placeholders of a statement by `?` and `IN` lists by `(...)`
+    @:param sql: str
+    @:return: str
+    """
+    sql = STRING.sub('?', sql)
+    sql = NUMBER.sub('?', sql.replace('%s', '?'))
+    sql = IN_LIST.sub('IN (...)', sql)
+    return SPACES.sub(' ', sql).strip()
+
+
+def fingerprint(statement):
+    """
+    @:param statement: str normalized statement
+    @:return: str: short hash, the same for every run of the statement
+    """
+    return hashlib.sha1(statement.encode()).hexdigest()[:12]
+
+
+def current_view():
+    request = _request.get()
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    return f"{request.method} {match.url_name or match.view_name}"
+
+
+def explain(connection, sql, params):
+    """
+    EXPLAIN a statement on a cursor of its own, outside of the execute wrappers
+    @:return: list of str: one line per row of the plan, None when it can't be explained
+    """
+    prefix = connection.ops.explain_query_prefix()
+    try:
+        cursor = connection.create_cursor()
+        try:
+            cursor.execute(f"{prefix} {sql}", params)
+            return [' '.join(str(value) for value in row) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+    except connection.Database.Error:
+        logger.warning("Could not explain %s", sql, exc_info=True)
+        return None
+
+
+def should_explain(key, duration):
+    with _lock:
+        if duration <= _explained.get(key, 0):
+            return False
+        _explained[key] = duration
+        return True
+
+
+def write(entry):
+    with _lock:
+        with open(settings.SLOW_QUERY_LOG, 'a') as log_file:
+            log_file.write(json.dumps(entry) + '\n')
+
+
+def record(connection, sql, params, many, duration):
+    statement = normalize(sql)
+    key = fingerprint(statement)
+    entry = {
+        'time': datetime.now(timezone.utc).isoformat(),
+        'fingerprint': key,
+        'duration_ms': round(duration * 1000, 3),
+        'view': current_view(),
+        'database': connection.alias,
+        'sql': statement,
+    }
+    if not many and EXPLAINABLE.match(sql) and should_explain(key, duration):
+        entry['plan'] = explain(connection, sql, params)
+    logger.warning("Slow query %s (%.1f ms) from %s: %s", key, entry['duration_ms'], entry['view'] or '-',
+                   statement)
+    write(entry)
+
+
+def log_slow_query(execute, sql, params, many, context):
+    threshold = settings.SLOW_QUERY_THRESHOLD
+    if threshold is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    result = execute(sql, params, many, context)
+    duration = time.perf_counter() - start
+    if duration * 1000 >= threshold:
+        record(context['connection'], sql, params, many, duration)
+    return result
+
+
+@receiver(connection_created, dispatch_uid="slow_queries_log")
+def install_slow_query_log(sender, connection, **kwargs):
+    # First in the list: execute_wrapper() blocks pop the last one on exit
+    if log_slow_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, log_slow_query)
+
+
+class SlowQueryMiddleware:
+    """
+    Make the request known to the slow query log, which reads its route once resolved.
+    Runs natively in both sync and async stacks, like `MetricsMiddleware`.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        token = _request.set(request)
+        try:
+            return self.get_response(request)
+        finally:
+            _request.reset(token)
+
+    async def __acall__(self, request):
+        token = _request.set(request)
+        try:
+            return await self.get_response(request)
+        finally:
+            _request.reset(token)
+
+
+def read_log(path):
+    """
+    @:param path: str slow query log
+    @:return: generator of dict: one entry per logged query, unreadable lines skipped
+    """
+    with open(path) as log_file:
+        for line in log_file:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def full_scans(plan):
+    """
+    @:param plan: list of str, as returned by `explain`
+    @:return: list of str: tables the plan reads without an index
+    """
+    tables = []
+    for line in plan or ():
+        for match in FULL_SCAN.finditer(line):
+            table = match.group(1) or match.group(2)
+            if table not in tables:
+                tables.append(table)
+    return tables
+
+
+def rank(entries):
+    """
+    Aggregate logged queries by fingerprint, slowest in total first
+    @:param entries: iterable of dict, as written to the log
+    @:return: list of dict: fingerprint, sql, count, total_ms, mean_ms, max_ms, views, plan, full_scans
+    """
+    groups = {}
+    for entry in entries:
+        group = groups.get(entry['fingerprint'])
+        if group is None:
+            group = groups[entry['fingerprint']] = {
+                'fingerprint': entry['fingerprint'], 'sql': entry['sql'], 'count': 0, 'total_ms': 0.0,
+                'max_ms': 0.0, 'views': defaultdict(int), 'plan': None, 'plan_ms': 0.0}
+        group['count'] += 1
+        group['total_ms'] += entry['duration_ms']
+        group['max_ms'] = max(group['max_ms'], entry['duration_ms'])
+        group['views'][entry['view'] or '-'] += 1
+        if entry.get('plan') and entry['duration_ms'] >= group['plan_ms']:
+            group['plan'], group['plan_ms'] = entry['plan'], entry['duration_ms']
+    ranked = sorted(groups.values(), key=lambda group: group['total_ms'], reverse=True)
+    for group in ranked:
+        del group['plan_ms']
+        group['total_ms'] = round(group['total_ms'], 3)
+        group['mean_ms'] = round(group['total_ms'] / group['count'], 3)
+        group['views'] = dict(sorted(group['views'].items(), key=lambda item: item[1], reverse=True))
+        group['full_scans'] = full_scans(group['plan'])
+    return ranked
@@ -1,20 +1,65 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from io import BytesIO, StringIO
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-
-from rest_framework.reverse import reverse
-from rest_framework.test import APIClient
+from django.core.management import call_command, CommandError
+from django.db import connections, router
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase, override_settings
 
 from PIL import Image
-from io import BytesIO
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.reverse import reverse
+from rest_framework.test import APIClient, APIRequestFactory
 
 from applications.accounts.models import User
+from applications.api.asgi import call_asgi, get_application
+from applications.api.fast_serializers import FastImageSerializer, FastUserSerializer
+from applications.api.management.commands.loadtest import api_routes
+from applications.api.metrics import METRICS
+from applications.api.microbenchmarks import BENCHMARKS, Fixtures
+from applications.api.replicas import _read_alias
+from applications.api.serializers import ImageSerializer, UserSerializer
+from applications.api.slow_queries import fingerprint, full_scans, normalize
+from applications.feeds.models import Timeline, TimelineEntry
 from applications.followers.models import Follow
 from applications.images.models import Image as ImageModel
-from applications.likes.models import Like
+from applications.likes.models import Like, LikeCounterShard
+from applications.suggestions.models import FollowSuggestion
+from applications.tasks.models import Job
 
 client = APIClient()
 
 
+def setUpModule():
+    """
+    Store the uploads of the API tests in a temporary media folder, removed once they ran
+    """
+    media_root = tempfile.mkdtemp()
+    settings_override = override_settings(MEDIA_ROOT=media_root)
+    settings_override.enable()
+    unittest.addModuleCleanup(shutil.rmtree, media_root)
+    unittest.addModuleCleanup(settings_override.disable)
+
+
+def run_on_commit_callbacks(using='default'):
+    """
+    Run the on_commit callbacks queued so far, which the transaction of a TestCase never commits
+    """
+    connection = connections[using]
+    callbacks, connection.run_on_commit = connection.run_on_commit, []
+    for sids, func in callbacks:
+        func()
+
+
 def create_image(size=(100, 100), image_mode='RGB', image_format='PNG'):
     """
     Generate a test image, returning the filename that it was saved as.
@@ -72,6 +117,7 @@ class CreateUserViewSetTestCase(TestCase):
 class BaseUserAuthMixinTestCase(TestCase):
 
     def setUp(self):
+        cache.clear()
         self.user = {"username": "token@test.com", "password": "1234"}
         client.post(reverse("register-list"), self.user)
         response = client.post(reverse("login"), self.user)
@@ -84,8 +130,8 @@ class UserViewSetTestCase(BaseUserAuthMixinTestCase):
         client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
         response = client.get(reverse("users-list"))
         self.assertEqual(response.status_code, 200)
-        self.assertIsInstance(response.data, list)
-        self.assertGreater(len(response.data), 0)
+        self.assertIsInstance(response.data["results"], list)
+        self.assertGreater(len(response.data["results"]), 0)
         client.credentials()
 
     def test_user_list_endpoint_without_valid_token(self):
@@ -104,15 +150,99 @@ class ImageViewSetTestCase(BaseUserAuthMixinTestCase):
         client.post(reverse("image-upload-list"), image_input)
         response = client.get(reverse("image-list"))
         self.assertEqual(response.status_code, 200)
-        self.assertIsInstance(response.data, list)
-        self.assertGreater(len(response.data), 0)
+        self.assertIsInstance(response.data["results"], list)
+        self.assertGreater(len(response.data["results"]), 0)
         client.credentials()
 
     def test_image_list_endpoint_without_valid_token(self):
         client.credentials()
         response = client.get(reverse("image-list"))
         self.assertEqual(response.status_code, 200)
-        self.assertIsInstance(response.data, list)
+        self.assertIsInstance(response.data["results"], list)
+
+    def test_image_list_cursor_pagination(self):
+        user = User.objects.get(username=self.user["username"])
+        images = [ImageModel.objects.create(image=create_image(), image_caption="Lorem", user=user, likes=likes)
+                  for likes in (3, 1, 1, 0)]
+        response = client.get(reverse("image-list"), {"limit": 2})
+        self.assertEqual([item["id"] for item in response.data["results"]], [images[0].id, images[2].id])
+        self.assertIsNone(response.data["previous"])
+        response = client.get(response.data["next"])
+        self.assertEqual([item["id"] for item in response.data["results"]], [images[1].id, images[3].id])
+        self.assertIsNone(response.data["next"])
+        response = client.get(response.data["previous"])
+        self.assertEqual([item["id"] for item in response.data["results"]], [images[0].id, images[2].id])
+
+    def test_image_list_sorted_by_trending(self):
+        user = User.objects.get(username=self.user["username"])
+        old = ImageModel.objects.create(image=create_image(), image_caption="Old", user=user, likes=5)
+        ImageModel.objects.filter(pk=old.pk).update(trending_score=F('trending_score') - 1)
+        new = ImageModel.objects.create(image=create_image(), image_caption="New", user=user, likes=1)
+        response = client.get(reverse("image-list"), {"sort": "trending"})
+        self.assertEqual([item["id"] for item in response.data["results"]], [new.id, old.id])
+        response = client.get(reverse("image-list"))
+        self.assertEqual([item["id"] for item in response.data["results"]], [old.id, new.id])
+
+    def test_image_list_with_invalid_cursor(self):
+        response = client.get(reverse("image-list"), {"cursor": "invalid"})
+        self.assertEqual(response.status_code, 404)
+
+
+class ImageSearchViewSetTestCase(BaseUserAuthMixinTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.author = User.objects.get(username=self.user["username"])
+
+    def search(self, query, **params):
+        run_on_commit_callbacks()
+        response = client.get(reverse("image-search-list"), {"q": query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [item["id"] for item in response.data["results"]]
+
+    def test_search_matches_every_word_as_prefix(self):
+        cat = ImageModel.objects.create(image=create_image(), image_caption="Sleepy cat on the sofa", user=self.author)
+        ImageModel.objects.create(image=create_image(), image_caption="Sleepy dog", user=self.author)
+        self.assertEqual(self.search("sleep cat"), [cat.id])
+        self.assertEqual(self.search("CATS"), [])
+
+    def test_search_ranks_caption_matches_first(self):
+        once = ImageModel.objects.create(image=create_image(), image_caption="A cat among many dogs and birds",
+                                         user=self.author)
+        twice = ImageModel.objects.create(image=create_image(), image_caption="Cat meets cat", user=self.author)
+        self.assertEqual(self.search("cat"), [twice.id, once.id])
+
+    def test_search_matches_author_names(self):
+        author = User.objects.create(username="ada", first_name="Ada", last_name="Lovelace")
+        image = ImageModel.objects.create(image=create_image(), image_caption="Engine", user=author)
+        self.assertEqual(self.search("lovelace"), [image.id])
+        author.last_name = "Byron"
+        author.save()
+        self.assertEqual(self.search("lovelace"), [])
+        self.assertEqual(self.search("byron engine"), [image.id])
+
+    def test_search_follows_caption_changes_and_deletes(self):
+        image = ImageModel.objects.create(image=create_image(), image_caption="Sunset", user=self.author)
+        image.image_caption = "Sunrise"
+        image.save()
+        self.assertEqual(self.search("sunset"), [])
+        self.assertEqual(self.search("sunrise"), [image.id])
+        image.delete()
+        self.assertEqual(self.search("sunrise"), [])
+
+    def test_search_cursor_pagination(self):
+        images = [ImageModel.objects.create(image=create_image(), image_caption="Lorem ipsum", user=self.author)
+                  for _ in range(3)]
+        response = client.get(reverse("image-search-list"), {"q": "lorem", "limit": 2})
+        self.assertEqual([item["id"] for item in response.data["results"]], [images[0].id, images[1].id])
+        response = client.get(response.data["next"])
+        self.assertEqual([item["id"] for item in response.data["results"]], [images[2].id])
+        self.assertIsNone(response.data["next"])
+
+    def test_search_without_query(self):
+        response = client.get(reverse("image-search-list"), {"q": " "})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.search("!?"), [])
 
 
 class UserImageViewSetTestCase(BaseUserAuthMixinTestCase):
@@ -124,7 +254,18 @@ class UserImageViewSetTestCase(BaseUserAuthMixinTestCase):
         client.post(reverse("image-upload-list"), image_input)
         response = client.get(reverse("image-feed-for-user-list"))
         self.assertEqual(response.status_code, 200)
-        self.assertIsInstance(response.data, list)
+        self.assertIsInstance(response.data["results"], list)
+        client.credentials()
+
+    def test_user_image_feed_endpoint_reads_timeline(self):
+        client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        author = User.objects.create(username="author@test.com", password="1234")
+        client.post(reverse("follow-list"), {"following": author.id})
+        image = ImageModel.objects.create(image=create_image(), image_caption="Lorem", user=author)
+        TimelineEntry.objects.fan_out(image)
+        response = client.get(reverse("image-feed-for-user-list"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item["id"] for item in response.data["results"]], [image.id])
         client.credentials()
 
     def test_user_image_feed_endpoint_without_valid_token(self):
@@ -145,6 +286,52 @@ class ImageUploadViewSetTestCase(BaseUserAuthMixinTestCase):
         self.assertIsInstance(response.data["id"], int)
         client.credentials()
 
+    def test_image_upload_records_dimensions(self):
+        client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        image_input = {"image": create_image(size=(120, 80)), "image_caption": "Lorem Ipsum"}
+        response = client.post(reverse("image-upload-list"), image_input)
+        self.assertEqual(response.status_code, 201)
+        image = ImageModel.objects.get(pk=response.data["id"])
+        self.assertEqual((image.width, image.height, image.image_format), (120, 80, "PNG"))
+        client.credentials()
+
+    def test_image_upload_rejects_invalid_files(self):
+        client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        image_file = SimpleUploadedFile('avatar.png', b'not an image')
+        response = client.post(reverse("image-upload-list"), {"image": image_file, "image_caption": "Lorem"})
+        self.assertEqual(response.status_code, 400)
+        response = client.post(reverse("image-upload-list"),
+                               {"image": create_image(image_format='BMP'), "image_caption": "Lorem"})
+        self.assertEqual(response.status_code, 400)
+        client.credentials()
+
+    @override_settings(IMAGE_UPLOAD_MAX_PIXELS=100 * 100 - 1)
+    def test_image_upload_rejects_too_many_pixels(self):
+        client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        response = client.post(reverse("image-upload-list"), {"image": create_image(), "image_caption": "Lorem"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["image"], ["Image dimensions too large"])
+        client.credentials()
+
+    @override_settings(IMAGE_UPLOAD_MAX_BYTES=100)
+    def test_image_upload_rejects_large_files(self):
+        client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        with mock.patch("PIL.Image.open") as image_open:
+            response = client.post(reverse("image-upload-list"), {"image": create_image(), "image_caption": "Lorem"})
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(response.data["image"][0].startswith("Image file too large"))
+        image_open.assert_not_called()
+        client.credentials()
+
+    @override_settings(TASKS_EAGER=False)
+    def test_image_upload_opens_the_image_once(self):
+        client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        with mock.patch("PIL.Image.open", wraps=Image.open) as image_open:
+            response = client.post(reverse("image-upload-list"), {"image": create_image(), "image_caption": "Lorem"})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(image_open.call_count, 1)
+        client.credentials()
+
     def test_image_upload_without_valid_token(self):
         client.credentials()
         image_file = create_image()
@@ -197,6 +384,33 @@ class FollowViewSetTestCase(BaseUserAuthMixinTestCase):
         self.assertIsInstance(response.data, dict)
 
 
+@override_settings(TASKS_EAGER=False)
+class FollowSuggestionViewSetTestCase(BaseUserAuthMixinTestCase):
+
+    def setUp(self):
+        super(FollowSuggestionViewSetTestCase, self).setUp()
+        self.reader = User.objects.get(username=self.user["username"])
+        self.users = [User.objects.create(username=f"user{i}@test.com") for i in range(3)]
+        for score, user in enumerate(self.users):
+            FollowSuggestion.objects.create(user=self.reader, suggested=user, score=score, mutual_count=score)
+        client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+
+    def tearDown(self):
+        client.credentials()
+
+    def test_suggestions_best_first(self):
+        with self.assertNumQueries(3):
+            response = client.get(reverse("follow-suggestions-list"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row["user"]["id"] for row in response.data["results"]],
+                         [user.id for user in reversed(self.users)])
+
+    def test_followed_users_are_skipped(self):
+        Follow.objects.create(follower=self.reader, following=self.users[2])
+        response = client.get(reverse("follow-suggestions-list"))
+        self.assertEqual([row["user"]["id"] for row in response.data["results"]], [self.users[1].id, self.users[0].id])
+
+
 class LikesViewSetTestCase(BaseUserAuthMixinTestCase):
 
     def setUp(self):
@@ -240,3 +454,538 @@ class LikesViewSetTestCase(BaseUserAuthMixinTestCase):
         response = client.delete(reverse("like-detail", kwargs={'pk': like.id}))
         self.assertEqual(response.status_code, 401)
         self.assertIsInstance(response.data, dict)
+
+
+class BulkEndpointsTestCase(BaseUserAuthMixinTestCase):
+    """
+    Batch like/follow/lookup endpoints, with a query count that does not grow with the batch.
+    """
+
+    def setUp(self):
+        super(BulkEndpointsTestCase, self).setUp()
+        self.reader = User.objects.get(username=self.user["username"])
+        self.authors = [User.objects.create(username=f"author{i}@test.com") for i in range(10)]
+        self.images = [ImageModel.objects.create(image="images/test.png", image_caption="Lorem", user=author)
+                       for author in self.authors]
+        client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+
+    def tearDown(self):
+        client.credentials()
+
+    def test_bulk_like(self):
+        Like.objects.create(user=self.reader, image=self.images[0])
+        ids = [self.images[0].id, self.images[1].id, self.images[1].id, 999]
+        response = client.post(reverse("like-bulk"), {"images": ids}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["results"], [
+            {"image": self.images[0].id, "status": "exists"},
+            {"image": self.images[1].id, "status": "created"},
+            {"image": 999, "status": "not_found"},
+        ])
+        likes = dict(ImageModel.objects.filter(id__in=ids).values_list('id', 'likes'))
+        self.assertEqual(likes, {self.images[0].id: 1, self.images[1].id: 1})
+
+    def test_bulk_batches_lock_their_user(self):
+        with mock.patch.object(connections['default'].features, 'has_select_for_update', True),\
+                mock.patch.object(User.objects, 'select_for_update', return_value=User.objects.all()) as lock:
+            client.post(reverse("like-bulk"), {"images": [self.images[0].id]}, format='json')
+            client.post(reverse("follow-bulk"), {"following": [self.authors[0].id]}, format='json')
+        self.assertEqual(lock.call_count, 2)
+
+    def test_bulk_like_queries_do_not_grow(self):
+        with self.assertNumQueries(7):
+            client.post(reverse("like-bulk"), {"images": [image.id for image in self.images[:2]]}, format='json')
+        with self.assertNumQueries(7):
+            client.post(reverse("like-bulk"), {"images": [image.id for image in self.images[2:]]}, format='json')
+        self.assertEqual(Like.objects.filter(user=self.reader).count(), 10)
+
+    def test_bulk_like_validation(self):
+        response = client.post(reverse("like-bulk"), {"images": []}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = client.post(reverse("like-bulk"), {"images": ["x"]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        ids = [image.id for image in self.images[:2]]
+        with override_settings(BULK_MAX_ITEMS=1):
+            response = client.post(reverse("like-bulk"), {"images": ids}, format='json')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("images", response.data)
+            response = client.post(reverse("follow-bulk"), {"following": [self.authors[0].id] * 2}, format='json')
+            self.assertEqual(response.status_code, 400)
+        self.assertFalse(Like.objects.filter(user=self.reader).exists())
+
+    @override_settings(TASKS_EAGER=True)
+    def test_bulk_follow(self):
+        Follow.objects.create(follower=self.reader, following=self.authors[0])
+        ids = [author.id for author in self.authors] + [999]
+        response = client.post(reverse("follow-bulk"), {"following": ids}, format='json')
+        self.assertEqual(response.status_code, 200)
+        statuses = [result["status"] for result in response.data["results"]]
+        self.assertEqual(statuses, ["exists"] + ["created"] * 9 + ["not_found"])
+        self.reader.refresh_from_db()
+        self.assertEqual(self.reader.following_count, 10)
+        self.assertEqual(set(User.objects.filter(id__in=ids).values_list('followers_count', flat=True)), {1})
+        self.assertEqual(self.reader.timeline_entries.count(), 10)
+
+    def test_image_lookup(self):
+        ids = [self.images[2].id, self.images[5].id]
+        response = client.get(reverse("image-list"), {"ids": ",".join(map(str, ids))})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({image["id"] for image in response.data["results"]}, set(ids))
+        response = client.get(reverse("image-list"), {"ids": "1,a"})
+        self.assertEqual(response.status_code, 400)
+
+
+def seed_feed_data(reader, authors=10, images_per_author=3):
+    """
+    Seed authors with images and likes, with the reader following every author.
+    """
+    authors = [User.objects.create(username=f"author{i}@test.com", first_name=f"Author{i}") for i in range(authors)]
+    for author in authors:
+        Follow.objects.create(follower=reader, following=author)
+        for index in range(images_per_author):
+            image = ImageModel.objects.create(image="images/test.png", image_caption=f"Image {index}", user=author)
+            TimelineEntry.objects.fan_out(image)
+            for liker in authors[:index]:
+                Like.objects.create(user=liker, image=image)
+    return authors
+
+
+class ViewerFlagsTestCase(BaseUserAuthMixinTestCase):
+
+    def setUp(self):
+        super(ViewerFlagsTestCase, self).setUp()
+        self.reader = User.objects.get(username=self.user["username"])
+        self.authors = [User.objects.create(username=f"author{i}@test.com") for i in range(2)]
+        self.images = [ImageModel.objects.create(image="images/test.png", image_caption="Lorem", user=author)
+                       for author in self.authors]
+        Like.objects.create(user=self.reader, image=self.images[0])
+        Follow.objects.create(follower=self.reader, following=self.authors[1])
+
+    def tearDown(self):
+        client.credentials()
+
+    def test_image_flags(self):
+        client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        results = {row["id"]: row for row in client.get(reverse("image-list")).data["results"]}
+        self.assertEqual(results[self.images[0].id]["is_liked_by_me"], True)
+        self.assertEqual(results[self.images[1].id]["is_liked_by_me"], False)
+        self.assertEqual(results[self.images[0].id]["user"]["is_followed_by_me"], False)
+        self.assertEqual(results[self.images[1].id]["user"]["is_followed_by_me"], True)
+
+    def test_anonymous_flags(self):
+        results = client.get(reverse("image-list")).data["results"]
+        self.assertFalse(any(row["is_liked_by_me"] or row["user"]["is_followed_by_me"] for row in results))
+
+    def test_user_flags(self):
+        client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        results = {row["id"]: row["is_followed_by_me"] for row in client.get(reverse("users-list")).data["results"]}
+        self.assertEqual(results, {self.reader.id: False, self.authors[0].id: False, self.authors[1].id: True})
+
+
+class QueryBudgetTestCase(BaseUserAuthMixinTestCase):
+    """
+    Every list endpoint must cost a fixed number of queries, whatever the page size.
+    """
+
+    def setUp(self):
+        super(QueryBudgetTestCase, self).setUp()
+        self.reader = User.objects.get(username=self.user["username"])
+        seed_feed_data(self.reader)
+
+    def tearDown(self):
+        client.credentials()
+
+    def assertQueryBudget(self, url, budget):
+        for limit in (2, 10):
+            with self.assertNumQueries(budget):
+                response = client.get(url, {"limit": limit})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data["results"]), limit)
+            with self.assertNumQueries(budget):
+                response = client.get(response.data["next"])
+            self.assertEqual(response.status_code, 200)
+
+    def test_image_list_budget(self):
+        client.credentials()
+        self.assertQueryBudget(reverse("image-list"), 1)
+
+    def test_trending_image_list_budget(self):
+        client.credentials()
+        self.assertQueryBudget(reverse("image-list") + "?sort=trending", 1)
+
+    def test_user_list_budget(self):
+        client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        self.assertQueryBudget(reverse("users-list"), 3)
+
+    def test_warm_feed_budget(self):
+        client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        self.assertQueryBudget(reverse("image-feed-for-user-list"), 5)
+
+    def test_cold_feed_budget(self):
+        client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        Timeline.objects.filter(user=self.reader).delete()
+        self.assertQueryBudget(reverse("image-feed-for-user-list"), 5)
+
+
+class FastSerializerTestCase(TestCase):
+    """
+    Fast read serializers must render byte-for-byte what the full serializers render.
+    """
+
+    def setUp(self):
+        self.request = APIRequestFactory().get('/')
+        self.reader = User.objects.create(username="reader@test.com")
+        seed_feed_data(self.reader, authors=3)
+        image = ImageModel.objects.first()
+        ImageModel.objects.filter(pk=image.pk).update(sharded_likes=True,
+                                                      variants={"thumbnail": "variants/thumbnail/test.jpg"})
+        LikeCounterShard.objects.create(image=image, shard=0, count=2)
+
+    def assertSameJSON(self, serializer_class, fast_serializer_class, queryset):
+        context = {'request': self.request}
+        expected = serializer_class(queryset, many=True, context=context).data
+        fast_serializer = fast_serializer_class(context=context)
+        fast = fast_serializer.serialize(list(queryset.values(*fast_serializer.value_fields)))
+        self.assertEqual(JSONRenderer().render(fast), JSONRenderer().render(expected))
+
+    def test_fast_image_serializer(self):
+        self.assertSameJSON(ImageSerializer, FastImageSerializer, ImageModel.objects.order_by('id'))
+
+    def test_fast_user_serializer(self):
+        self.assertSameJSON(UserSerializer, FastUserSerializer, User.objects.order_by('id'))
+
+    def test_image_detail_endpoint(self):
+        image = ImageModel.objects.first()
+        response = client.get(reverse("image-detail", kwargs={'pk': image.id}))
+        expected = ImageSerializer(image, context={'request': response.wsgi_request}).data
+        self.assertEqual(response.content, JSONRenderer().render(expected))
+
+    def test_fast_serializers_with_viewer(self):
+        self.request.user = self.reader
+        Like.objects.create(user=self.reader, image=ImageModel.objects.first())
+        self.assertSameJSON(ImageSerializer, FastImageSerializer, ImageModel.objects.order_by('id'))
+        self.assertSameJSON(UserSerializer, FastUserSerializer, User.objects.order_by('id'))
+
+
+class AsyncReadViewTestCase(TransactionTestCase):
+    """
+    The ASGI application must serve the read endpoints exactly like the WSGI one.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.reader = User.objects.create(username="reader@test.com")
+        seed_feed_data(self.reader, authors=3)
+        self.headers = {'Authorization': 'Token ' + Token.objects.create(user=self.reader).key}
+        self.application = get_application()
+
+    def tearDown(self):
+        client.credentials()
+
+    def call_asgi(self, path, **kwargs):
+        return async_to_sync(call_asgi)(self.application, path, host='testserver', **kwargs)
+
+    def assertSameResponse(self, path, headers=None):
+        client.credentials(**{'HTTP_' + name.upper(): value for name, value in (headers or {}).items()})
+        expected = client.get(path)
+        status, response_headers, body = self.call_asgi(path, headers=headers)
+        self.assertEqual(status, expected.status_code)
+        self.assertEqual(body, expected.content)
+
+    def test_image_list(self):
+        self.assertSameResponse(reverse("image-list") + "?limit=5")
+        self.assertSameResponse(reverse("image-detail", kwargs={'pk': ImageModel.objects.first().pk}))
+
+    def test_user_list(self):
+        self.assertSameResponse(reverse("users-list"), self.headers)
+        self.assertSameResponse(reverse("users-detail", kwargs={'pk': self.reader.pk}), self.headers)
+
+    def test_user_feed(self):
+        self.assertSameResponse(reverse("image-feed-for-user-list"), self.headers)
+
+    def test_feed_requires_authentication(self):
+        status, headers, body = self.call_asgi(reverse("image-feed-for-user-list"))
+        self.assertEqual(status, 401)
+
+    def test_image_list_not_modified(self):
+        status, headers, body = self.call_asgi(reverse("image-list"))
+        status, headers, body = self.call_asgi(reverse("image-list"), headers={'If-None-Match': headers['etag']})
+        self.assertEqual(status, 304)
+
+    def test_media_files(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        with open(os.path.join(media_root, 'cat.png'), 'wb') as media_file:
+            media_file.write(b'x' * 100000)
+        with override_settings(MEDIA_ROOT=media_root):
+            status, headers, body = self.call_asgi('/media/cat.png')
+            self.assertEqual((status, headers['content-type'], len(body)), (200, 'image/png', 100000))
+            status, headers, body = self.call_asgi('/media/cat.png', headers={'If-None-Match': headers['etag']})
+            self.assertEqual(status, 304)
+            self.assertEqual(self.call_asgi('/media/missing.png')[0], 404)
+            self.assertEqual(self.call_asgi('/media/../settings.py')[0], 404)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTestCase(TransactionTestCase):
+    """
+    A copy of the test database in an SQLite file stands in for the replica,
+    rows written to the primary afterwards are missing from it like replication lag.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.reader = User.objects.create(username="reader@test.com")
+        self.author = User.objects.create(username="author@test.com")
+        self.old = ImageModel.objects.create(image="images/test.png", image_caption="Old", user=self.author)
+        client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=self.reader).key)
+
+        replica_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, replica_dir)
+        connections.databases['replica'] = {'ENGINE': 'django.db.backends.sqlite3',
+                                            'NAME': os.path.join(replica_dir, 'replica.sqlite3')}
+        connections['default'].ensure_connection()
+        replica = connections['replica']
+        replica.ensure_connection()
+        connections['default'].connection.backup(replica.connection)
+        self.new = ImageModel.objects.create(image="images/test.png", image_caption="New", user=self.author)
+
+    def tearDown(self):
+        client.credentials()
+        connections['replica'].close()
+        del connections['replica']
+        del connections.databases['replica']
+
+    def image_ids(self):
+        return [item["id"] for item in client.get(reverse("image-list")).data["results"]]
+
+    def test_reads_go_to_the_replica(self):
+        self.assertEqual(self.image_ids(), [self.old.id])
+        response = client.get(reverse("users-list"))
+        self.assertEqual(len(response.data["results"]), 2)
+
+    def test_writes_go_to_the_primary_and_pin_the_user(self):
+        response = client.post(reverse("like-list"), {"image": self.new.id})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.image_ids(), [self.new.id, self.old.id])
+        cache.clear()
+        self.assertEqual(self.image_ids(), [self.old.id])
+
+    def test_cached_anonymous_list_reads_the_primary(self):
+        client.credentials()
+        self.assertEqual(self.image_ids(), [self.new.id, self.old.id])
+        response = client.get(reverse("image-detail", kwargs={'pk': self.new.pk}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_replica_is_released_after_an_unexpected_error(self):
+        with mock.patch("applications.api.views.ImageViewSet.get_queryset", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                client.get(reverse("image-list"))
+        self.assertIsNone(_read_alias.get())
+        self.assertEqual(router.db_for_read(ImageModel), 'default')
+
+    def test_other_endpoints_read_the_primary(self):
+        FollowSuggestion.objects.create(user=self.reader, suggested=self.author, score=1)
+        response = client.get(reverse("follow-suggestions-list"))
+        self.assertEqual(len(response.data["results"]), 1)
+
+    def test_replicas_are_not_migrated(self):
+        self.assertFalse(router.allow_migrate('replica', 'images'))
+        self.assertTrue(router.allow_migrate('default', 'images'))
+
+
+class LoadTestCommandTestCase(TransactionTestCase):
+
+    def test_every_route_is_driven(self):
+        output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, output_dir)
+        output = os.path.join(output_dir, 'report.json')
+        call_command('loadtest', users=20, images=40, follows=80, likes=120, actors=5, requests=3,
+                     concurrency=1, host='testserver', output=output, stderr=StringIO())
+        with open(output) as report_file:
+            report = json.load(report_file)
+        seeded = {table: report['seed'][table] for table in ('users', 'images', 'follows', 'likes')}
+        self.assertEqual(seeded, {'users': 20, 'images': 40, 'follows': 80, 'likes': 120})
+        self.assertEqual(set(report['routes']), {f"{method.upper()} {name}" for name, method in api_routes()})
+        for route, result in report['routes'].items():
+            self.assertEqual(result['requests'], 3, route)
+            self.assertTrue(all(int(status) < 400 for status in result['status']), (route, result['status']))
+        self.assertEqual(User.objects.get(username="loadtest-0@example.com").followers_count,
+                         Follow.objects.filter(following__username="loadtest-0@example.com").count())
+
+
+class MicroBenchmarkCommandTestCase(TestCase):
+
+    def microbench(self, **options):
+        call_command('microbench', rounds=2, min_time=0.001, warmup=0, baseline=self.baseline,
+                     stdout=StringIO(), stderr=StringIO(), **options)
+
+    def setUp(self):
+        baseline_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, baseline_dir)
+        self.baseline = os.path.join(baseline_dir, 'baseline.json')
+
+    def test_baseline_and_regressions(self):
+        self.microbench(save_baseline=True)
+        with open(self.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        self.assertEqual(set(baseline['benchmarks']), set(BENCHMARKS))
+        self.assertEqual(baseline['benchmarks']['image_serializer']['queries'], 0)
+        self.microbench(threshold=100)
+
+        baseline['benchmarks']['validate_image']['median'] /= 1000
+        with open(self.baseline, 'w') as baseline_file:
+            json.dump(baseline, baseline_file)
+        with self.assertRaisesMessage(CommandError, 'validate_image'):
+            self.microbench(threshold=100)
+        self.microbench(threshold=100, only=['image_serializer'])
+        self.assertFalse(User.objects.filter(username__startswith='microbench').exists())
+
+    def test_require_baseline(self):
+        self.microbench(only=['image_serializer'])
+        with self.assertRaisesMessage(CommandError, 'No baseline'):
+            self.microbench(only=['image_serializer'], require_baseline=True)
+        self.microbench(only=['image_serializer'], save_baseline=True, require_baseline=True)
+        self.microbench(only=['image_serializer'], require_baseline=True, threshold=100)
+        with self.assertRaisesMessage(CommandError, 'like_serializer'):
+            self.microbench(only=['like_serializer'], require_baseline=True)
+
+    def test_signal_benchmarks_roll_back_every_call(self):
+        fixtures = Fixtures()
+        connection = connections['default']
+        for name in ('like_post_save', 'follow_post_save'):
+            func = BENCHMARKS[name](fixtures)
+            callbacks = len(connection.run_on_commit)
+            for _ in range(3):
+                func()
+            self.assertEqual(len(connection.run_on_commit), callbacks, name)
+        self.assertFalse(Job.objects.filter(idempotency_key=f"timeline-follow:{fixtures.follow.pk}").exists())
+        self.assertEqual(User.objects.get(pk=fixtures.users[1].pk).followers_count, 1)
+
+
+class MetricsTestCase(BaseUserAuthMixinTestCase):
+
+    def setUp(self):
+        super(MetricsTestCase, self).setUp()
+        for metric in METRICS:
+            metric.clear()
+        client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+
+    def tearDown(self):
+        client.credentials()
+
+    def scrape(self):
+        response = client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        return dict(line.rsplit(' ', 1) for line in response.content.decode().splitlines()
+                    if not line.startswith('#'))
+
+    @override_settings(METRICS_SAMPLE_RATE=1)
+    def test_sampled_request(self):
+        self.assertEqual(client.get(reverse("users-list")).status_code, 200)
+        samples = self.scrape()
+        labels = 'route="users-list",method="GET"'
+        self.assertEqual(samples['hedgehog_http_requests_total{' + labels + ',status="200"}'], '1')
+        self.assertEqual(samples['hedgehog_http_request_duration_seconds_count{' + labels + '}'], '1')
+        self.assertEqual(samples['hedgehog_http_request_queries_sum{' + labels + '}'], '3')
+        self.assertEqual(samples['hedgehog_http_request_queries_bucket{' + labels + ',le="3"}'], '1')
+        self.assertEqual(samples['hedgehog_http_request_queries_bucket{' + labels + ',le="2"}'], '0')
+        for phase in ('sql', 'auth', 'serialize', 'render'):
+            key = 'hedgehog_http_request_phase_seconds_sum{' + labels + f',phase="{phase}"}}'
+            self.assertGreater(float(samples[key]), 0, phase)
+        self.assertGreater(float(samples['hedgehog_http_response_size_bytes_sum{' + labels + '}']), 0)
+
+    @override_settings(METRICS_SAMPLE_RATE=0)
+    def test_unsampled_request_is_only_counted(self):
+        client.get(reverse("users-list"))
+        client.get(reverse("users-list"))
+        samples = self.scrape()
+        self.assertEqual(samples['hedgehog_http_requests_total{route="users-list",method="GET",status="200"}'], '2')
+        self.assertFalse([key for key in samples if key.startswith('hedgehog_http_request_duration_seconds')])
+        self.assertEqual(samples['hedgehog_metrics_sample_rate'], '0')
+
+
+@override_settings(METRICS_SAMPLE_RATE=1)
+class AsyncMetricsTestCase(TransactionTestCase):
+
+    def setUp(self):
+        for metric in METRICS:
+            metric.clear()
+
+    def test_async_request(self):
+        reader = User.objects.create(username="reader@test.com")
+        seed_feed_data(reader, authors=3)
+        async_to_sync(call_asgi)(get_application(), reverse("image-feed-for-user-list"), host='testserver',
+                                 headers={'Authorization': 'Token ' + Token.objects.create(user=reader).key})
+        samples = dict(line.rsplit(' ', 1) for line in client.get('/metrics').content.decode().splitlines()
+                       if not line.startswith('#'))
+        labels = 'route="image-feed-for-user-list",method="GET"'
+        self.assertEqual(samples['hedgehog_http_requests_total{' + labels + ',status="200"}'], '1')
+        self.assertEqual(samples['hedgehog_http_request_queries_sum{' + labels + '}'], '5')
+        for phase in ('sql', 'auth', 'serialize', 'render'):
+            key = 'hedgehog_http_request_phase_seconds_sum{' + labels + f',phase="{phase}"}}'
+            self.assertGreater(float(samples[key]), 0, phase)
+
+
+class SlowQueryLogTestCase(BaseUserAuthMixinTestCase):
+
+    def setUp(self):
+        super(SlowQueryLogTestCase, self).setUp()
+        log_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, log_dir)
+        self.log = os.path.join(log_dir, 'slow-queries.log')
+        reader = User.objects.get(username=self.user["username"])
+        seed_feed_data(reader, authors=3)
+        client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+
+    def tearDown(self):
+        client.credentials()
+
+    def read_log(self):
+        with open(self.log) as log_file:
+            return [json.loads(line) for line in log_file]
+
+    def test_fingerprint_ignores_literals(self):
+        first = normalize("SELECT * FROM t1 WHERE id IN (%s, %s) AND name = 'a''b'  LIMIT 21")
+        second = normalize("SELECT *\nFROM t1 WHERE id IN (%s) AND name = 'c' LIMIT 5")
+        self.assertEqual(first, "SELECT * FROM t1 WHERE id IN (...) AND name = ? LIMIT ?")
+        self.assertEqual(fingerprint(first), fingerprint(second))
+
+    def test_full_scans(self):
+        plan = ["2 0 0 SCAN applications_likes_like", "5 0 0 SCAN u USING INDEX sqlite_autoindex_u_1",
+                "Seq Scan on applications_images_image  (cost=0.00..1.01 rows=1 width=4)"]
+        self.assertEqual(full_scans(plan), ["applications_likes_like", "applications_images_image"])
+
+    def test_off_by_default(self):
+        with override_settings(SLOW_QUERY_LOG=self.log):
+            client.get(reverse("image-feed-for-user-list"))
+        self.assertFalse(os.path.exists(self.log))
+
+    def test_slow_queries_are_logged_and_ranked(self):
+        with override_settings(SLOW_QUERY_THRESHOLD=0, SLOW_QUERY_LOG=self.log):
+            with self.assertLogs('applications.api.slow_queries', 'WARNING') as logs:
+                for _ in range(2):
+                    self.assertEqual(client.get(reverse("image-feed-for-user-list")).status_code, 200)
+        self.assertEqual(len(logs.records), 10)
+        entries = self.read_log()
+        self.assertEqual(len(entries), 10)
+        self.assertEqual({entry['view'] for entry in entries}, {"GET image-feed-for-user-list"})
+        self.assertTrue(all('%s' not in entry['sql'] for entry in entries))
+        self.assertTrue(any(entry['sql'].startswith('SELECT (?) AS "a" FROM') for entry in entries))
+        explained = [entry for entry in entries if 'plan' in entry]
+        self.assertTrue(explained)
+        self.assertTrue(all(entry['plan'] for entry in explained))
+
+        stdout = StringIO()
+        call_command('slow_queries', log=self.log, json=True, stdout=stdout)
+        ranked = json.loads(stdout.getvalue())
+        self.assertEqual(len(ranked), 5)
+        self.assertEqual(sum(group['count'] for group in ranked), 10)
+        self.assertEqual([group['total_ms'] for group in ranked],
+                         sorted((group['total_ms'] for group in ranked), reverse=True))
+        call_command('slow_queries', log=self.log, plans=True, stdout=StringIO())
+
+    def test_missing_log(self):
+        with self.assertRaisesMessage(CommandError, 'SLOW_QUERY_THRESHOLD'):
+            call_command('slow_queries', log=self.log)
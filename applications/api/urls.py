@@ -9,8 +9,10 @@ router = DefaultRouter()
 router.register(r'register', views.CreateUserViewSet, basename='register')
 router.register(r'users', views.UserViewSet, basename='users')
 router.register(r'follow', views.FollowViewSet, basename='follow')
+router.register(r'follow-suggestions', views.FollowSuggestionViewSet, basename='follow-suggestions')
 
 router.register(r'image-list', views.ImageViewSet, basename='image')
+router.register(r'image-search', views.ImageSearchViewSet, basename='image-search')
 router.register(r'image-upload', views.ImageUploadViewSet, basename='image-upload')
 router.register(r'images-for-user-feed', views.UserImageViewSet, basename='image-feed-for-user')
 router.register(r'like', views.LikesViewSet, basename='like')
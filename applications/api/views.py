@@ -1,28 +1,138 @@
+import time
+
+from django.conf import settings
 from django.contrib.auth import authenticate
+from django.db.models import F
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.decorators import method_decorator
+from django.utils.http import http_date, quote_etag
 
 from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.views import APIView
 from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.generics import get_object_or_404
 
+from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 
+from applications.accounts.authentication import issue_signed_token
+from applications.api.fast_serializers import FastImageSerializer, FastUserSerializer
+from applications.api.metrics import MeasuredViewMixin, measure
+from applications.api.replicas import ReplicaReadMixin
 from applications.api.serializers import ImageSerializer, FollowSerializer, LoginSerializer,\
-    CreateUserSerializer, UserSerializer, LikeSerializer
+    CreateUserSerializer, UserSerializer, LikeSerializer, BulkFollowSerializer, BulkLikeSerializer,\
+    FollowSuggestionSerializer
+from applications.images.cache import get_image_list_version, image_list_cache_key, image_list_etag,\
+    get_cached_image_list, set_cached_image_list
 from applications.images.models import Image
+from applications.images.search import search_images
+from applications.images.tasks import generate_image_variants
+from applications.feeds.models import Timeline
+from applications.feeds.tasks import fan_out_image
 from applications.followers.models import Follow
 from applications.accounts.models import User
 from applications.likes.models import Like
+from applications.suggestions.models import FollowSuggestion
+from applications.suggestions.tasks import schedule_refresh
+
+
+def parse_ids(value):
+    """
+    Parse a comma separated list of at most `BULK_MAX_ITEMS` ids
+    @:param value: str eg. '1,2,3'
+    @:return: list of int
+    """
+    try:
+        ids = [int(pk) for pk in value.split(',') if pk.strip()]
+    except ValueError:
+        raise ValidationError({'ids': 'A comma separated list of ids is expected.'})
+    if len(ids) > settings.BULK_MAX_ITEMS:
+        raise ValidationError({'ids': f'At most {settings.BULK_MAX_ITEMS} ids are allowed.'})
+    return ids
+
+
+class FastReadMixin:
+    """
+    Serve GET list/retrieve from `.values()` rows through `fast_serializer_class`,
+    while `serializer_class` keeps handling validation of writes
+    """
+    fast_serializer_class = None
+
+    def get_fast_serializer(self):
+        return self.fast_serializer_class(context=self.get_serializer_context())
+
+    def get_values_queryset(self, serializer):
+        queryset = self.filter_queryset(self.get_queryset())
+        ordering = [order.lstrip('-') for order in queryset.query.order_by]
+        extra = [field for field in ordering if field not in serializer.value_fields and field != 'pk']
+        return queryset.values(*serializer.value_fields, *extra)
+
+    def list(self, request, *args, **kwargs):
+        serializer = self.get_fast_serializer()
+        queryset = self.get_values_queryset(serializer)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            with measure('serialize'):
+                data = serializer.serialize(page)
+            return self.get_paginated_response(data)
+        rows = list(queryset)
+        with measure('serialize'):
+            return Response(serializer.serialize(rows))
+
+    def retrieve(self, request, *args, **kwargs):
+        serializer = self.get_fast_serializer()
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        row = get_object_or_404(self.get_values_queryset(serializer),
+                                **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        with measure('serialize'):
+            return Response(serializer.serialize([row])[0])
 
 
-class LoginView(APIView):
+class ImageListCacheMixin:
+    """
+    Cache the list pages served to anonymous users, keyed by the image-list version,
+    path and query string. Pages carry an ETag digest of their content and the time
+    they were rendered as Last-Modified, so conditional GETs of a cached page get
+    a 304 without touching the ORM.
+    """
+
+    def list(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return super().list(request, *args, **kwargs)
+
+        path = request.get_full_path()
+        key = image_list_cache_key(get_image_list_version(), path)
+        page = get_cached_image_list(key)
+        if page is None:
+            data = super().list(request, *args, **kwargs).data
+            page = (data, image_list_etag(path, JSONRenderer().render(data)), time.time())
+            set_cached_image_list(key, page)
+        data, etag, modified = page
+
+        etag = quote_etag(etag)
+        not_modified = get_conditional_response(request._request, etag=etag, last_modified=int(modified))
+        if not_modified is not None:
+            not_modified['ETag'] = etag
+            return not_modified
+        response = Response(data)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(modified)
+        patch_vary_headers(response, ('Authorization', ))
+        return response
+
+
+class LoginView(MeasuredViewMixin, APIView):
     """
     Views for a user to login
     @param: username:str required
     @param: password:str required
-    @return: dict: status: str, token:str, username:str
+    @return: dict: status: str, token:str, signed_token:str, username:str
     """
     permission_classes = (AllowAny, )
     serializer_class = LoginSerializer
@@ -35,13 +145,14 @@ class LoginView(APIView):
         if user:
             if user.is_active:
                 token, created = Token.objects.get_or_create(user=user)
-                return Response({'status': 'success', 'username': serializer.data['username'], "token": token.key})
+                return Response({'status': 'success', 'username': serializer.data['username'], "token": token.key,
+                                 "signed_token": issue_signed_token(user)})
             else:
                 return Response({'status': 'error', 'message': 'User is inactive'}, status=status.HTTP_400_BAD_REQUEST)
         return Response({'status': 'error', 'message': 'Invalid credential'}, status=status.HTTP_400_BAD_REQUEST)
 
 
-class CreateUserViewSet(viewsets.ModelViewSet):
+class CreateUserViewSet(MeasuredViewMixin, viewsets.ModelViewSet):
     """
     ViewSet for register a new user
     @:param: username:str required
@@ -65,7 +176,7 @@ class CreateUserViewSet(viewsets.ModelViewSet):
         user.save()
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(MeasuredViewMixin, ReplicaReadMixin, FastReadMixin, viewsets.ModelViewSet):
     """
     Views for listing all the users
     @:param
@@ -74,32 +185,80 @@ class UserViewSet(viewsets.ModelViewSet):
     http_method_names = ['get', ]
     permission_classes = (IsAuthenticated, )
     serializer_class = UserSerializer
-    queryset = User.objects.all()
+    fast_serializer_class = FastUserSerializer
+    queryset = User.objects.all().order_by('id')
 
 
-class ImageViewSet(viewsets.ModelViewSet):
+@method_decorator(name='list', decorator=swagger_auto_schema(manual_parameters=[
+    openapi.Parameter('sort', openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=['likes', 'trending']),
+    openapi.Parameter('ids', openapi.IN_QUERY, type=openapi.TYPE_STRING, description='Comma separated image ids'),
+]))
+class ImageViewSet(MeasuredViewMixin, ReplicaReadMixin, ImageListCacheMixin, FastReadMixin,
+                   viewsets.ModelViewSet):
     """
-    Views for listing all the images, sorted by likes count
-    @:param
+    Views for listing all the images, sorted by likes count,
+    or by the time-decayed trending score with `?sort=trending`.
+    `?ids=1,2,3` looks up a batch of images.
+    @:param sort:str non-required
+    @:param ids:str non-required
     @:return: list of image feeds
     """
     http_method_names = ['get', ]
     permission_classes = (AllowAny, )
     serializer_class = ImageSerializer
-    queryset = Image.objects.all().order_by('-likes')
+    fast_serializer_class = FastImageSerializer
+    queryset = Image.objects.select_related('user').order_by('-likes', '-id')
+
+    def get_queryset(self):
+        queryset = self.queryset
+        if self.request.query_params.get('sort') == 'trending':
+            queryset = queryset.order_by('-trending_score', '-id')
+        ids = self.request.query_params.get('ids')
+        if ids is not None:
+            queryset = queryset.filter(id__in=parse_ids(ids))
+        return queryset
+
+    def read_from_replica(self, request):
+        # Anonymous list pages are cached under the current image-list version until the next
+        # write: a lagging replica would have them serve the pre-write rows for the whole timeout
+        return self.action != 'list' or request.user.is_authenticated
+
+
+@method_decorator(name='list', decorator=swagger_auto_schema(manual_parameters=[
+    openapi.Parameter('q', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=True,
+                      description='Words to find in the caption or author name'),
+]))
+class ImageSearchViewSet(ImageViewSet):
+    """
+    Views for searching images by caption and author name, best matches first.
+    Every word of `q` has to match, as a prefix.
+    @:param q:str required
+    @:return: list of images
+    """
+
+    def get_queryset(self):
+        query = self.request.query_params.get('q', '').strip()
+        if not query:
+            raise ValidationError({'q': 'A search query is required.'})
+        return search_images(self.queryset, query)
 
 
 class UserImageViewSet(ImageViewSet):
     """
-    Views for listing follower images sorted by recent
+    Views for listing follower images sorted by recent.
+    Reads the materialized timeline of the user, or falls back to
+    querying the followed users while the timeline is cold.
     @:param
     @:return: list of images
     """
     permission_classes = (IsAuthenticated, )
 
     def get_queryset(self):
+        if Timeline.objects.filter(user=self.request.user).exists():
+            return self.queryset.filter(timeline_entries__user=self.request.user)\
+                .annotate(feed_created=F('timeline_entries__created')).order_by('-feed_created', '-id')
         following_users = Follow.objects.filter(follower=self.request.user).values_list('following')
-        return self.queryset.filter(user__in=following_users).order_by('-created')
+        return self.queryset.filter(user__in=following_users).order_by('-created', '-id')
 
 
 class ImageUploadViewSet(ImageViewSet):
@@ -118,12 +277,16 @@ class ImageUploadViewSet(ImageViewSet):
     @swagger_auto_schema(request_body=ImageSerializer)
     def perform_create(self, serializer):
         """
-        Override to add user to serializer
+        Override to add user to serializer, push the image to follower timelines
+        and queue the generation of its resized variants
         """
-        serializer.save(user=self.request.user)
+        image = serializer.save(user=self.request.user)
+        fan_out_image.enqueue(args=(image.pk,), key=f"fan-out:{image.pk}")
+        if settings.IMAGE_VARIANTS:
+            generate_image_variants.enqueue(args=(image.pk,), key=f"variants:{image.pk}")
 
 
-class FollowViewSet(viewsets.ModelViewSet):
+class FollowViewSet(MeasuredViewMixin, viewsets.ModelViewSet):
     """
     View Set to change the status to follow or un-follow as per the request.
     @:param following:int user-id required
@@ -132,7 +295,7 @@ class FollowViewSet(viewsets.ModelViewSet):
     permission_classes = (IsAuthenticated, )
     http_method_names = ['post', 'delete']
     serializer_class = FollowSerializer
-    queryset = Follow.objects.all()
+    queryset = Follow.objects.select_related('follower', 'following')
 
     def get_queryset(self):
         return self.queryset.filter(follower=self.request.user)
@@ -146,8 +309,38 @@ class FollowViewSet(viewsets.ModelViewSet):
     def perform_destroy(self, instance):
         instance.delete()
 
+    @swagger_auto_schema(request_body=BulkFollowSerializer)
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        """
+        Follow up to `BULK_MAX_ITEMS` users at once
+        @:param following:list of user-ids required
+        @:return: dict: results: list of {following, status}
+        """
+        serializer = BulkFollowSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = Follow.objects.bulk_follow(request.user, serializer.validated_data['following'])
+        schedule_refresh(request.user.pk)
+        return Response({'results': [{'following': pk, 'status': result} for pk, result in results.items()]})
+
 
-class LikesViewSet(viewsets.ModelViewSet):
+class FollowSuggestionViewSet(MeasuredViewMixin, viewsets.ModelViewSet):
+    """
+    Views for listing the users suggested to follow, best first.
+    Reads the precomputed suggestions, skipping users followed since.
+    @:return: list of suggestions
+    """
+    http_method_names = ['get', ]
+    permission_classes = (IsAuthenticated, )
+    serializer_class = FollowSuggestionSerializer
+    queryset = FollowSuggestion.objects.select_related('suggested').order_by('-score', '-id')
+
+    def get_queryset(self):
+        following_users = Follow.objects.filter(follower=self.request.user).values('following')
+        return self.queryset.filter(user=self.request.user).exclude(suggested__in=following_users)
+
+
+class LikesViewSet(MeasuredViewMixin, viewsets.ModelViewSet):
     """
     View Set for like/undo-like an image feed
     @:param image:int image-id required
@@ -156,7 +349,7 @@ class LikesViewSet(viewsets.ModelViewSet):
     permission_classes = (IsAuthenticated, )
     http_method_names = ['post', 'delete']
     serializer_class = LikeSerializer
-    queryset = Like.objects.all()
+    queryset = Like.objects.select_related('user', 'image__user')
 
     def get_queryset(self):
         return self.queryset.filter(user=self.request.user)
@@ -169,3 +362,16 @@ class LikesViewSet(viewsets.ModelViewSet):
 
     def perform_destroy(self, instance):
         instance.delete()
+
+    @swagger_auto_schema(request_body=BulkLikeSerializer)
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        """
+        Like up to `BULK_MAX_ITEMS` images at once
+        @:param images:list of image-ids required
+        @:return: dict: results: list of {image, status}
+        """
+        serializer = BulkLikeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = Like.objects.bulk_like(request.user, serializer.validated_data['images'])
+        return Response({'results': [{'image': pk, 'status': result} for pk, result in results.items()]})
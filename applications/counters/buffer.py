@@ -0,0 +1,120 @@
+import atexit
+import logging
+import os
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from applications.counters.utils import increment, increment_many
+from applications.images.cache import invalidate_image_list
+
+logger = logging.getLogger(__name__)
+
+
+class CounterBuffer:
+    """
+    In-process write-behind buffer for counter deltas.
+
+    Deltas are summed per row and flushed as one UPDATE per row, either every
+    `COUNTER_FLUSH_INTERVAL` milliseconds by a background thread or as soon as
+    `COUNTER_FLUSH_MAX_EVENTS` events are pending. Whatever is left is flushed
+    when the process exits.
+    """
+
+    def __init__(self):
+        self._reset()
+        atexit.register(self.stop)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._pending = defaultdict(Counter)
+        self._events = 0
+        self._stopped = threading.Event()
+        self._worker = None
+
+    def add(self, model, pk, **deltas):
+        """
+        Queue counter deltas for one row
+        @:param model: model class
+        @:param pk: primary key of the row
+        @:param deltas: field name to signed delta
+        """
+        with self._lock:
+            self._pending[(model, pk)].update(deltas)
+            self._events += 1
+            flush_now = self._events >= settings.COUNTER_FLUSH_MAX_EVENTS
+            if not flush_now and (self._worker is None or not self._worker.is_alive()):
+                self._worker = threading.Thread(target=self._run, name='counter-flush', daemon=True)
+                self._worker.start()
+        if flush_now:
+            self.flush()
+
+    def flush(self):
+        """
+        Write every pending delta, one UPDATE per row, then invalidate the cached
+        image lists, which show the counters. Rows that fail are queued again for the next flush.
+        @:return: number of rows written
+        """
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(Counter)
+            self._events = 0
+        written = 0
+        for (model, pk), deltas in pending.items():
+            try:
+                increment(model, pk, **deltas)
+                written += 1
+            except Exception:
+                logger.exception("Could not flush counters of %s %s", model.__name__, pk)
+                with self._lock:
+                    self._pending[(model, pk)].update(deltas)
+        if written:
+            invalidate_image_list()
+        return written
+
+    def stop(self):
+        self._stopped.set()
+        if self._pending:
+            self.flush()
+
+    def _run(self):
+        while not self._stopped.wait(settings.COUNTER_FLUSH_INTERVAL / 1000):
+            if not self._pending:
+                continue
+            close_old_connections()
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+
+counter_buffer = CounterBuffer()
+
+
+def update_counters(model, pk, **deltas):
+    """
+    Apply counter deltas to one row right away, or hand them to the write-behind
+    buffer once the current transaction commits when `COUNTER_WRITE_BEHIND` is on.
+    @:param model: model class
+    @:param pk: primary key of the row
+    @:param deltas: field name to signed delta
+    """
+    if settings.COUNTER_WRITE_BEHIND:
+        transaction.on_commit(lambda: counter_buffer.add(model, pk, **deltas))
+    else:
+        increment(model, pk, **deltas)
+
+
+def update_counters_many(model, pks, **deltas):
+    """
+    Apply the same counter deltas to many rows, with one UPDATE or through
+    the write-behind buffer, see `update_counters`
+    @:param pks: list of primary keys
+    """
+    if settings.COUNTER_WRITE_BEHIND:
+        transaction.on_commit(lambda: [counter_buffer.add(model, pk, **deltas) for pk in pks])
+    else:
+        increment_many(model, pks, **deltas)
@@ -0,0 +1,101 @@
+import time
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from applications.accounts.models import User
+from applications.counters.utils import update_expressions
+from applications.followers.models import Follow
+from applications.images.cache import invalidate_image_list
+from applications.images.models import Image
+from applications.likes.models import Like, LikeCounterShard
+
+
+def grouped_count(model, field, aggregate=Count('*')):
+    """
+    Correlated grouped aggregate of `model` rows pointing at the outer row through `field`
+    """
+    rows = model.objects.filter(**{field: OuterRef('pk')}).order_by().values(field)
+    return Coalesce(Subquery(rows.annotate(total=aggregate).values('total'), output_field=IntegerField()), 0)
+
+
+def expected_counters(name):
+    """
+    Model and expected value expression of every counter of a target
+    """
+    if name == 'users':
+        return User, {
+            'followers_count': grouped_count(Follow, 'following'),
+            'following_count': grouped_count(Follow, 'follower'),
+        }
+    # Hot images keep part of their likes in counter shards, those stay there
+    return Image, {
+        'likes': grouped_count(Like, 'image') - grouped_count(LikeCounterShard, 'image', Sum('count')),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Recompute the follow and like counters from the Follow and Like rows, repair and report the drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--only', action='append', choices=('users', 'images'), help='Counters to check')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Rows checked per query')
+        parser.add_argument('--pause', type=float, default=0, help='Seconds to wait between chunks')
+        parser.add_argument('--dry-run', action='store_true', help='Report the drift without repairing it')
+
+    def handle(self, *args, **options):
+        for name in options['only'] or ('users', 'images'):
+            model, expected = expected_counters(name)
+            report = self.reconcile(model, expected, options['chunk_size'], options['pause'], options['dry_run'])
+            if model is Image and report['likes']['rows'] and not options['dry_run']:
+                invalidate_image_list()
+            for field, drift in report.items():
+                self.stdout.write(f"{model.__name__}.{field}: {drift['rows']} rows drifted, "
+                                  f"net {drift['net']:+d}, absolute {drift['absolute']}, max {drift['max']}")
+        self.stdout.write(self.style.SUCCESS('Dry run, nothing written' if options['dry_run'] else 'Counters reconciled'))
+
+    def reconcile(self, model, expected, chunk_size, pause, dry_run):
+        """
+        Walk the table in primary key chunks. Each chunk reads the stored and the
+        expected counters in one statement, so they come from the same snapshot,
+        and the drift is written back as a delta: writes that land between the
+        read and the update are kept, no lock is held across chunks.
+        @:return: dict: counter field to drift statistics
+        """
+        fields = list(expected)
+        annotations = {f'expected_{field}': expression for field, expression in expected.items()}
+        report = {field: {'rows': 0, 'net': 0, 'absolute': 0, 'max': 0} for field in fields}
+        last_id = 0
+        while True:
+            rows = list(model.objects.filter(pk__gt=last_id).order_by('pk').annotate(**annotations)
+                        .values('pk', *fields, *annotations)[:chunk_size])
+            if not rows:
+                break
+            last_id = rows[-1]['pk']
+
+            changed = defaultdict(list)
+            for row in rows:
+                deltas = {field: row[f'expected_{field}'] - row[field] for field in fields}
+                if not any(deltas.values()):
+                    continue
+                for field, delta in deltas.items():
+                    if delta:
+                        drift = report[field]
+                        drift['rows'] += 1
+                        drift['net'] += delta
+                        drift['absolute'] += abs(delta)
+                        drift['max'] = max(drift['max'], abs(delta))
+                instance = model(pk=row['pk'])
+                expressions = update_expressions(model, deltas)
+                for field, expression in expressions.items():
+                    setattr(instance, field, expression)
+                changed[tuple(expressions)].append(instance)
+
+            if not dry_run:
+                for update_fields, instances in changed.items():
+                    model.objects.bulk_update(instances, update_fields)
+            if pause:
+                time.sleep(pause)
+        return report
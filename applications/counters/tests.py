@@ -0,0 +1,60 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from applications.accounts.models import User
+from applications.counters.utils import increment
+from applications.followers.models import Follow
+from applications.images.models import Image
+from applications.images.trending import trending_score
+from applications.likes.models import Like, LikeCounterShard
+
+
+class ReconcileCountersTestCase(TestCase):
+
+    def setUp(self):
+        self.users = [User.objects.create(username=f"user{i}@test.com") for i in range(3)]
+        for follower in self.users[1:]:
+            Follow.objects.create(follower=follower, following=self.users[0])
+        self.images = [Image.objects.create(image="images/test.png", image_caption="Lorem", user=self.users[0])
+                       for i in range(3)]
+        for user in self.users:
+            Like.objects.create(user=user, image=self.images[0])
+
+    def reconcile(self, *args):
+        out = StringIO()
+        call_command('reconcile_counters', '--chunk-size', '2', *args, stdout=out)
+        return out.getvalue()
+
+    def test_consistent_counters_are_untouched(self):
+        output = self.reconcile()
+        self.assertIn("User.followers_count: 0 rows drifted", output)
+        self.assertIn("Image.likes: 0 rows drifted", output)
+
+    def test_drift_is_repaired(self):
+        User.objects.filter(pk=self.users[0].pk).update(followers_count=7)
+        User.objects.filter(pk=self.users[2].pk).update(following_count=0)
+        increment(Image, self.images[0].pk, likes=-2)
+        increment(Image, self.images[2].pk, likes=4)
+        output = self.reconcile()
+        self.assertIn("User.followers_count: 1 rows drifted, net -5, absolute 5, max 5", output)
+        self.assertIn("User.following_count: 1 rows drifted, net +1, absolute 1, max 1", output)
+        self.assertIn("Image.likes: 2 rows drifted, net -2, absolute 6, max 4", output)
+        self.assertEqual([user.followers_count for user in User.objects.order_by('id')], [2, 0, 0])
+        self.assertEqual([user.following_count for user in User.objects.order_by('id')], [0, 1, 1])
+        image = Image.objects.get(pk=self.images[0].pk)
+        self.assertEqual(image.likes, 3)
+        self.assertAlmostEqual(image.trending_score, trending_score(3, image.created))
+
+    def test_dry_run(self):
+        User.objects.filter(pk=self.users[0].pk).update(followers_count=7)
+        self.reconcile('--dry-run', '--only', 'users')
+        self.assertEqual(User.objects.get(pk=self.users[0].pk).followers_count, 7)
+
+    def test_sharded_likes_stay_in_shards(self):
+        Image.objects.filter(pk=self.images[0].pk).update(sharded_likes=True, likes=0)
+        LikeCounterShard.objects.create(image=self.images[0], shard=0, count=2)
+        self.reconcile('--only', 'images')
+        image = Image.objects.get(pk=self.images[0].pk)
+        self.assertEqual((image.likes, image.like_count), (1, 3))
@@ -0,0 +1,55 @@
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+
+
+def counter_expressions(**deltas):
+    """
+    Build `UPDATE ... SET field = field + delta` expressions, never going below zero.
+    @:param deltas: field name to signed delta
+    @:return: dict usable with QuerySet.update()
+    """
+    expressions = {}
+    for field, delta in deltas.items():
+        if delta >= 0:
+            expressions[field] = F(field) + delta
+        else:
+            expressions[field] = Greatest(F(field) + delta, Value(0))
+    return expressions
+
+
+def increment(model, pk, **deltas):
+    """
+    Atomically apply counter deltas to one row with a single UPDATE
+    that only touches the counter columns, and the columns derived from
+    them when the model defines `derived_counter_expressions(deltas)`.
+    @:param model: model class
+    @:param pk: primary key of the row
+    @:param deltas: field name to signed delta
+    @:return: number of updated rows
+    """
+    return increment_many(model, [pk], **deltas)
+
+
+def increment_many(model, pks, **deltas):
+    """
+    Apply the same counter deltas to many rows with a single UPDATE, see `increment`
+    @:param pks: list of primary keys
+    @:return: number of updated rows
+    """
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas or not pks:
+        return 0
+    return model.objects.filter(pk__in=pks).update(**update_expressions(model, deltas))
+
+
+def update_expressions(model, deltas):
+    """
+    Counter expressions for `deltas`, with the columns the model derives from them
+    @:param model: model class
+    @:param deltas: dict: field name to signed delta
+    @:return: dict: field name to expression
+    """
+    expressions = counter_expressions(**deltas)
+    if hasattr(model, 'derived_counter_expressions'):
+        expressions.update(model.derived_counter_expressions(deltas))
+    return expressions
@@ -0,0 +1,10 @@
+from django.contrib import admin
+
+from applications.feeds.models import Timeline
+
+
+class TimelineAdmin(admin.ModelAdmin):
+    list_display = ['user', 'created']
+
+
+admin.site.register(Timeline, TimelineAdmin)
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from applications.accounts.models import User
+from applications.feeds.models import TimelineEntry
+
+
+class Command(BaseCommand):
+    help = 'Materialize the home feed timeline of users that follow somebody'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users',
+                            help='Only backfill the given user id (repeatable)')
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Rebuild timelines that are already warm as well')
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(followers__isnull=False).distinct().order_by('id')
+        if options['users']:
+            users = users.filter(id__in=options['users'])
+        if not options['rebuild']:
+            users = users.filter(timeline__isnull=True)
+
+        built = 0
+        for user_id in users.values_list('id', flat=True).iterator():
+            entries = TimelineEntry.objects.build(user_id)
+            built += 1
+            if options['verbosity'] > 1:
+                self.stdout.write(f"user {user_id}: {entries} entries")
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {built} timelines"))
@@ -0,0 +1,125 @@
+from django.conf import settings
+from django.db import models, transaction
+
+from django_extensions.db import fields
+
+from applications.accounts.models import User
+from applications.images.models import Image
+
+
+class TimelineEntryManager(models.Manager):
+    """
+    Keeps the materialized home feeds in step with uploads and follows
+    """
+
+    @property
+    def max_entries(self):
+        return settings.FEED_MAX_ENTRIES
+
+    def build(self, user):
+        """
+        (Re)build the whole timeline of a user from the people they follow.
+        @:param user: User instance or id
+        @:return: number of entries written
+        """
+        user_id = getattr(user, 'pk', user)
+        following_users = User.objects.filter(followings__follower=user_id).values('id')
+        images = Image.objects.filter(user__in=following_users)\
+            .order_by('-created', '-id').values_list('id', 'user_id', 'created')[:self.max_entries]
+        entries = [self.model(user_id=user_id, image_id=image_id, author_id=author_id, created=created)
+                   for image_id, author_id, created in images]
+        with transaction.atomic():
+            self.filter(user=user_id).delete()
+            self.bulk_create(entries, ignore_conflicts=True)
+            Timeline.objects.get_or_create(user_id=user_id)
+        return len(entries)
+
+    def fan_out(self, image):
+        """
+        Push a freshly uploaded image into the timeline of every warm follower
+        of its author. Cold followers keep reading through the fallback query.
+        @:param image: Image instance
+        @:return: number of timelines written
+        """
+        reader_ids = list(Timeline.objects.filter(user__followers__following=image.user_id)
+                          .values_list('user_id', flat=True))
+        entries = [self.model(user_id=reader_id, image_id=image.pk, author_id=image.user_id, created=image.created)
+                   for reader_id in reader_ids]
+        with transaction.atomic():
+            self.bulk_create(entries, ignore_conflicts=True)
+            for reader_id in reader_ids:
+                self.trim(reader_id)
+        return len(reader_ids)
+
+    def follow(self, follower, following):
+        """
+        Merge the recent images of a newly followed user into the follower's
+        timeline. A cold follower gets the whole timeline built instead.
+        @:param follower: User instance or id
+        @:param following: User instance or id
+        """
+        follower_id = getattr(follower, 'pk', follower)
+        following_id = getattr(following, 'pk', following)
+        if not Timeline.objects.filter(user=follower_id).exists():
+            self.build(follower_id)
+            return
+        images = Image.objects.filter(user=following_id)\
+            .order_by('-created', '-id').values_list('id', 'created')[:self.max_entries]
+        entries = [self.model(user_id=follower_id, image_id=image_id, author_id=following_id, created=created)
+                   for image_id, created in images]
+        with transaction.atomic():
+            self.bulk_create(entries, ignore_conflicts=True)
+            self.trim(follower_id)
+
+    def unfollow(self, follower, following):
+        """
+        Drop the images of an un-followed user from the follower's timeline
+        """
+        self.filter(user=getattr(follower, 'pk', follower), author=getattr(following, 'pk', following)).delete()
+
+    def trim(self, user_id):
+        """
+        Delete everything past the newest `FEED_MAX_ENTRIES` entries of a timeline
+        """
+        overflow = self.filter(user=user_id).order_by('-created', '-image').values('pk')[self.max_entries:]
+        self.filter(pk__in=models.Subquery(overflow)).delete()
+
+
+class Timeline(models.Model):
+    """
+    Marks a user whose home feed is materialized in `TimelineEntry`.
+    Users without a row are 'cold' and read their feed from `Follow` directly.
+    """
+    user = models.OneToOneField(User, primary_key=True, related_name='timeline', on_delete=models.CASCADE)
+    created = fields.CreationDateTimeField()
+
+    def __str__(self):
+        return f"{self.user}"
+
+    class Meta:
+        verbose_name = 'Timeline'
+        verbose_name_plural = 'Timelines'
+
+
+class TimelineEntry(models.Model):
+    """
+    One image in the materialized home feed of a user
+    """
+    user = models.ForeignKey(User, related_name='timeline_entries', on_delete=models.CASCADE)
+    image = models.ForeignKey(Image, related_name='timeline_entries', on_delete=models.CASCADE)
+    author = models.ForeignKey(User, related_name='+', on_delete=models.CASCADE)
+    created = models.DateTimeField()
+
+    objects = TimelineEntryManager()
+
+    def __str__(self):
+        return f"{self.user} << {self.image}"
+
+    class Meta:
+        verbose_name = 'Timeline entry'
+        verbose_name_plural = 'Timeline entries'
+        unique_together = ('user', 'image',)
+        indexes = [
+            models.Index(fields=['user', 'created', 'image'], name='feeds_entry_user_created_idx'),
+            models.Index(fields=['user', 'author'], name='feeds_entry_user_author_idx'),
+        ]
@@ -0,0 +1,32 @@
+from applications.accounts.models import User
+from applications.feeds.models import TimelineEntry
+from applications.images.models import Image
+from applications.tasks.registry import task
+
+
+@task
+def fan_out_image(image_id):
+    """
+    Push an uploaded image to the timelines of the followers of its author
+    """
+    image = Image.objects.filter(pk=image_id).first()
+    if image is not None:
+        TimelineEntry.objects.fan_out(image)
+
+
+@task
+def merge_followed_timeline(follower_id, following_id):
+    """
+    Merge the images of a followed user into the timeline of the follower,
+    unless they un-followed in the meantime
+    """
+    if User.objects.filter(pk=following_id, followings__follower=follower_id).exists():
+        TimelineEntry.objects.follow(follower_id, following_id)
+
+
+@task
+def rebuild_timeline(user_id):
+    """
+    Rebuild the whole timeline of a user, eg. after following many users at once
+    """
+    TimelineEntry.objects.build(user_id)
@@ -0,0 +1,76 @@
+from django.test import TestCase, override_settings
+
+from applications.accounts.models import User
+from applications.followers.models import Follow
+from applications.images.models import Image
+from applications.feeds.models import Timeline, TimelineEntry
+from applications.feeds.tasks import merge_followed_timeline
+from applications.tasks.models import Job
+from applications.tasks.worker import Worker
+
+
+@override_settings(TASKS_EAGER=True)
+class TimelineEntryManagerTestCase(TestCase):
+
+    def setUp(self):
+        self.reader = User.objects.create(username="reader@test.com")
+        self.author = User.objects.create(username="author@test.com")
+
+    def create_image(self, caption="Lorem"):
+        return Image.objects.create(image="images/test.png", image_caption=caption, user=self.author)
+
+    def test_follow_builds_cold_timeline(self):
+        image = self.create_image()
+        Follow.objects.create(follower=self.reader, following=self.author)
+        self.assertTrue(Timeline.objects.filter(user=self.reader).exists())
+        self.assertEqual(list(self.reader.timeline_entries.values_list('image', flat=True)), [image.id])
+
+    def test_fan_out_skips_cold_followers(self):
+        Follow.objects.create(follower=self.reader, following=self.author)
+        Timeline.objects.filter(user=self.reader).delete()
+        self.assertEqual(TimelineEntry.objects.fan_out(self.create_image()), 0)
+        self.assertFalse(self.reader.timeline_entries.exists())
+
+    def test_fan_out_writes_warm_followers(self):
+        Follow.objects.create(follower=self.reader, following=self.author)
+        image = self.create_image()
+        self.assertEqual(TimelineEntry.objects.fan_out(image), 1)
+        self.assertTrue(self.reader.timeline_entries.filter(image=image).exists())
+
+    def test_unfollow_removes_entries(self):
+        self.create_image()
+        follow = Follow.objects.create(follower=self.reader, following=self.author)
+        follow.delete()
+        self.assertFalse(self.reader.timeline_entries.exists())
+
+    @override_settings(FEED_MAX_ENTRIES=2)
+    def test_timeline_is_capped(self):
+        Follow.objects.create(follower=self.reader, following=self.author)
+        images = [self.create_image(caption=str(i)) for i in range(3)]
+        for image in images:
+            TimelineEntry.objects.fan_out(image)
+        kept = set(self.reader.timeline_entries.values_list('image', flat=True))
+        self.assertEqual(kept, {images[1].id, images[2].id})
+
+
+@override_settings(TASKS_EAGER=False)
+class TimelineTaskTestCase(TestCase):
+
+    def setUp(self):
+        self.reader = User.objects.create(username="reader@test.com")
+        self.author = User.objects.create(username="author@test.com")
+        Image.objects.create(image="images/test.png", image_caption="Lorem", user=self.author)
+
+    def test_follow_queues_timeline_merge(self):
+        follow = Follow.objects.create(follower=self.reader, following=self.author)
+        job = Job.objects.get(idempotency_key=f"timeline-follow:{follow.pk}")
+        self.assertEqual(job.name, merge_followed_timeline.task_name)
+        self.assertFalse(self.reader.timeline_entries.exists())
+        Worker().run(burst=True)
+        self.assertEqual(self.reader.timeline_entries.count(), 1)
+
+    def test_merge_skips_unfollowed_user(self):
+        Follow.objects.create(follower=self.reader, following=self.author).delete()
+        Worker().run(burst=True)
+        self.assertFalse(self.reader.timeline_entries.exists())
+        self.assertFalse(Timeline.objects.filter(user=self.reader).exists())
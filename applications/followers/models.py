@@ -1,10 +1,41 @@
-from django.db import models
+from django.db import models, transaction
 from django.dispatch import receiver
 from django.db.models.signals import post_save, post_delete
 
 from django_extensions.db import fields
 
 from applications.accounts.models import User
+from applications.counters.buffer import update_counters, update_counters_many
+from applications.feeds.models import TimelineEntry
+from applications.feeds.tasks import merge_followed_timeline, rebuild_timeline
+from applications.images.cache import invalidate_image_list
+
+
+class FollowManager(models.Manager):
+
+    def bulk_follow(self, follower, user_ids):
+        """
+        Follow many users with a single INSERT, skipping the ones already followed.
+        The follow counters are updated per batch instead of per follow signal,
+        and the timeline of the follower is rebuilt once in the background.
+        @:param follower: User instance
+        @:param user_ids: list of user ids
+        @:return: dict: user id to 'created', 'exists' or 'not_found'
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        with transaction.atomic():
+            # Batches of a follower run one at a time, see `LikeManager.bulk_like`
+            follower.lock()
+            users = set(User.objects.filter(id__in=user_ids).values_list('id', flat=True))
+            following = set(self.filter(follower=follower, following__in=users).values_list('following', flat=True))
+            new = [pk for pk in user_ids if pk in users and pk not in following]
+            self.bulk_create([self.model(follower=follower, following_id=pk) for pk in new], ignore_conflicts=True)
+            if new:
+                update_counters_many(User, new, followers_count=1)
+                update_counters(User, follower.pk, following_count=len(new))
+                rebuild_timeline.enqueue(args=(follower.pk, ))
+                invalidate_image_list()
+        return {pk: 'not_found' if pk not in users else 'exists' if pk in following else 'created' for pk in user_ids}
 
 
 class Follow(models.Model):
@@ -16,6 +47,8 @@ class Follow(models.Model):
     created = fields.CreationDateTimeField()
     modified = fields.ModificationDateTimeField()
 
+    objects = FollowManager()
+
     def __str__(self):
         return f"{self.follower.email} >> {self.following.email}"
 
@@ -31,21 +64,22 @@ class Follow(models.Model):
         @:param func_type: str
         @:return: add or minus follow instance count
         """
-        following_profile = User.objects.get(id=self.following.id)
-        follower_profile = User.objects.get(id=self.follower.id)
         value = 1 if func_type == 'add' else -1
-        following_profile.followers_count += value
-        following_profile.save()
-        follower_profile.following_count += value
-        follower_profile.save()
+        update_counters(User, self.following_id, followers_count=value)
+        update_counters(User, self.follower_id, following_count=value)
 
 
 @receiver(post_save, sender=Follow, dispatch_uid="follow_add_count")
 def follow_post_save(sender, instance, created, **kwargs):
     if created:
         instance.edit_follower_following_count(func_type='add')
+        merge_followed_timeline.enqueue(args=(instance.follower_id, instance.following_id),
+                                        key=f"timeline-follow:{instance.pk}")
+        invalidate_image_list()
 
 
 @receiver(post_delete, sender=Follow, dispatch_uid="follow_delete_count")
 def follow_post_delete(sender, instance, **kwargs):
     instance.edit_follower_following_count(func_type='delete')
+    TimelineEntry.objects.unfollow(instance.follower_id, instance.following_id)
+    invalidate_image_list()
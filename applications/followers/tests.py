@@ -1,3 +1,29 @@
 from django.test import TestCase
 
-# Create your tests here.
+from applications.accounts.models import User
+from applications.followers.models import Follow
+
+
+class FollowCountTestCase(TestCase):
+
+    def setUp(self):
+        self.follower = User.objects.create(username="follower@test.com")
+        self.following = User.objects.create(username="following@test.com")
+
+    def assertCounts(self, followers_count, following_count):
+        self.following.refresh_from_db()
+        self.follower.refresh_from_db()
+        self.assertEqual(self.following.followers_count, followers_count)
+        self.assertEqual(self.follower.following_count, following_count)
+
+    def test_follow_and_unfollow_update_counts(self):
+        follow = Follow.objects.create(follower=self.follower, following=self.following)
+        self.assertCounts(1, 1)
+        follow.delete()
+        self.assertCounts(0, 0)
+
+    def test_counts_never_go_negative(self):
+        follow = Follow.objects.create(follower=self.follower, following=self.following)
+        User.objects.update(followers_count=0, following_count=0)
+        follow.delete()
+        self.assertCounts(0, 0)
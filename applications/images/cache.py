@@ -0,0 +1,58 @@
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+IMAGE_LIST_VERSION_KEY = 'image-list:version'
+
+
+def get_image_list_version():
+    """
+    Current version of the image listings, changed once every image, like or follow write commits.
+    @:return: str token
+    """
+    version = cache.get(IMAGE_LIST_VERSION_KEY)
+    if version is None:
+        cache.add(IMAGE_LIST_VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(IMAGE_LIST_VERSION_KEY)
+    return version
+
+
+def bump_image_list_version():
+    cache.set(IMAGE_LIST_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def invalidate_image_list():
+    """
+    Start a new version once the current transaction commits, cached pages of the
+    previous one are never read again. Bumping before the commit would let a
+    concurrent reader cache the uncommitted state under the new version.
+    """
+    transaction.on_commit(bump_image_list_version)
+
+
+def image_list_cache_key(token, path):
+    digest = hashlib.md5(f'{token}:{path}'.encode()).hexdigest()
+    return f'image-list:page:{digest}'
+
+
+def image_list_etag(path, content):
+    """
+    @:param path: str full path of the page
+    @:param content: bytes rendered page
+    @:return: str: digest of the page, changes whenever its content does
+    """
+    return hashlib.md5(path.encode() + b'\0' + content).hexdigest()
+
+
+def get_cached_image_list(key):
+    """
+    @:return: tuple: (data, etag:str, modified:float timestamp) or None
+    """
+    return cache.get(key)
+
+
+def set_cached_image_list(key, page):
+    cache.set(key, page, settings.IMAGE_LIST_CACHE_TIMEOUT)
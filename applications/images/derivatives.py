@@ -0,0 +1,63 @@
+import posixpath
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+
+from PIL import Image as StdImage
+
+from applications.images.cache import invalidate_image_list
+from applications.images.models import Image, MediaBlob
+
+VARIANT_EXTENSIONS = {'JPEG': 'jpg', 'WEBP': 'webp', 'PNG': 'png'}
+
+
+def variant_path(name, variant, image_format):
+    """
+    Storage path of a variant, eg: variants/thumbnail/images/2022/07/15/cat.jpg
+    """
+    root, ext = posixpath.splitext(name)
+    return posixpath.join('variants', variant, f"{root}.{VARIANT_EXTENSIONS[image_format]}")
+
+
+def render_variant(original, size, image_format):
+    variant = original.copy()
+    variant.thumbnail(size, StdImage.LANCZOS)
+    if image_format == 'JPEG' and variant.mode != 'RGB':
+        variant = variant.convert('RGB')
+    data = BytesIO()
+    variant.save(data, image_format, quality=settings.IMAGE_VARIANT_QUALITY)
+    return data.getvalue()
+
+
+def generate_variants(image):
+    """
+    Render every `IMAGE_VARIANTS` entry of an uploaded image, reading the original once.
+    Variants the original already fits in, in the same format, point to the original
+    using the dimensions recorded at upload, without opening the file at all.
+    @:param image: Image instance
+    @:return: dict: variant name to storage path
+    """
+    storage = image.image.storage
+    original = None
+    variants = {}
+    for variant, (width, height, image_format) in settings.IMAGE_VARIANTS.items():
+        if image.image_format == image_format and image.width and image.width <= width and image.height <= height:
+            variants[variant] = image.image.name
+            continue
+        if original is None:
+            with image.image.open('rb') as image_file:
+                original = StdImage.open(image_file)
+                original.load()
+        path = variant_path(image.image.name, variant, image_format)
+        variants[variant] = storage.save(path, ContentFile(render_variant(original, (width, height), image_format)))
+
+    with transaction.atomic():
+        # Rendered variants were acquired when saved, the ones pointing to the original are not
+        MediaBlob.objects.acquire(name for name in variants.values() if name == image.image.name)
+        MediaBlob.objects.release(image.variants.values())
+        Image.objects.filter(pk=image.pk).update(variants=variants)
+    image.variants = variants
+    invalidate_image_list()
+    return variants
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from applications.images.search import rebuild_index, search_index_available
+
+
+class Command(BaseCommand):
+    help = 'Index the caption and author of every image again, eg. after images were written without signals'
+
+    def handle(self, *args, **options):
+        if not search_index_available():
+            raise CommandError('The database has no search index, searches use icontains lookups')
+        indexed = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} images"))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from applications.images.cache import invalidate_image_list
+from applications.images.models import Image
+from applications.images.trending import trending_score_expression
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored trending score of every image, one UPDATE per batch of ids'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        score = trending_score_expression()
+        last_id = 0
+        updated = 0
+        while True:
+            images = Image.objects.filter(id__gt=last_id)
+            bound = list(images.order_by('id').values_list('id', flat=True)[batch_size - 1:batch_size])
+            if not bound:
+                updated += images.update(trending_score=score)
+                break
+            updated += images.filter(id__lte=bound[0]).update(trending_score=score)
+            last_id = bound[0]
+        invalidate_image_list()
+        self.stdout.write(self.style.SUCCESS(f"Refreshed {updated} trending scores"))
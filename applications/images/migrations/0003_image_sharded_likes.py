@@ -0,0 +1,18 @@
+# Generated by Django 3.1 on 2026-10-18 02:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('images', '0002_image_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='image',
+            name='sharded_likes',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 3.1 on 2026-10-18 02:17
+
+from django.db import migrations, models
+
+from applications.images.trending import trending_score
+
+
+def compute_trending_scores(apps, schema_editor):
+    Image = apps.get_model('images', 'Image')
+    images = [Image(id=pk, trending_score=trending_score(likes, created))
+              for pk, likes, created in Image.objects.values_list('id', 'likes', 'created').iterator()]
+    Image.objects.bulk_update(images, ['trending_score'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('images', '0003_image_sharded_likes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='image',
+            name='trending_score',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='image',
+            index=models.Index(fields=['trending_score', 'id'], name='images_trending_id_idx'),
+        ),
+        migrations.RunPython(compute_trending_scores, migrations.RunPython.noop),
+    ]
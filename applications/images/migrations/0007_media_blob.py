@@ -0,0 +1,38 @@
+# Generated by Django 3.1 on 2026-10-18 02:24
+
+from collections import Counter
+
+from django.db import migrations, models
+
+
+def count_references(apps, schema_editor):
+    Image = apps.get_model('images', 'Image')
+    MediaBlob = apps.get_model('images', 'MediaBlob')
+    references = Counter()
+    for name, variants in Image.objects.values_list('image', 'variants').iterator():
+        references.update(name for name in [name] + list(variants.values()) if name)
+    MediaBlob.objects.bulk_create([MediaBlob(name=name, references=count) for name, count in references.items()],
+                                  batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('images', '0006_image_dimensions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=1000, unique=True)),
+                ('references', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Media blob',
+                'verbose_name_plural': 'Media blobs',
+            },
+        ),
+        migrations.RunPython(count_references, migrations.RunPython.noop),
+    ]
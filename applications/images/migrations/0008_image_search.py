@@ -0,0 +1,42 @@
+# Generated by Django 3.1.14 on 2026-10-18 09:12
+
+from django.db import migrations
+
+
+def fts5_available(schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return False
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+
+
+def create_search_index(apps, schema_editor):
+    """
+    FTS5 index of the image captions and author names, kept in sync by the Image
+    and User signals. Other backends search with `icontains` lookups instead.
+    """
+    if not fts5_available(schema_editor):
+        return
+    schema_editor.execute("CREATE VIRTUAL TABLE images_image_fts USING fts5("
+                          "caption, author, tokenize = 'unicode61 remove_diacritics 2')")
+    schema_editor.execute("INSERT INTO images_image_fts (rowid, caption, author) "
+                          "SELECT i.id, i.image_caption, u.username || ' ' || u.first_name || ' ' || u.last_name "
+                          "FROM images_image i JOIN accounts_user u ON u.id = i.user_id")
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS images_image_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('images', '0007_media_blob'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -1,8 +1,17 @@
-from django.db import models
+from collections import Counter
+
+from django.db import models, transaction, IntegrityError
+from django.dispatch import receiver
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
+from django.utils import timezone
 
 from django_extensions.db import fields
 
 from applications.accounts.models import User
+from applications.images.cache import invalidate_image_list
+from applications.images.search import index_image, unindex_image, reindex_author
+from applications.images.trending import trending_score, trending_expressions
 
 
 class Image(models.Model):
@@ -12,15 +21,150 @@ class Image(models.Model):
     user = models.ForeignKey(User, related_name='user_image', on_delete=models.CASCADE)
     image = models.ImageField('Image', upload_to='images/%Y/%m/%d/', max_length=1000)
     image_caption = models.CharField(max_length=100)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    image_format = models.CharField(max_length=10, blank=True)
     published = models.BooleanField('Published?', default=False)
     likes = models.PositiveIntegerField(default=0)
+    sharded_likes = models.BooleanField(default=False)
+    trending_score = models.FloatField(default=0)
+    variants = models.JSONField(default=dict, blank=True)
     created = fields.CreationDateTimeField()
     modified = fields.ModificationDateTimeField()
 
     def __str__(self):
         return f"{self.image_caption}"
 
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            self.trending_score = trending_score(self.likes, self.created or timezone.now())
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def derived_counter_expressions(cls, deltas):
+        """
+        Extra `UPDATE` expressions applied together with counter deltas
+        """
+        if deltas.get('likes'):
+            return trending_expressions(deltas['likes'])
+        return {}
+
+    @property
+    def like_count(self):
+        """
+        Like count including the not yet folded counter shards of hot images
+        """
+        if not self.sharded_likes:
+            return self.likes
+        pending = self.like_shards.aggregate(pending=models.Sum('count'))['pending'] or 0
+        return max(self.likes + pending, 0)
+
     class Meta:
         verbose_name = 'Image'
         verbose_name_plural = 'Images'
         ordering = ('-created', )
+        indexes = [
+            models.Index(fields=['likes', 'id'], name='images_likes_id_idx'),
+            models.Index(fields=['created', 'id'], name='images_created_id_idx'),
+            models.Index(fields=['trending_score', 'id'], name='images_trending_id_idx'),
+        ]
+
+    def get_file_names(self):
+        """
+        Stored files referenced by the image: the original and its variants
+        """
+        return [self.image.name] + list(self.variants.values())
+
+
+class MediaBlobManager(models.Manager):
+
+    def acquire(self, names):
+        """
+        Add one reference to every stored file name, duplicates count twice.
+        Files written through the storage are acquired by the storage itself.
+        """
+        for name, count in Counter(name for name in names if name).items():
+            while not self.filter(name=name).update(references=F('references') + count):
+                try:
+                    with transaction.atomic():
+                        self.create(name=name, references=count)
+                    break
+                except IntegrityError:
+                    # Created meanwhile, or held by a deletion that removes it once committed
+                    continue
+
+    def release(self, names):
+        """
+        Drop one reference of every stored file name. Files losing their last
+        reference are deleted from the storage once the transaction commits,
+        unless they were acquired again meanwhile, see `delete_unreferenced`.
+        """
+        storage = Image._meta.get_field('image').storage
+        for name, count in Counter(name for name in names if name).items():
+            self.filter(name=name, references__gte=count).update(references=F('references') - count)
+            deleted, _ = self.filter(name=name, references__lte=0).delete()
+            if deleted:
+                transaction.on_commit(lambda name=name: self.delete_unreferenced(name, storage))
+
+    def delete_unreferenced(self, name, storage):
+        """
+        Delete a file nobody references. A row without references holds the name while
+        the file is deleted, so an upload of the same content waits in `acquire` and then
+        writes the file again. A name acquired meanwhile keeps its file.
+        @:return: bool: whether the file was deleted
+        """
+        try:
+            with transaction.atomic():
+                self.create(name=name, references=0)
+                storage.delete(name)
+                self.filter(name=name, references=0).delete()
+        except IntegrityError:
+            return False
+        return True
+
+
+class MediaBlob(models.Model):
+    """
+    Reference count of a stored file, shared by identical uploads and their variants
+    """
+    name = models.CharField(max_length=1000, unique=True)
+    references = models.PositiveIntegerField(default=0)
+
+    objects = MediaBlobManager()
+
+    def __str__(self):
+        return f"{self.name} ({self.references})"
+
+    class Meta:
+        verbose_name = 'Media blob'
+        verbose_name_plural = 'Media blobs'
+
+
+@receiver(post_save, sender=Image, dispatch_uid="image_save_invalidate_list")
+def image_post_save(sender, instance, created, **kwargs):
+    invalidate_image_list()
+
+
+@receiver(post_save, sender=Image, dispatch_uid="image_save_search_index")
+def image_post_save_index(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'image_caption' in update_fields:
+        index_image(instance)
+
+
+@receiver(post_delete, sender=Image, dispatch_uid="image_delete_invalidate_list")
+def image_post_delete(sender, instance, **kwargs):
+    MediaBlob.objects.release(instance.get_file_names())
+    invalidate_image_list()
+
+
+@receiver(post_delete, sender=Image, dispatch_uid="image_delete_search_index")
+def image_post_delete_index(sender, instance, **kwargs):
+    unindex_image(instance.pk)
+
+
+@receiver(post_save, sender=User, dispatch_uid="user_save_search_index")
+def user_post_save_index(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields is not None and not {'username', 'first_name', 'last_name'} & set(update_fields)):
+        return
+    reindex_author(instance)
+    invalidate_image_list()
@@ -0,0 +1,111 @@
+import re
+from functools import reduce
+from operator import add, and_
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.models import Case, FloatField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+SEARCH_TABLE = 'images_image_fts'
+
+_available = {}
+
+
+def search_index_available(using=DEFAULT_DB_ALIAS):
+    """
+    Whether the database has the FTS5 caption index, created by the migrations on SQLite only
+    @:param using: database alias, eg. the replica a search queryset reads
+    """
+    connection = connections[using]
+    key = (connection.alias, connection.settings_dict['NAME'])
+    if key not in _available:
+        _available[key] = connection.vendor == 'sqlite' and SEARCH_TABLE in connection.introspection.table_names()
+    return _available[key]
+
+
+def search_terms(query):
+    """
+    Words of a search query, at most `SEARCH_MAX_TERMS` of them
+    """
+    return re.findall(r'\w+', query.lower())[:settings.SEARCH_MAX_TERMS]
+
+
+def author_text(user):
+    return ' '.join(filter(None, (user.username, user.first_name, user.last_name)))
+
+
+def index_image(image):
+    """
+    Write the caption and author of an image to the search index
+    """
+    if not search_index_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [image.pk])
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE} (rowid, caption, author) VALUES (%s, %s, %s)",
+                       [image.pk, image.image_caption, author_text(image.user)])
+
+
+def unindex_image(image_id):
+    if not search_index_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [image_id])
+
+
+def reindex_author(user):
+    """
+    Update the author column of every image of a user, eg. after a name change
+    """
+    if not search_index_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"UPDATE {SEARCH_TABLE} SET author = %s "
+                       f"WHERE rowid IN (SELECT id FROM images_image WHERE user_id = %s)", [author_text(user), user.pk])
+
+
+def rebuild_index():
+    """
+    Index every image again, eg. after images were bulk-created without signals
+    @:return: number of indexed images
+    """
+    if not search_index_available():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE} (rowid, caption, author) "
+                       f"SELECT i.id, i.image_caption, u.username || ' ' || u.first_name || ' ' || u.last_name "
+                       f"FROM images_image i JOIN accounts_user u ON u.id = i.user_id")
+        cursor.execute(f"SELECT COUNT(*) FROM {SEARCH_TABLE}")
+        return cursor.fetchone()[0]
+
+
+def search_images(queryset, query):
+    """
+    Filter an Image queryset to the images whose caption or author match every
+    word of `query`, as prefixes, best matches first.
+
+    On SQLite the FTS5 index is joined and ranked with bm25, captions weighing
+    more than authors. Other backends fall back to `icontains` lookups ranked by
+    the number of words found in the caption. Either way the relevance is the
+    `search_rank` annotation, ascending, so keyset pagination can page on it.
+    @:return: queryset ordered by ('search_rank', 'id')
+    """
+    terms = search_terms(query)
+    if not terms:
+        return queryset.none()
+    if search_index_available(queryset.db):
+        match = ' '.join(f'"{term}"*' for term in terms)
+        queryset = queryset.extra(tables=[SEARCH_TABLE],
+                                  where=[f'{SEARCH_TABLE}.rowid = images_image.id', f'{SEARCH_TABLE} MATCH %s'],
+                                  params=[match])
+        rank = RawSQL(f'bm25({SEARCH_TABLE}, 10.0, 1.0)', (), output_field=FloatField())
+    else:
+        matches = [Q(image_caption__icontains=term) | Q(user__username__icontains=term)
+                   | Q(user__first_name__icontains=term) | Q(user__last_name__icontains=term) for term in terms]
+        queryset = queryset.filter(reduce(and_, matches))
+        caption_hits = [Case(When(image_caption__icontains=term, then=Value(-1.0)), default=Value(0.0),
+                             output_field=FloatField()) for term in terms]
+        rank = reduce(add, caption_hits)
+    return queryset.annotate(search_rank=rank).order_by('search_rank', 'id')
@@ -0,0 +1,36 @@
+import hashlib
+import posixpath
+
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File system storage naming every file after the SHA-256 of its content,
+    eg: images/9f/86/9f86d081884c7d65...a08.png
+
+    Identical uploads share one file, and the two levels of sharding keep every
+    directory under 256 entries. The first component of the requested name is
+    kept as the root folder. Files are shared, so they must only be deleted
+    through the reference counts of `MediaBlob`: saving a file takes one reference
+    to it, before looking for an existing copy. An upload racing with the deletion
+    of the last copy then either keeps the file alive or writes it again.
+    """
+
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        root = name.replace('\\', '/').split('/', 1)[0] if '/' in name else ''
+        extension = posixpath.splitext(name)[1].lower()
+        return posixpath.join(root, digest[:2], digest[2:4], digest + extension)
+
+    def _save(self, name, content):
+        from applications.images.models import MediaBlob
+
+        name = self.content_name(name, content)
+        MediaBlob.objects.acquire([name])
+        if self.exists(name):
+            return name
+        return super()._save(name, content)
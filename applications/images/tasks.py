@@ -0,0 +1,13 @@
+from applications.images.derivatives import generate_variants
+from applications.images.models import Image
+from applications.tasks.registry import task
+
+
+@task
+def generate_image_variants(image_id):
+    """
+    Render the resized variants of an uploaded image
+    """
+    image = Image.objects.filter(pk=image_id).first()
+    if image is not None:
+        generate_variants(image)
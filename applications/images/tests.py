@@ -1,3 +1,256 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import transaction
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from PIL import Image as StdImage
+from rest_framework.reverse import reverse
+from rest_framework.test import APIClient
+
+from applications.accounts.models import User
+from applications.counters.buffer import counter_buffer
+from applications.followers.models import Follow
+from applications.images.derivatives import generate_variants
+from applications.images.models import Image, MediaBlob
+from applications.images.search import search_images, search_index_available
+from applications.images.trending import trending_score
+from applications.likes.models import Like
+
+
+@override_settings(TRENDING_DECAY=3600)
+class TrendingScoreTestCase(TestCase):
+
+    def setUp(self):
+        self.author = User.objects.create(username="author@test.com")
+        self.users = [User.objects.create(username=f"user{i}@test.com") for i in range(3)]
+        self.image = Image.objects.create(image="images/test.png", image_caption="Lorem", user=self.author)
+
+    def test_score_decays_with_age(self):
+        created = self.image.created
+        self.assertAlmostEqual(trending_score(10, created - timedelta(hours=1)), trending_score(1, created))
+
+    def test_new_image_gets_a_score(self):
+        self.assertAlmostEqual(self.image.trending_score, trending_score(0, self.image.created), places=3)
+
+    def test_likes_update_score_incrementally(self):
+        likes = [Like.objects.create(user=user, image=self.image) for user in self.users]
+        likes[0].delete()
+        self.image.refresh_from_db()
+        self.assertEqual(self.image.likes, 2)
+        self.assertAlmostEqual(self.image.trending_score, trending_score(2, self.image.created), places=3)
+
+    def test_refresh_trending_recomputes_scores(self):
+        images = [self.image] + [Image.objects.create(image="images/test.png", image_caption="Lorem", user=self.author)
+                                 for _ in range(2)]
+        Image.objects.update(likes=7, trending_score=0)
+        # One query finding the end of each batch of ids and one UPDATE per batch
+        with self.assertNumQueries(4):
+            call_command('refresh_trending', batch_size=2, stdout=StringIO())
+        for image in images:
+            image.refresh_from_db()
+            self.assertAlmostEqual(image.trending_score, trending_score(7, image.created), places=5)
+
+
+class ImageVariantsTestCase(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root, IMAGE_VARIANTS={
+            'thumbnail': (50, 50, 'JPEG'),
+            'small_webp': (100, 100, 'WEBP'),
+        })
+        self.settings_override.enable()
+        data = BytesIO()
+        StdImage.new('RGBA', (400, 200)).save(data, 'PNG')
+        user = User.objects.create(username="author@test.com")
+        self.image = Image.objects.create(image=SimpleUploadedFile('cat.png', data.getvalue()),
+                                          image_caption="Lorem", user=user)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    def test_generate_variants(self):
+        variants = generate_variants(self.image)
+        self.assertEqual(set(variants), {'thumbnail', 'small_webp'})
+        self.image.refresh_from_db()
+        self.assertEqual(self.image.variants, variants)
+        with self.image.image.storage.open(variants['thumbnail']) as thumbnail:
+            self.assertEqual(StdImage.open(thumbnail).size, (50, 25))
+        with self.image.image.storage.open(variants['small_webp']) as small:
+            self.assertEqual(StdImage.open(small).format, 'WEBP')
+
+    def test_regenerating_variants_keeps_paths(self):
+        self.assertEqual(generate_variants(self.image), generate_variants(self.image))
+
+    def test_variants_reuse_fitting_original(self):
+        Image.objects.filter(pk=self.image.pk).update(width=40, height=20, image_format='JPEG')
+        self.image.refresh_from_db()
+        variants = generate_variants(self.image)
+        self.assertEqual(variants['thumbnail'], self.image.image.name)
+        self.assertNotEqual(variants['small_webp'], self.image.image.name)
+
+
+class ContentAddressedStorageTestCase(TransactionTestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.user = User.objects.create(username="author@test.com")
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    def create_image(self, color):
+        data = BytesIO()
+        StdImage.new('RGB', (10, 10), color).save(data, 'PNG')
+        return Image.objects.create(image=SimpleUploadedFile('cat.png', data.getvalue()),
+                                    image_caption="Lorem", user=self.user)
+
+    def test_identical_uploads_share_one_file(self):
+        first, second = self.create_image('red'), self.create_image('red')
+        other = self.create_image('blue')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertNotEqual(first.image.name, other.image.name)
+        self.assertRegex(first.image.name, r'^images/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.png$')
+        self.assertEqual(MediaBlob.objects.get(name=first.image.name).references, 2)
+
+    def test_file_is_deleted_with_its_last_reference(self):
+        first, second = self.create_image('red'), self.create_image('red')
+        storage = first.image.storage
+        first.delete()
+        self.assertTrue(storage.exists(second.image.name))
+        second.delete()
+        self.assertFalse(storage.exists(second.image.name))
+        self.assertFalse(MediaBlob.objects.exists())
+
+    def test_file_acquired_again_is_not_deleted(self):
+        image = self.create_image('red')
+        storage, name = image.image.storage, image.image.name
+        MediaBlob.objects.acquire([name])
+        self.assertFalse(MediaBlob.objects.delete_unreferenced(name, storage))
+        self.assertTrue(storage.exists(name))
+        self.assertEqual(MediaBlob.objects.get(name=name).references, 2)
+
+    def test_upload_after_deletion_writes_the_file_again(self):
+        image = self.create_image('red')
+        storage, name = image.image.storage, image.image.name
+        image.delete()
+        self.assertFalse(storage.exists(name))
+        again = self.create_image('red')
+        self.assertEqual(again.image.name, name)
+        self.assertTrue(storage.exists(name))
+        self.assertEqual(MediaBlob.objects.get(name=name).references, 1)
+
+    def test_variants_hold_their_files(self):
+        image = self.create_image('red')
+        with override_settings(IMAGE_VARIANTS={'thumbnail': (5, 5, 'JPEG'), 'original': (50, 50, 'PNG')}):
+            Image.objects.filter(pk=image.pk).update(width=10, height=10, image_format='PNG')
+            image.refresh_from_db()
+            variants = generate_variants(image)
+            generate_variants(image)
+        self.assertEqual(variants['original'], image.image.name)
+        self.assertEqual(MediaBlob.objects.get(name=image.image.name).references, 2)
+        self.assertEqual(MediaBlob.objects.get(name=variants['thumbnail']).references, 1)
+        image.delete()
+        self.assertFalse(MediaBlob.objects.exists())
+        self.assertFalse(image.image.storage.exists(variants['thumbnail']))
+
+
+class ImageListCacheTestCase(TransactionTestCase):
+    """
+    Anonymous image-list pages are cached, and invalidated once the writes they show commit.
+    """
+    client_class = APIClient
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create(username="author@test.com")
+        self.image = Image.objects.create(image="images/test.png", image_caption="Lorem", user=self.author)
+
+    def get(self, **headers):
+        return self.client.get(reverse("image-list"), **headers)
+
+    def test_conditional_get(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Last-Modified", response)
+        etag = response["ETag"]
+        with self.assertNumQueries(0):
+            response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        with self.assertNumQueries(0):
+            response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["ETag"], etag)
+        with transaction.atomic():
+            Like.objects.create(user=self.author, image=self.image)
+            self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(response.data["results"][0]["likes"], 1)
+
+    def test_etag_follows_content(self):
+        etag = self.get()["ETag"]
+        cache.clear()
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        User.objects.filter(pk=self.author.pk).update(followers_count=F('followers_count') + 1)
+        cache.clear()
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_invalidated_by_follows_and_counter_flushes(self):
+        follower = User.objects.create(username="follower@test.com")
+        etag = self.get()["ETag"]
+        follow = Follow.objects.create(follower=follower, following=self.author)
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["results"][0]["user"]["followers_count"], 1)
+
+        etag = response["ETag"]
+        with override_settings(COUNTER_WRITE_BEHIND=True, COUNTER_FLUSH_INTERVAL=60000):
+            follow.delete()
+            self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            counter_buffer.flush()
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["results"][0]["user"]["followers_count"], 0)
+
+    def test_cache_is_keyed_by_sort(self):
+        sorted_response = self.client.get(reverse("image-list"), {"sort": "trending"})
+        self.assertNotEqual(self.get()["ETag"], sorted_response["ETag"])
+
+
+class ImageSearchTestCase(TestCase):
+
+    def setUp(self):
+        self.author = User.objects.create(username="author@test.com")
+
+    def test_search_index_is_used_on_sqlite(self):
+        self.assertTrue(search_index_available())
+
+    def test_search_fallback_without_index(self):
+        cat = Image.objects.create(image="images/test.png", image_caption="Cat and cat", user=self.author)
+        other = Image.objects.create(image="images/test.png", image_caption="Lorem", user=self.author)
+        with mock.patch("applications.images.search.search_index_available", return_value=False):
+            ids = list(search_images(Image.objects.all(), "cat").values_list("id", flat=True))
+            self.assertEqual(ids, [cat.id])
+            ids = list(search_images(Image.objects.all(), "author lorem").values_list("id", flat=True))
+            self.assertEqual(ids, [other.id])
+
+    def test_search_probes_the_database_of_the_queryset(self):
+        with mock.patch("applications.images.search.search_index_available", return_value=False) as available:
+            search_images(Image.objects.using('replica'), "cat")
+        available.assert_called_once_with('replica')
@@ -0,0 +1,57 @@
+import math
+
+from django.conf import settings
+from django.db.models import F, FloatField, Func, Value
+from django.db.models.functions import Greatest, Log
+
+
+def trending_score(likes, created):
+    """
+    Time-decayed ranking score: every `TRENDING_DECAY` seconds of age cost
+    a factor ten in likes. The score of an image only changes with its likes,
+    so it can be stored and indexed instead of sorted on the fly.
+    @:param likes: int
+    @:param created: aware datetime
+    @:return: float
+    """
+    return math.log10(max(likes, 1)) + (created.timestamp() - settings.TRENDING_EPOCH) / settings.TRENDING_DECAY
+
+
+class Epoch(Func):
+    """
+    Seconds since the Unix epoch of a datetime column, as a float
+    """
+    template = 'EXTRACT(EPOCH FROM %(expressions)s)'
+    output_field = FloatField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, template='((JULIANDAY(%(expressions)s) - 2440587.5) * 86400.0)',
+                              **extra_context)
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, template='UNIX_TIMESTAMP(%(expressions)s)', **extra_context)
+
+
+def likes_term(likes):
+    """
+    Likes part of the score, log10(max(likes, 1)), as an expression
+    """
+    return Log(Value(10), Greatest(likes, Value(1)))
+
+
+def trending_expressions(likes_delta):
+    """
+    `UPDATE` expressions moving the stored score along with a likes delta,
+    computed from the row itself so concurrent updates stay correct.
+    """
+    return {
+        'trending_score': F('trending_score') - likes_term(F('likes')) + likes_term(F('likes') + likes_delta)
+    }
+
+
+def trending_score_expression():
+    """
+    `UPDATE` expression computing the score of a row from its likes and creation time, see `trending_score`
+    """
+    age = (Epoch('created') - Value(settings.TRENDING_EPOCH)) / Value(float(settings.TRENDING_DECAY))
+    return likes_term(F('likes')) + age
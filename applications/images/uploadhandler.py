@@ -0,0 +1,39 @@
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import InMemoryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+
+
+class MaxSizeUploadHandler(FileUploadHandler):
+    """
+    Upload handler enforcing `IMAGE_UPLOAD_MAX_BYTES` while the upload streams in.
+
+    Listed first in `FILE_UPLOAD_HANDLERS`, it stops handing the chunks of a file to
+    the next handlers once the limit is crossed, so the rest of the file is neither
+    kept in memory nor written to disk. The oversized file is replaced by an empty
+    one that keeps the full size, which `read_image_header` rejects.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.too_large = False
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.too_large or start + len(raw_data) > settings.IMAGE_UPLOAD_MAX_BYTES:
+            self.too_large = True
+            return None
+        return raw_data
+
+    def file_complete(self, file_size):
+        if not self.too_large:
+            return None
+        return InMemoryUploadedFile(
+            file=BytesIO(),
+            field_name=self.field_name,
+            name=self.file_name,
+            content_type=self.content_type,
+            size=file_size,
+            charset=self.charset,
+            content_type_extra=self.content_type_extra
+        )
@@ -0,0 +1,38 @@
+import warnings
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.template.defaultfilters import filesizeformat
+
+from PIL import Image as StdImage
+
+
+def read_image_header(upload):
+    """
+    Validate an uploaded image from its size and header only, the pixel data is
+    never decoded. Rejects files over `IMAGE_UPLOAD_MAX_BYTES`, images over
+    `IMAGE_UPLOAD_MAX_PIXELS` and formats outside `IMAGE_UPLOAD_FORMATS`.
+    @:param upload: UploadedFile
+    @:return: dict: width:int, height:int, image_format:str
+    """
+    if upload.size is not None and upload.size > settings.IMAGE_UPLOAD_MAX_BYTES:
+        raise ValidationError(f"Image file too large, the limit is {filesizeformat(settings.IMAGE_UPLOAD_MAX_BYTES)}")
+
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', StdImage.DecompressionBombWarning)
+            header = StdImage.open(upload)
+            width, height = header.size
+            image_format = header.format
+    except (StdImage.DecompressionBombError, StdImage.DecompressionBombWarning):
+        raise ValidationError("Image dimensions too large")
+    except (OSError, SyntaxError, ValueError):
+        raise ValidationError("Unsupported image file")
+    finally:
+        upload.seek(0)
+
+    if image_format not in settings.IMAGE_UPLOAD_FORMATS:
+        raise ValidationError("Unsupported image file")
+    if width * height > settings.IMAGE_UPLOAD_MAX_PIXELS:
+        raise ValidationError("Image dimensions too large")
+    return {'width': width, 'height': height, 'image_format': image_format}
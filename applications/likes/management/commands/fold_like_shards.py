@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from applications.images.cache import invalidate_image_list
+from applications.images.models import Image
+from applications.likes.models import LikeCounterShard
+
+
+class Command(BaseCommand):
+    help = 'Fold the like counter shards of hot images into Image.likes'
+
+    def handle(self, *args, **options):
+        image_ids = Image.objects.filter(sharded_likes=True).values_list('id', flat=True)
+        folded = 0
+        for image_id in image_ids.iterator():
+            folded += LikeCounterShard.objects.fold(image_id)
+        invalidate_image_list()
+        self.stdout.write(self.style.SUCCESS(f"Folded {folded} likes"))
@@ -0,0 +1,29 @@
+# Generated by Django 3.1 on 2026-10-18 02:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('images', '0003_image_sharded_likes'),
+        ('likes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LikeCounterShard',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('count', models.IntegerField(default=0)),
+                ('image', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='like_shards', to='images.image')),
+            ],
+            options={
+                'verbose_name': 'Like counter shard',
+                'verbose_name_plural': 'Like counter shards',
+                'unique_together': {('image', 'shard')},
+            },
+        ),
+    ]
@@ -1,13 +1,53 @@
-from django.db import models
+import random
+
+from django.conf import settings
+from django.db import models, transaction, IntegrityError
 from django.dispatch import receiver
+from django.db.models import F
 from django.db.models.signals import post_save, post_delete
 
 from django_extensions.db import fields
 
 from applications.accounts.models import User
+from applications.counters.buffer import update_counters, update_counters_many
+from applications.counters.utils import increment
+from applications.images.cache import invalidate_image_list
 from applications.images.models import Image
 
 
+class LikeManager(models.Manager):
+
+    def bulk_like(self, user, image_ids):
+        """
+        Like many images with a single INSERT, skipping the ones already liked.
+        The like counters are updated per batch instead of per like signal.
+        @:param user: User instance
+        @:param image_ids: list of image ids
+        @:return: dict: image id to 'created', 'exists' or 'not_found'
+        """
+        image_ids = list(dict.fromkeys(image_ids))
+        with transaction.atomic():
+            # Batches of a user, eg. concurrent or retried offline syncs, run one at a time: each one
+            # sees the likes of the previous one and only counts the rows it inserts
+            user.lock()
+            images = dict(Image.objects.filter(id__in=image_ids).values_list('id', 'sharded_likes'))
+            liked = set(self.filter(user=user, image__in=list(images)).values_list('image', flat=True))
+            new = [pk for pk in image_ids if pk in images and pk not in liked]
+            self.bulk_create([self.model(user=user, image_id=pk) for pk in new], ignore_conflicts=True)
+
+            for pk in new:
+                if images[pk]:
+                    LikeCounterShard.objects.increment(pk, 1)
+            unsharded = [pk for pk in new if not images[pk]]
+            threshold = settings.LIKE_COUNTER_SHARD_THRESHOLD
+            if threshold is not None:
+                Image.objects.filter(id__in=unsharded, likes__gte=threshold - 1).update(sharded_likes=True)
+            update_counters_many(Image, unsharded, likes=1)
+        if new:
+            invalidate_image_list()
+        return {pk: 'not_found' if pk not in images else 'exists' if pk in liked else 'created' for pk in image_ids}
+
+
 class Like(models.Model):
     """
     Model for saving Like data
@@ -17,6 +57,8 @@ class Like(models.Model):
     created = fields.CreationDateTimeField()
     modified = fields.ModificationDateTimeField()
 
+    objects = LikeManager()
+
     def __str__(self):
         return f'{self.user.email} liked'
 
@@ -28,20 +70,83 @@ class Like(models.Model):
     def edit_like_count(self, func_type=None):
         """
         Image update with func_type variable for like field.
+        Hot images spread their likes over counter shards instead.
         @:param func_type: str
         @:return: add or delete like count.
         """
         value = 1 if func_type == 'add' else -1
-        self.image.likes += value
-        self.image.save()
+        if self.image.sharded_likes:
+            LikeCounterShard.objects.increment(self.image_id, value)
+            return
+        update_counters(Image, self.image_id, likes=value)
+        threshold = settings.LIKE_COUNTER_SHARD_THRESHOLD
+        if threshold is not None and value > 0:
+            # Compare the stored count, which has the likes of concurrent requests, not the loaded instance.
+            # Write-behind deltas still pending are not counted yet, the switch may come a flush later.
+            Image.objects.filter(pk=self.image_id, sharded_likes=False, likes__gte=threshold) \
+                .update(sharded_likes=True)
+
+
+class LikeCounterShardManager(models.Manager):
+
+    def increment(self, image_id, value):
+        """
+        Add `value` to a random shard of the image, so concurrent likes of a
+        hot image contend on different rows.
+        """
+        shard = random.randrange(settings.LIKE_COUNTER_SHARDS)
+        if self.filter(image=image_id, shard=shard).update(count=F('count') + value):
+            return
+        try:
+            with transaction.atomic():
+                self.create(image_id=image_id, shard=shard, count=value)
+        except IntegrityError:
+            self.filter(image=image_id, shard=shard).update(count=F('count') + value)
+
+    def fold(self, image_id):
+        """
+        Move the shard totals of an image into `Image.likes`, which also moves its
+        trending score: likes counted on shards do not rank the image until folded.
+        Shards are decremented by what was read, so concurrent likes are kept.
+        @:return: folded like count
+        """
+        with transaction.atomic():
+            shards = list(self.select_for_update().filter(image=image_id).exclude(count=0)
+                          .values_list('pk', 'count'))
+            for pk, count in shards:
+                self.filter(pk=pk).update(count=F('count') - count)
+            total = sum(count for pk, count in shards)
+            increment(Image, image_id, likes=total)
+        return total
+
+
+class LikeCounterShard(models.Model):
+    """
+    Partial like count of a hot image, `Image.like_count` sums them on read
+    """
+    image = models.ForeignKey(Image, related_name='like_shards', on_delete=models.CASCADE)
+    shard = models.PositiveSmallIntegerField()
+    count = models.IntegerField(default=0)
+
+    objects = LikeCounterShardManager()
+
+    def __str__(self):
+        return f'{self.image} #{self.shard}'
+
+    class Meta:
+        verbose_name = 'Like counter shard'
+        verbose_name_plural = 'Like counter shards'
+        unique_together = ('image', 'shard',)
 
 
 @receiver(post_save, sender=Like, dispatch_uid="like_add_count")
 def follow_post_save(sender, instance, created, **kwargs):
     if created:
         instance.edit_like_count(func_type='add')
+        invalidate_image_list()
 
 
 @receiver(post_delete, sender=Like, dispatch_uid="like_delete_count")
 def follow_post_delete(sender, instance, **kwargs):
     instance.edit_like_count(func_type='delete')
+    invalidate_image_list()
@@ -1,3 +1,92 @@
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 
-# Create your tests here.
+from applications.accounts.models import User
+from applications.counters.buffer import counter_buffer
+from applications.images.models import Image
+from applications.images.trending import trending_score
+from applications.likes.models import Like, LikeCounterShard
+
+
+class LikeCountTestCase(TestCase):
+
+    def setUp(self):
+        self.author = User.objects.create(username="author@test.com")
+        self.users = [User.objects.create(username=f"user{i}@test.com") for i in range(3)]
+        self.image = Image.objects.create(image="images/test.png", image_caption="Lorem", user=self.author)
+
+    def test_like_updates_only_the_counter(self):
+        modified = self.image.modified
+        like = Like.objects.create(user=self.users[0], image=self.image)
+        self.image.refresh_from_db()
+        self.assertEqual(self.image.likes, 1)
+        self.assertEqual(self.image.modified, modified)
+        like.delete()
+        self.image.refresh_from_db()
+        self.assertEqual(self.image.likes, 0)
+
+    def test_stale_instance_does_not_lose_likes(self):
+        stale = Image.objects.get(pk=self.image.pk)
+        Like.objects.create(user=self.users[0], image=self.image)
+        Like.objects.create(user=self.users[1], image=stale)
+        self.image.refresh_from_db()
+        self.assertEqual(self.image.likes, 2)
+
+    @override_settings(LIKE_COUNTER_SHARD_THRESHOLD=2)
+    def test_stale_instance_crosses_the_shard_threshold(self):
+        stale = Image.objects.get(pk=self.image.pk)
+        Like.objects.create(user=self.users[0], image=self.image)
+        self.image.refresh_from_db()
+        self.assertFalse(self.image.sharded_likes)
+        Like.objects.create(user=self.users[1], image=stale)
+        self.image.refresh_from_db()
+        self.assertTrue(self.image.sharded_likes)
+        self.assertEqual(self.image.likes, 2)
+
+    @override_settings(LIKE_COUNTER_SHARD_THRESHOLD=1, LIKE_COUNTER_SHARDS=4)
+    def test_hot_image_likes_are_sharded(self):
+        Like.objects.create(user=self.users[0], image=self.image)
+        self.image.refresh_from_db()
+        self.assertTrue(self.image.sharded_likes)
+        Like.objects.create(user=self.users[1], image=self.image)
+        Like.objects.create(user=self.users[2], image=self.image)
+        self.image.refresh_from_db()
+        self.assertEqual(self.image.likes, 1)
+        self.assertEqual(self.image.like_count, 3)
+        self.assertAlmostEqual(self.image.trending_score, trending_score(1, self.image.created), places=3)
+        self.assertEqual(LikeCounterShard.objects.fold(self.image.id), 2)
+        self.image.refresh_from_db()
+        self.assertEqual(self.image.likes, 3)
+        self.assertEqual(self.image.like_count, 3)
+        self.assertAlmostEqual(self.image.trending_score, trending_score(3, self.image.created), places=3)
+
+
+@override_settings(COUNTER_WRITE_BEHIND=True, COUNTER_FLUSH_INTERVAL=60000, COUNTER_FLUSH_MAX_EVENTS=1000)
+class WriteBehindLikeCountTestCase(TransactionTestCase):
+
+    def setUp(self):
+        self.author = User.objects.create(username="author@test.com")
+        self.users = [User.objects.create(username=f"user{i}@test.com") for i in range(5)]
+        self.image = Image.objects.create(image="images/test.png", image_caption="Lorem", user=self.author)
+
+    def tearDown(self):
+        counter_buffer.flush()
+
+    def test_likes_are_flushed_in_one_update(self):
+        likes = [Like.objects.create(user=user, image=self.image) for user in self.users]
+        likes[0].delete()
+        self.image.refresh_from_db()
+        self.assertEqual(self.image.likes, 0)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(counter_buffer.flush(), 1)
+        self.assertEqual(len(queries), 1)
+        self.image.refresh_from_db()
+        self.assertEqual(self.image.likes, 4)
+
+    @override_settings(COUNTER_FLUSH_MAX_EVENTS=2)
+    def test_flush_after_max_events(self):
+        Like.objects.create(user=self.users[0], image=self.image)
+        Like.objects.create(user=self.users[1], image=self.image)
+        self.image.refresh_from_db()
+        self.assertEqual(self.image.likes, 2)
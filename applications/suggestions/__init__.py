@@ -0,0 +1 @@
+default_app_config = 'applications.suggestions.apps.SuggestionsConfig'
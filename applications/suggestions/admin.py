@@ -0,0 +1,10 @@
+from django.contrib import admin
+
+from applications.suggestions.models import FollowSuggestion
+
+
+class FollowSuggestionAdmin(admin.ModelAdmin):
+    list_display = ['user', 'suggested', 'score', 'mutual_count', 'created']
+
+
+admin.site.register(FollowSuggestion, FollowSuggestionAdmin)
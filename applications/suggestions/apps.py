@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class SuggestionsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'applications.suggestions'
+
+    def ready(self):
+        # The follow receivers enqueue tasks, which import the models of this app
+        from applications.suggestions import signals  # noqa: F401
@@ -0,0 +1,85 @@
+import heapq
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db.models import Q
+
+from applications.followers.models import Follow
+
+
+class FollowGraph:
+    """
+    Sparse in-memory follow graph: the rows of the follow matrix A, where
+    A[u, v] = 1 when u follows v, kept as sets of user ids both ways.
+
+    Candidates c for a user u are scored with two sparse products:
+        FOLLOW_SUGGESTIONS_MUTUAL_WEIGHT * (A·A)[u, c]             people u follows that follow c
+        + FOLLOW_SUGGESTIONS_COMMON_FOLLOWER_WEIGHT * (Aᵀ·A)[u, c]  followers u and c have in common
+    Each row product only walks the neighbours of u, so a pass costs the
+    number of two-hop paths rather than users squared.
+    """
+
+    def __init__(self):
+        self.following = defaultdict(set)
+        self.followers = defaultdict(set)
+
+    def add(self, edges):
+        """
+        @:param edges: iterable of (follower id, following id)
+        """
+        for follower, following in edges:
+            self.following[follower].add(following)
+            self.followers[following].add(follower)
+
+    @classmethod
+    def load(cls, batch_size=10000):
+        """
+        The whole graph, read in keyset batches of `batch_size` follows
+        """
+        graph = cls()
+        last_id = 0
+        while True:
+            rows = list(Follow.objects.filter(id__gt=last_id).order_by('id')
+                        .values_list('id', 'follower', 'following')[:batch_size])
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            graph.add((follower, following) for pk, follower, following in rows)
+        return graph
+
+    @classmethod
+    def load_around(cls, user_id):
+        """
+        The two-hop neighbourhood of one user, all `suggest(user_id)` reads
+        """
+        graph = cls()
+        graph.add(Follow.objects.filter(Q(follower=user_id) | Q(following=user_id)).values_list('follower', 'following'))
+        neighbours = graph.following[user_id] | graph.followers[user_id]
+        graph.add(Follow.objects.filter(follower__in=neighbours).values_list('follower', 'following'))
+        return graph
+
+    @property
+    def users(self):
+        return self.following.keys() | self.followers.keys()
+
+    def suggest(self, user_id, limit):
+        """
+        Top `limit` users for `user_id` to follow, excluding the ones already followed
+        @:return: list of (user id, score, mutual count), best first
+        """
+        following = self.following.get(user_id, set())
+        mutual = Counter()
+        for followed in following:
+            mutual.update(self.following.get(followed, ()))
+        common = Counter()
+        for follower in self.followers.get(user_id, ()):
+            common.update(self.following.get(follower, ()))
+
+        scores = {}
+        for candidate in mutual.keys() | common.keys():
+            if candidate == user_id or candidate in following:
+                continue
+            scores[candidate] = settings.FOLLOW_SUGGESTIONS_MUTUAL_WEIGHT * mutual[candidate] \
+                + settings.FOLLOW_SUGGESTIONS_COMMON_FOLLOWER_WEIGHT * common[candidate]
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))
+        return [(candidate, score, mutual[candidate]) for candidate, score in best]
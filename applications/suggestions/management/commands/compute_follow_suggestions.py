@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from applications.suggestions.graph import FollowGraph
+from applications.suggestions.models import FollowSuggestion
+
+
+class Command(BaseCommand):
+    help = 'Recompute the "who to follow" suggestions of every user from the whole follow graph'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Users written per transaction')
+        parser.add_argument('--read-batch-size', type=int, default=10000, help='Follows read per query')
+
+    def handle(self, *args, **options):
+        graph = FollowGraph.load(batch_size=options['read_batch_size'])
+        user_ids = sorted(graph.users)
+        batch_size = options['batch_size']
+        written = 0
+        for start in range(0, len(user_ids), batch_size):
+            batch = user_ids[start:start + batch_size]
+            suggestions = {user_id: graph.suggest(user_id, settings.FOLLOW_SUGGESTIONS_LIMIT) for user_id in batch}
+            FollowSuggestion.objects.replace(suggestions)
+            written += sum(len(rows) for rows in suggestions.values())
+
+        stale = set(FollowSuggestion.objects.values_list('user', flat=True).distinct()) - set(user_ids)
+        FollowSuggestion.objects.filter(user__in=stale).delete()
+        self.stdout.write(self.style.SUCCESS(f"Stored {written} suggestions for {len(user_ids)} users"))
@@ -0,0 +1,43 @@
+from django.db import models, transaction
+
+from django_extensions.db import fields
+
+from applications.accounts.models import User
+
+
+class FollowSuggestionManager(models.Manager):
+
+    def replace(self, suggestions):
+        """
+        Store the top-K lists of some users, replacing their previous ones
+        @:param suggestions: dict: user id to list of (user id, score, mutual count)
+        """
+        entries = [self.model(user_id=user_id, suggested_id=suggested_id, score=score, mutual_count=mutual_count)
+                   for user_id, rows in suggestions.items() for suggested_id, score, mutual_count in rows]
+        with transaction.atomic():
+            self.filter(user__in=list(suggestions)).delete()
+            self.bulk_create(entries)
+
+
+class FollowSuggestion(models.Model):
+    """
+    Precomputed "who to follow" entry of a user, see `FollowGraph.suggest`
+    """
+    user = models.ForeignKey(User, related_name='follow_suggestions', on_delete=models.CASCADE)
+    suggested = models.ForeignKey(User, related_name='+', on_delete=models.CASCADE)
+    score = models.FloatField()
+    mutual_count = models.PositiveIntegerField(default=0)
+    created = fields.CreationDateTimeField()
+
+    objects = FollowSuggestionManager()
+
+    def __str__(self):
+        return f"{self.user} -> {self.suggested}"
+
+    class Meta:
+        verbose_name = 'Follow suggestion'
+        verbose_name_plural = 'Follow suggestions'
+        unique_together = ('user', 'suggested',)
+        indexes = [
+            models.Index(fields=['user', 'score', 'id'], name='suggestions_user_score_idx'),
+        ]
@@ -0,0 +1,16 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from applications.followers.models import Follow
+from applications.suggestions.tasks import schedule_refresh
+
+
+@receiver(post_save, sender=Follow, dispatch_uid="follow_refresh_suggestions")
+def follow_post_save(sender, instance, created, **kwargs):
+    if created:
+        schedule_refresh(instance.follower_id)
+
+
+@receiver(post_delete, sender=Follow, dispatch_uid="unfollow_refresh_suggestions")
+def follow_post_delete(sender, instance, **kwargs):
+    schedule_refresh(instance.follower_id)
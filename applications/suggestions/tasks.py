@@ -0,0 +1,26 @@
+import time
+
+from django.conf import settings
+
+from applications.suggestions.graph import FollowGraph
+from applications.suggestions.models import FollowSuggestion
+from applications.tasks.registry import task
+
+
+@task
+def refresh_follow_suggestions(user_id):
+    """
+    Recompute the suggestions of one user from their two-hop neighbourhood
+    """
+    graph = FollowGraph.load_around(user_id)
+    FollowSuggestion.objects.replace({user_id: graph.suggest(user_id, settings.FOLLOW_SUGGESTIONS_LIMIT)})
+
+
+def schedule_refresh(user_id):
+    """
+    Refresh the suggestions of a user `FOLLOW_SUGGESTIONS_REFRESH_DELAY` seconds from now.
+    Follow changes within the same window share one job.
+    """
+    delay = settings.FOLLOW_SUGGESTIONS_REFRESH_DELAY
+    key = f"suggestions:{user_id}:{int(time.time() // delay)}" if delay else None
+    refresh_follow_suggestions.enqueue(args=(user_id, ), key=key, delay=delay)
@@ -0,0 +1,59 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from applications.accounts.models import User
+from applications.followers.models import Follow
+from applications.suggestions.graph import FollowGraph
+from applications.suggestions.models import FollowSuggestion
+from applications.tasks.models import Job
+
+
+class FollowGraphTestCase(TestCase):
+
+    def setUp(self):
+        names = ['reader', 'a', 'b', 'c', 'd', 'e', 'x']
+        self.users = {name: User.objects.create(username=f"{name}@test.com") for name in names}
+        edges = [('reader', 'a'), ('reader', 'b'), ('a', 'c'), ('b', 'c'), ('a', 'd'), ('x', 'reader'), ('x', 'e'),
+                 ('b', 'reader')]
+        Follow.objects.bulk_create([Follow(follower=self.users[follower], following=self.users[following])
+                                    for follower, following in edges])
+
+    def names(self, suggestions):
+        ids = {user.pk: name for name, user in self.users.items()}
+        return [(ids[pk], score, mutual) for pk, score, mutual in suggestions]
+
+    @override_settings(FOLLOW_SUGGESTIONS_MUTUAL_WEIGHT=1.0, FOLLOW_SUGGESTIONS_COMMON_FOLLOWER_WEIGHT=0.5)
+    def test_suggest_scores_mutual_and_common_followers(self):
+        suggestions = FollowGraph.load().suggest(self.users['reader'].pk, limit=10)
+        self.assertEqual(self.names(suggestions), [('c', 2.5, 2), ('d', 1.0, 1), ('e', 0.5, 0)])
+
+    def test_suggest_limit(self):
+        suggestions = FollowGraph.load().suggest(self.users['reader'].pk, limit=1)
+        self.assertEqual(self.names(suggestions)[0][0], 'c')
+
+    def test_neighbourhood_matches_whole_graph(self):
+        reader = self.users['reader'].pk
+        self.assertEqual(FollowGraph.load_around(reader).suggest(reader, 10), FollowGraph.load().suggest(reader, 10))
+
+    def test_load_in_batches(self):
+        self.assertEqual(FollowGraph.load(batch_size=3).following, FollowGraph.load().following)
+
+    def test_command_stores_suggestions(self):
+        call_command('compute_follow_suggestions', batch_size=2, stdout=StringIO())
+        stored = self.users['reader'].follow_suggestions.order_by('-score').values_list('suggested', flat=True)
+        self.assertEqual(list(stored), [self.users[name].pk for name in ('c', 'd', 'e')])
+
+    @override_settings(TASKS_EAGER=False)
+    def test_follow_schedules_refresh(self):
+        Follow.objects.create(follower=self.users['reader'], following=self.users['c'])
+        Follow.objects.create(follower=self.users['reader'], following=self.users['d'])
+        jobs = Job.objects.filter(idempotency_key__startswith=f"suggestions:{self.users['reader'].pk}:")
+        self.assertEqual(jobs.count(), 1)
+
+    @override_settings(TASKS_EAGER=True)
+    def test_follow_refreshes_follower(self):
+        Follow.objects.create(follower=self.users['reader'], following=self.users['c'])
+        suggested = set(FollowSuggestion.objects.filter(user=self.users['reader']).values_list('suggested', flat=True))
+        self.assertEqual(suggested, {self.users['d'].pk, self.users['e'].pk})
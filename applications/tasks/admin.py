@@ -0,0 +1,12 @@
+from django.contrib import admin
+
+from applications.tasks.models import Job
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['__str__', 'status', 'attempts', 'run_after', 'created']
+    list_filter = ['status', 'name']
+    search_fields = ['name', 'idempotency_key']
+
+
+admin.site.register(Job, JobAdmin)
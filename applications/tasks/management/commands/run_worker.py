@@ -0,0 +1,50 @@
+import multiprocessing
+import signal
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from applications.tasks.worker import Worker
+
+
+def run_worker_process(threads, poll_interval, visibility_timeout, burst):
+    worker = Worker(threads=threads, poll_interval=poll_interval, visibility_timeout=visibility_timeout)
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    worker.run(burst=burst)
+
+
+class Command(BaseCommand):
+    help = 'Run queued jobs on a pool of worker processes and threads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1)
+        parser.add_argument('--threads', type=int, default=1, help='Threads per process')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to wait when the queue is empty')
+        parser.add_argument('--visibility-timeout', type=int, default=None,
+                            help='Seconds a claimed job stays hidden from other workers')
+        parser.add_argument('--burst', action='store_true', help='Exit once the queue is empty')
+
+    def handle(self, *args, **options):
+        worker_options = (options['threads'], options['poll_interval'], options['visibility_timeout'],
+                          options['burst'])
+        if options['processes'] == 1:
+            run_worker_process(*worker_options)
+            return
+
+        # Forked processes must not share the database connections of the parent
+        connections.close_all()
+        processes = [multiprocessing.Process(target=run_worker_process, args=worker_options, daemon=True)
+                     for _ in range(options['processes'])]
+        for process in processes:
+            process.start()
+
+        def stop(*args):
+            for process in processes:
+                process.terminate()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        for process in processes:
+            process.join()
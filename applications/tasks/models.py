@@ -0,0 +1,136 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models, transaction, IntegrityError
+from django.db.models import F, Q
+from django.utils import timezone
+
+from django_extensions.db import fields
+
+
+class JobManager(models.Manager):
+
+    def enqueue(self, name, args=(), kwargs=None, key=None, delay=0, max_attempts=None):
+        """
+        Store a job in the current transaction, it runs once that is committed.
+        @:param name: str registered task name
+        @:param key: str optional idempotency key, a job with the same key is only enqueued once
+        @:param delay: int seconds to wait before running
+        @:return: Job instance
+        """
+        values = {
+            'name': name,
+            'arguments': {'args': list(args), 'kwargs': kwargs or {}},
+            'run_after': timezone.now() + timedelta(seconds=delay),
+            'max_attempts': max_attempts or settings.TASKS_MAX_ATTEMPTS,
+        }
+        if key is None:
+            return self.create(**values)
+        try:
+            with transaction.atomic():
+                return self.create(idempotency_key=key, **values)
+        except IntegrityError:
+            return self.get(idempotency_key=key)
+
+    def available(self, now):
+        return self.filter(Q(status=Job.QUEUED, run_after__lte=now) |
+                           Q(status=Job.RUNNING, locked_until__lt=now, attempts__lt=F('max_attempts')))
+
+    def fail_abandoned(self, now):
+        """
+        Fail the jobs whose lock expired on their last attempt, eg. a job killing or hanging
+        its worker every time, which never reaches `mark_failed`. Like there, their key is released.
+        @:return: number of failed jobs
+        """
+        return self.filter(status=Job.RUNNING, locked_until__lt=now, attempts__gte=F('max_attempts')).update(
+            status=Job.FAILED, locked_until=None, idempotency_key=None, modified=now,
+            last_error='The lock expired before the last attempt finished')
+
+    def claim(self, limit=1, visibility_timeout=None):
+        """
+        Lock up to `limit` runnable jobs for this worker. Each job is taken with a
+        conditional UPDATE, so two workers never get the same job, and a job whose
+        worker died becomes visible again once its lock expires, while it has attempts left.
+        @:return: list of Job instances
+        """
+        now = timezone.now()
+        self.fail_abandoned(now)
+        locked_until = now + timedelta(seconds=visibility_timeout or settings.TASKS_VISIBILITY_TIMEOUT)
+        candidates = list(self.available(now).order_by('run_after', 'id').values_list('id', flat=True)[:limit])
+        claimed = [job_id for job_id in candidates if self.available(now).filter(id=job_id).update(
+            status=Job.RUNNING, locked_until=locked_until, attempts=F('attempts') + 1)]
+        return list(self.filter(id__in=claimed).order_by('run_after', 'id'))
+
+    def purge(self, older_than):
+        """
+        Delete finished jobs older than `older_than` seconds
+        """
+        return self.filter(status=Job.DONE, modified__lt=timezone.now() - timedelta(seconds=older_than)).delete()
+
+
+class Job(models.Model):
+    """
+    A unit of post-request work run by `manage.py run_worker`
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    name = models.CharField(max_length=200)
+    arguments = models.JSONField(default=dict, blank=True)
+    idempotency_key = models.CharField(max_length=200, unique=True, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created = fields.CreationDateTimeField()
+    modified = fields.ModificationDateTimeField()
+
+    objects = JobManager()
+
+    def __str__(self):
+        return f"{self.name} #{self.pk}"
+
+    class Meta:
+        verbose_name = 'Job'
+        verbose_name_plural = 'Jobs'
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='tasks_job_status_run_idx'),
+        ]
+
+    def claimed(self):
+        """
+        The job while this instance still holds its claim: the lock of another
+        claim, taken after this one expired, has a different `locked_until`
+        """
+        return Job.objects.filter(pk=self.pk, status=Job.RUNNING, locked_until=self.locked_until)
+
+    def mark_done(self):
+        """
+        @:return: bool: False when the claim was lost to another worker, the job is left to it
+        """
+        return bool(self.claimed().update(status=Job.DONE, locked_until=None, modified=timezone.now()))
+
+    def mark_failed(self, error):
+        """
+        Queue the job again with an exponential backoff, or give up after `max_attempts`.
+        A failed job releases its idempotency key, so the same work can be enqueued again.
+        Like `mark_done`, does nothing once the claim was lost.
+        @:return: bool
+        """
+        if self.attempts >= self.max_attempts:
+            values = {'status': Job.FAILED, 'locked_until': None, 'idempotency_key': None}
+        else:
+            delay = settings.TASKS_RETRY_DELAY * 2 ** (self.attempts - 1)
+            values = {'status': Job.QUEUED, 'locked_until': None,
+                      'run_after': timezone.now() + timedelta(seconds=delay)}
+        return bool(self.claimed().update(last_error=error, modified=timezone.now(), **values))
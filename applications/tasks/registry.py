@@ -0,0 +1,28 @@
+from django.conf import settings
+
+from applications.tasks.models import Job
+
+registry = {}
+
+
+def task(func):
+    """
+    Register a function as a job that `run_worker` can execute.
+    The function gets an `enqueue(args=(), kwargs=None, key=None, delay=0)` attribute
+    storing a job in the current transaction, or running it right away when
+    `TASKS_EAGER` is on. Arguments must be JSON serializable and tasks must be
+    idempotent: a job is retried on failure and when its worker outlives the
+    visibility timeout.
+    """
+    name = f"{func.__module__}.{func.__name__}"
+
+    def enqueue(args=(), kwargs=None, key=None, delay=0):
+        if settings.TASKS_EAGER:
+            func(*args, **(kwargs or {}))
+            return None
+        return Job.objects.enqueue(name, args=args, kwargs=kwargs, key=key, delay=delay)
+
+    registry[name] = func
+    func.task_name = name
+    func.enqueue = enqueue
+    return func
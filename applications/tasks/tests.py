@@ -0,0 +1,110 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from applications.tasks.models import Job
+from applications.tasks.registry import registry, task
+from applications.tasks.worker import Worker
+
+calls = []
+
+
+@task
+def record(value):
+    calls.append(value)
+
+
+@task
+def explode():
+    raise ValueError("boom")
+
+
+@override_settings(TASKS_EAGER=False)
+class JobQueueTestCase(TestCase):
+
+    def setUp(self):
+        calls.clear()
+
+    def test_enqueue_is_idempotent(self):
+        first = record.enqueue(args=(1,), key="record:1")
+        second = record.enqueue(args=(1,), key="record:1")
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(Job.objects.count(), 1)
+
+    @override_settings(TASKS_EAGER=True)
+    def test_eager_runs_immediately(self):
+        self.assertIsNone(record.enqueue(args=(1,)))
+        self.assertEqual(calls, [1])
+        self.assertFalse(Job.objects.exists())
+
+    def test_claim_locks_job(self):
+        job = record.enqueue(args=(1,))
+        self.assertEqual([claimed.pk for claimed in Job.objects.claim()], [job.pk])
+        self.assertEqual(Job.objects.claim(), [])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.RUNNING, 1))
+
+    def test_delayed_job_is_not_claimed(self):
+        record.enqueue(args=(1,), delay=60)
+        self.assertEqual(Job.objects.claim(), [])
+
+    def test_expired_lock_is_claimed_again(self):
+        job = record.enqueue(args=(1,))
+        Job.objects.claim()
+        Job.objects.filter(pk=job.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        claimed = Job.objects.claim()
+        self.assertEqual(claimed[0].attempts, 2)
+
+    def test_expired_lock_on_last_attempt_fails(self):
+        job = Job.objects.enqueue(record.task_name, max_attempts=1, key="record:1")
+        Job.objects.claim()
+        Job.objects.filter(pk=job.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(Job.objects.claim(), [])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.idempotency_key), (Job.FAILED, 1, None))
+
+    def test_lost_claim_is_not_completed(self):
+        job = record.enqueue(args=(1,))
+        stale = Job.objects.claim()[0]
+        Job.objects.filter(pk=job.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        current = Job.objects.claim()[0]
+        self.assertFalse(stale.mark_done())
+        self.assertFalse(stale.mark_failed("late"))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.last_error), (Job.RUNNING, ''))
+        self.assertTrue(current.mark_done())
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+
+    def test_worker_runs_jobs(self):
+        record.enqueue(args=(1,))
+        record.enqueue(kwargs={'value': 2})
+        Worker().run(burst=True)
+        self.assertEqual(calls, [1, 2])
+        self.assertEqual(Job.objects.filter(status=Job.DONE).count(), 2)
+
+    @override_settings(TASKS_RETRY_DELAY=10)
+    def test_failed_job_backs_off(self):
+        job = explode.enqueue()
+        Worker().run(burst=True)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertIn("ValueError: boom", job.last_error)
+        self.assertGreater(job.run_after, timezone.now() + timedelta(seconds=5))
+
+    def test_job_fails_after_max_attempts(self):
+        job = Job.objects.enqueue(explode.task_name, max_attempts=1, key="explode:1")
+        Worker().run(burst=True)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.idempotency_key), (Job.FAILED, None))
+        self.assertNotEqual(Job.objects.enqueue(explode.task_name, key="explode:1").pk, job.pk)
+
+    def test_unknown_task_fails(self):
+        job = Job.objects.enqueue("missing.task", max_attempts=1)
+        Worker().run(burst=True)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+
+    def test_app_tasks_are_registered(self):
+        self.assertIn('applications.feeds.tasks.fan_out_image', registry)
@@ -0,0 +1,71 @@
+import logging
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from applications.tasks.models import Job
+from applications.tasks.registry import registry
+
+logger = logging.getLogger(__name__)
+
+
+class Worker:
+    """
+    Claims jobs and runs them on a pool of `threads` threads
+    """
+
+    def __init__(self, threads=1, poll_interval=1.0, visibility_timeout=None):
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self.visibility_timeout = visibility_timeout
+        self.stopped = threading.Event()
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='job') if threads > 1 else None
+
+    def run_job(self, job):
+        func = registry.get(job.name)
+        try:
+            if func is None:
+                raise LookupError(f"Unknown task {job.name}")
+            func(*job.arguments.get('args', []), **job.arguments.get('kwargs', {}))
+        except Exception:
+            logger.exception("Job %s failed (attempt %s of %s)", job, job.attempts, job.max_attempts)
+            job.mark_failed(traceback.format_exc())
+        else:
+            if not job.mark_done():
+                logger.warning("Job %s outlived its lock and was claimed again", job)
+        finally:
+            close_old_connections()
+
+    def run_once(self):
+        """
+        Claim and run one batch of jobs
+        @:return: number of jobs run
+        """
+        jobs = Job.objects.claim(limit=self.threads, visibility_timeout=self.visibility_timeout)
+        if self.executor is None:
+            for job in jobs:
+                self.run_job(job)
+        else:
+            list(self.executor.map(self.run_job, jobs))
+        return len(jobs)
+
+    def run(self, burst=False):
+        """
+        Run jobs until stopped, or until the queue is empty when `burst` is set
+        """
+        while not self.stopped.is_set():
+            if self.run_once():
+                continue
+            if burst:
+                break
+            Job.objects.purge(settings.TASKS_KEEP_DONE)
+            close_old_connections()
+            self.stopped.wait(self.poll_interval)
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    def stop(self, *args):
+        self.stopped.set()
@@ -2,6 +2,7 @@
 ASGI config for hedgehog project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+The read endpoints are served by async views under ASGI, see `applications.api.asgi`.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
@@ -9,8 +10,11 @@ https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hedgehog.settings')
+django.setup(set_prefix=False)
 
-application = get_asgi_application()
+from applications.api.asgi import get_application  # noqa: E402
+
+application = get_application()
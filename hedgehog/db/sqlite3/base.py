@@ -0,0 +1,200 @@
+"""
+SQLite backend tuned for several workers sharing one database file.
+
+Every connection runs in WAL mode, so readers never wait for the writer, with
+the pragmas below. Transactions start with BEGIN IMMEDIATE: the write lock is
+taken up front, where waiting for it is safe, instead of failing with
+"database is locked" when a read transaction tries to become a write one.
+Statements run outside a transaction, and BEGIN IMMEDIATE itself, are retried
+with an exponential backoff when the database stays locked past `timeout`.
+
+OPTIONS, on top of the sqlite3 connect() arguments:
+    pragmas: dict overriding DEFAULT_PRAGMAS
+    lock_retries: int retries of a locked statement, default 5
+    lock_retry_delay: float seconds before the first retry, doubled each time
+    serialize_writes: bool queue write transactions of every worker behind one
+        lock file, next to the database, so they wait in turn instead of
+        competing for the SQLite lock
+"""
+import os
+import random
+import re
+import threading
+import time
+
+from django.db.backends.sqlite3 import base
+
+try:
+    import fcntl
+except ImportError:  # Windows: writes are only serialized between the threads of a process
+    fcntl = None
+
+Database = base.Database
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'temp_store': 'MEMORY',
+    'cache_size': -20000,
+    'mmap_size': 128 * 1024 * 1024,
+}
+
+WRITE_STATEMENT = re.compile(r'\s*(INSERT|UPDATE|DELETE|REPLACE|CREATE|DROP|ALTER)\b', re.IGNORECASE)
+
+
+class WriterLock:
+    """
+    Lock serializing the writes of the threads and processes sharing a database file
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._thread_lock = threading.Lock()
+        self._file = None
+
+    def acquire(self, timeout):
+        deadline = time.monotonic() + timeout
+        if not self._thread_lock.acquire(timeout=timeout):
+            raise Database.OperationalError('database is locked')
+        if self.path is None or fcntl is None:
+            return
+        try:
+            if self._file is None:
+                self._file = open(self.path, 'a+b')
+            delay = 0.001
+            while True:
+                try:
+                    fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return
+                except BlockingIOError:
+                    if time.monotonic() >= deadline:
+                        raise Database.OperationalError('database is locked')
+                    time.sleep(delay)
+                    delay = min(delay * 2, 0.05)
+        except BaseException:
+            self._thread_lock.release()
+            raise
+
+    def release(self):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._thread_lock.release()
+
+
+_writer_locks = {}
+_writer_locks_lock = threading.Lock()
+
+
+def get_writer_lock(path):
+    """
+    Process wide writer lock of a database, `path` None for in-memory databases
+    """
+    with _writer_locks_lock:
+        if path not in _writer_locks:
+            _writer_locks[path] = WriterLock(path and f"{path}-writer.lock")
+        return _writer_locks[path]
+
+
+def is_locked_error(error):
+    return 'locked' in str(error) or 'busy' in str(error)
+
+
+class SQLiteCursorWrapper(base.SQLiteCursorWrapper):
+
+    def execute(self, query, params=None):
+        return self.database.run_statement(super().execute, query, params)
+
+    def executemany(self, query, param_list):
+        return self.database.run_statement(super().executemany, query, param_list)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lock_retries = 5
+        self.lock_retry_delay = 0.05
+        self.lock_timeout = 5.0
+        self.writer_lock = None
+        self._holds_writer_lock = False
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        for option in ('pragmas', 'lock_retries', 'lock_retry_delay', 'serialize_writes'):
+            kwargs.pop(option, None)
+        options = self.settings_dict['OPTIONS']
+        self.lock_retries = options.get('lock_retries', 5)
+        self.lock_retry_delay = options.get('lock_retry_delay', 0.05)
+        self.lock_timeout = kwargs.setdefault('timeout', 5.0)
+        if options.get('serialize_writes'):
+            name = None if self.is_in_memory_db() else os.path.abspath(str(self.settings_dict['NAME']))
+            self.writer_lock = get_writer_lock(name)
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        pragmas = {**DEFAULT_PRAGMAS, **self.settings_dict['OPTIONS'].get('pragmas', {})}
+        if self.is_in_memory_db():
+            pragmas.pop('journal_mode')
+        for pragma, value in pragmas.items():
+            conn.execute(f'PRAGMA {pragma} = {value}')
+        return conn
+
+    def create_cursor(self, name=None):
+        cursor = self.connection.cursor(factory=SQLiteCursorWrapper)
+        cursor.database = self
+        return cursor
+
+    def run_statement(self, method, query, params):
+        """
+        Run a statement, retrying it while the database is locked when that is safe:
+        outside of a transaction, nothing was done yet when it failed
+        """
+        if self.connection.in_transaction:
+            return method(query, params)
+        serialize = self.writer_lock is not None and WRITE_STATEMENT.match(query)
+        for attempt in range(self.lock_retries + 1):
+            if serialize:
+                self.writer_lock.acquire(self.lock_timeout)
+            try:
+                return method(query, params)
+            except Database.OperationalError as error:
+                if attempt == self.lock_retries or not is_locked_error(error):
+                    raise
+            finally:
+                if serialize:
+                    self.writer_lock.release()
+            time.sleep(self.lock_retry_delay * 2 ** attempt * random.uniform(0.5, 1.5))
+
+    def _start_transaction_under_autocommit(self):
+        if self.writer_lock is not None:
+            self.writer_lock.acquire(self.lock_timeout)
+            self._holds_writer_lock = True
+        try:
+            self.cursor().execute('BEGIN IMMEDIATE')
+        except Exception:
+            self._release_writer_lock()
+            raise
+
+    def _release_writer_lock(self):
+        if self._holds_writer_lock:
+            self._holds_writer_lock = False
+            self.writer_lock.release()
+
+    def _commit(self):
+        try:
+            return super()._commit()
+        finally:
+            self._release_writer_lock()
+
+    def _rollback(self):
+        try:
+            return super()._rollback()
+        finally:
+            self._release_writer_lock()
+
+    def _close(self):
+        try:
+            return super()._close()
+        finally:
+            self._release_writer_lock()
@@ -0,0 +1,108 @@
+import os
+import shutil
+import tempfile
+import threading
+
+from django.db.utils import ConnectionHandler, OperationalError
+from django.test import SimpleTestCase
+
+
+class SQLiteBackendTestCase(SimpleTestCase):
+    """
+    Runs against its own database files, several connections standing in for several workers
+    """
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'edge.sqlite3')
+        self.handlers = []
+        with self.connect().cursor() as cursor:
+            cursor.execute("CREATE TABLE counter (id INTEGER PRIMARY KEY, value INTEGER NOT NULL)")
+            cursor.execute("INSERT INTO counter (id, value) VALUES (1, 0)")
+
+    def tearDown(self):
+        for handler in self.handlers:
+            handler.close_all()
+
+    def connect(self, **options):
+        handler = ConnectionHandler({'default': {'ENGINE': 'hedgehog.db.sqlite3', 'NAME': self.path,
+                                                 'OPTIONS': options}})
+        self.handlers.append(handler)
+        return handler['default']
+
+    def counter_value(self):
+        with self.connect().cursor() as cursor:
+            cursor.execute("SELECT value FROM counter WHERE id = 1")
+            return cursor.fetchone()[0]
+
+    def test_pragmas(self):
+        connection = self.connect(pragmas={'cache_size': -1000})
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode")
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute("PRAGMA cache_size")
+            self.assertEqual(cursor.fetchone()[0], -1000)
+
+    def test_transactions_take_the_write_lock_up_front(self):
+        writer = self.connect()
+        other = self.connect(timeout=0.01, lock_retries=0)
+        writer.set_autocommit(False, force_begin_transaction_with_broken_autocommit=True)
+        with self.assertRaises(OperationalError):
+            with other.cursor() as cursor:
+                cursor.execute("UPDATE counter SET value = value + 1")
+        with other.cursor() as cursor:
+            cursor.execute("SELECT value FROM counter")
+            self.assertEqual(cursor.fetchone()[0], 0)
+        writer.rollback()
+        writer.set_autocommit(True)
+
+    def test_locked_statements_are_retried(self):
+        writer = self.connect()
+        other = self.connect(timeout=0.01, lock_retries=8, lock_retry_delay=0.02)
+        writer.set_autocommit(False, force_begin_transaction_with_broken_autocommit=True)
+        writer.inc_thread_sharing()
+        timer = threading.Timer(0.1, writer.commit)
+        timer.start()
+        with other.cursor() as cursor:
+            cursor.execute("UPDATE counter SET value = value + 1")
+        timer.join()
+        writer.dec_thread_sharing()
+        writer.set_autocommit(True)
+        self.assertEqual(self.counter_value(), 1)
+
+    def concurrent_increments(self, workers=4, increments=25, **options):
+        errors = []
+
+        def work():
+            connection = self.connect(**options)
+            try:
+                for _ in range(increments):
+                    with connection.cursor() as cursor:
+                        connection.set_autocommit(False, force_begin_transaction_with_broken_autocommit=True)
+                        cursor.execute("SELECT value FROM counter WHERE id = 1")
+                        value = cursor.fetchone()[0]
+                        cursor.execute("UPDATE counter SET value = %s WHERE id = 1", [value + 1])
+                        connection.commit()
+                        connection.set_autocommit(True)
+            except OperationalError as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=work) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(self.counter_value(), workers * increments)
+
+    def test_concurrent_write_transactions(self):
+        self.concurrent_increments()
+
+    def test_serialized_write_transactions(self):
+        self.concurrent_increments(serialize_writes=True)
+        self.assertTrue(os.path.exists(f"{self.path}-writer.lock"))
@@ -47,13 +47,19 @@ INSTALLED_APPS = [
     'corsheaders',
 
     'applications.accounts',
+    'applications.counters',
     'applications.images',
     'applications.followers',
     'applications.likes',
+    'applications.feeds',
+    'applications.tasks',
+    'applications.suggestions',
     'applications.api',
 ]
 
 MIDDLEWARE = [
+    'applications.api.metrics.MetricsMiddleware',
+    'applications.api.slow_queries.SlowQueryMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -62,6 +68,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'applications.api.replicas.PrimaryPinMiddleware',
 ]
 
 ROOT_URLCONF = 'hedgehog.urls'
@@ -90,11 +97,36 @@ WSGI_APPLICATION = 'hedgehog.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        # SQLite in WAL mode with BEGIN IMMEDIATE transactions and retries on lock, see hedgehog/db/sqlite3
+        'ENGINE': 'hedgehog.db.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Keep connections open across requests instead of connecting on every request
+        'CONN_MAX_AGE': 60,
+        'OPTIONS': {
+            # Seconds a statement waits for the write lock, it is then retried lock_retries times
+            'timeout': 5,
+            'lock_retries': 5,
+            # Queue the write transactions of every worker on a lock file, for write-heavy nodes
+            'serialize_writes': False,
+        },
     }
 }
 
+# Read replicas: GETs of the image and user endpoints read from one of DATABASE_REPLICAS, except
+# for users who wrote less than DATABASE_REPLICA_PIN_SECONDS ago, who read their own writes from the
+# primary. Pins live in the cache, configure a shared one when running several processes.
+# Eg. with a copy of the SQLite file standing in for a replica:
+# DATABASES['replica'] = {
+#     'ENGINE': 'django.db.backends.sqlite3',
+#     'NAME': BASE_DIR / 'replica.sqlite3',
+#     'CONN_MAX_AGE': 60,
+#     'TEST': {'MIRROR': 'default'},
+# }
+# DATABASE_REPLICAS = ['replica']
+DATABASE_REPLICAS = []
+DATABASE_REPLICA_PIN_SECONDS = 5
+DATABASE_ROUTERS = ['applications.api.replicas.ReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -138,6 +170,9 @@ MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Media files are stored once per distinct content, see applications.images.storage
+DEFAULT_FILE_STORAGE = 'applications.images.storage.ContentAddressedStorage'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -146,14 +181,14 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'accounts.User'
 
 REST_FRAMEWORK = {
-    'PAGINATE_BY': 10,
-    'PAGINATE_BY_PARAM': 'limit',
-    'MAX_PAGINATE_BY': 100,
+    'DEFAULT_PAGINATION_CLASS': 'applications.api.pagination.KeysetCursorPagination',
+    'PAGE_SIZE': 10,
     'DEFAULT_RENDERER_CLASSES': (
         'rest_framework.renderers.JSONRenderer',
         'rest_framework.renderers.BrowsableAPIRenderer',
     ),
     'DEFAULT_AUTHENTICATION_CLASSES': (
+        'applications.accounts.authentication.SignedTokenAuthentication',
         'rest_framework.authentication.TokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ),
@@ -173,6 +208,106 @@ SWAGGER_SETTINGS = {
     'FETCH_SCHEMA_WITH_QUERY': False,
 }
 
+# Maximum number of images kept in every materialized home feed
+FEED_MAX_ENTRIES = 500
+
+# Images reaching LIKE_COUNTER_SHARD_THRESHOLD likes count them over LIKE_COUNTER_SHARDS
+# rows that are summed on read and folded by `fold_like_shards`. None disables sharding.
+# The trending score of these images only moves with the likes folded, run `fold_like_shards` often.
+LIKE_COUNTER_SHARDS = 16
+LIKE_COUNTER_SHARD_THRESHOLD = None
+
+# Write-behind counters: like/follow counter deltas are buffered in process and flushed as one
+# UPDATE per row every COUNTER_FLUSH_INTERVAL milliseconds (how stale counts may get) or once
+# COUNTER_FLUSH_MAX_EVENTS events are pending, whichever comes first.
+COUNTER_WRITE_BEHIND = False
+COUNTER_FLUSH_INTERVAL = 500
+COUNTER_FLUSH_MAX_EVENTS = 1000
+
+# Trending score of images: log10(likes) + (created - TRENDING_EPOCH) / TRENDING_DECAY,
+# i.e. an image needs ten times the likes to rank as high as one TRENDING_DECAY seconds newer.
+TRENDING_EPOCH = 1657843200
+TRENDING_DECAY = 45000
+
+# Seconds an anonymous image-list page stays cached, pages are invalidated once image, like,
+# follow and counter writes commit
+IMAGE_LIST_CACHE_TIMEOUT = 60
+
+# Uploads are validated from their header only, against these limits
+IMAGE_UPLOAD_MAX_BYTES = 20 * 1024 * 1024
+IMAGE_UPLOAD_MAX_PIXELS = 40 * 1000 * 1000
+IMAGE_UPLOAD_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+
+# Files over IMAGE_UPLOAD_MAX_BYTES are cut off while they stream in, before being buffered
+FILE_UPLOAD_HANDLERS = [
+    'applications.images.uploadhandler.MaxSizeUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+# Resized variants generated in the background for every upload: name -> (max width, max height, format)
+IMAGE_VARIANTS = {
+    'thumbnail': (150, 150, 'JPEG'),
+    'small': (480, 480, 'JPEG'),
+    'medium': (1080, 1080, 'JPEG'),
+    'small_webp': (480, 480, 'WEBP'),
+    'medium_webp': (1080, 1080, 'WEBP'),
+}
+IMAGE_VARIANT_QUALITY = 80
+
+# "Who to follow": top FOLLOW_SUGGESTIONS_LIMIT users per user, scored by the people they follow
+# that follow the candidate and by the followers they have in common with the candidate.
+# Recomputed for everybody by `manage.py compute_follow_suggestions`, and for a follower
+# FOLLOW_SUGGESTIONS_REFRESH_DELAY seconds after their follows change.
+FOLLOW_SUGGESTIONS_LIMIT = 20
+FOLLOW_SUGGESTIONS_MUTUAL_WEIGHT = 1.0
+FOLLOW_SUGGESTIONS_COMMON_FOLLOWER_WEIGHT = 0.5
+FOLLOW_SUGGESTIONS_REFRESH_DELAY = 60
+
+# Signed `Authorization: Bearer` tokens issued by the login endpoint, verified without a query.
+# The revocation check refuses tokens issued before a password change or deactivation, reading
+# the user at most once per SIGNED_TOKEN_REVOCATION_CACHE_TIMEOUT seconds per process.
+SIGNED_TOKEN_MAX_AGE = 24 * 60 * 60
+SIGNED_TOKEN_REVOCATION_CHECK = False
+SIGNED_TOKEN_REVOCATION_CACHE_SIZE = 1024
+SIGNED_TOKEN_REVOCATION_CACHE_TIMEOUT = 60
+
+# Most words of an image-search/ query that are matched, the rest are ignored
+SEARCH_MAX_TERMS = 10
+
+# Most ids accepted by the batch endpoints: like/bulk/, follow/bulk/ and image-list/?ids=
+BULK_MAX_ITEMS = 100
+
+# Share of the requests whose duration, query count, phase timings and response size are
+# measured for /metrics, every request is counted
+METRICS_SAMPLE_RATE = 0.1
+
+# Slow query log, off with None: statements slower than SLOW_QUERY_THRESHOLD milliseconds are
+# appended to SLOW_QUERY_LOG with the route that issued them, the slowest run of each SELECT with
+# its EXPLAIN plan. Rank them with `manage.py slow_queries`.
+SLOW_QUERY_THRESHOLD = None
+SLOW_QUERY_LOG = os.path.join(BASE_DIR, 'slow-queries.log')
+
+# ASGI serving (hedgehog.asgi): read endpoints run as async views, their ORM work on a pool of
+# ASYNC_ORM_THREADS threads, which also bounds the database connections of a process
+ASGI_URLCONF = 'applications.api.asgi_urls'
+ASYNC_ORM_THREADS = 8
+# Serve MEDIA_URL from the ASGI application, turn off when a web server in front serves MEDIA_ROOT
+ASGI_SERVE_MEDIA = True
+ASGI_MEDIA_MAX_AGE = 365 * 24 * 60 * 60
+
+# Database backed job queue, run by `manage.py run_worker`.
+# With TASKS_EAGER jobs run inside the request instead, so development needs no worker.
+# Turn it off wherever DEBUG is off and start workers next to the application.
+TASKS_EAGER = DEBUG
+TASKS_MAX_ATTEMPTS = 5
+# Seconds before the first retry, doubled on every attempt
+TASKS_RETRY_DELAY = 10
+# Seconds a claimed job stays locked before another worker may pick it up
+TASKS_VISIBILITY_TIMEOUT = 300
+# Seconds finished jobs are kept
+TASKS_KEEP_DONE = 24 * 60 * 60
+
 CORS_ALLOW_HEADERS = (
         'x-requested-with',
         'content-type',